@@ -0,0 +1,242 @@
+"""
+Local stand-ins for every external provider the backend talks to.
+
+HTTP providers (OpenAI, Hugging Face, D-ID, tmpfiles, CloudConvert uploads,
+result downloads) are served by one ASGI app that the shared HTTP client is
+routed through. SDK-based providers (Fish Audio, Cloudinary, CloudConvert jobs,
+Supabase) are replaced by fakes with the same call shape. Every fake honours a
+per-provider profile: latency, jitter, error rate and payload size.
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+from types import SimpleNamespace
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("openai", "huggingface", "d-id", "tmpfiles", "cloudconvert", "fish-audio", "cloudinary", "supabase", "cdn")
+
+
+class Profile:
+    def __init__(self, latency_ms: float, jitter_ms: float = 0.0, error_rate: float = 0.0, payload_bytes: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+
+    def delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+# Rough real-world shapes; the benchmark CLI overrides any of these
+DEFAULT_PROFILES = {
+    "openai": Profile(1500, 500, payload_bytes=600),
+    "huggingface": Profile(8000, 2000, payload_bytes=300_000),
+    "d-id": Profile(300, 100),
+    "tmpfiles": Profile(400, 150),
+    "cloudconvert": Profile(3000, 1000, payload_bytes=80_000),
+    "fish-audio": Profile(1200, 300, payload_bytes=400_000),
+    "cloudinary": Profile(2000, 500),
+    "supabase": Profile(80, 30),
+    "cdn": Profile(100, 30, payload_bytes=5_000_000),
+}
+
+# Seconds a fake D-ID talk spends rendering before it reports "done"
+DID_RENDER_SECONDS = 20.0
+
+
+class FakeError(Exception):
+    pass
+
+
+def build_provider_app(profiles: dict, render_seconds: float = DID_RENDER_SECONDS) -> FastAPI:
+    """
+    One ASGI app answering for every HTTP provider. Paths don't overlap between
+    providers, so requests are routed by path regardless of host.
+    """
+    app = FastAPI()
+    talks = {}
+
+    async def simulate(provider: str):
+        profile = profiles[provider]
+        await asyncio.sleep(profile.delay())
+        if profile.fails():
+            return JSONResponse({"error": f"injected {provider} failure"}, status_code=503)
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        filler = "lorem ipsum " * max(1, profiles["openai"].payload_bytes // 12)
+        content = json.dumps({"avatar_description": f"portrait for {prompt}", "script": f"{prompt}. {filler}".strip()})
+        if body.get("stream"):
+            return await openai_stream(content)
+        failure = await simulate("openai")
+        if failure:
+            return failure
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+    async def openai_stream(content: str):
+        # A fifth of the latency passes before the first token, the rest is spread over the tokens
+        profile = profiles["openai"]
+        total = profile.delay()
+        await asyncio.sleep(total * 0.2)
+        if profile.fails():
+            return JSONResponse({"error": "injected openai failure"}, status_code=503)
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+
+        async def events():
+            for piece in pieces:
+                delta = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+                await asyncio.sleep(total * 0.8 / len(pieces))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/models/{model:path}")
+    async def huggingface_inference(model: str, request: Request):
+        await request.body()
+        failure = await simulate("huggingface")
+        if failure:
+            return failure
+        return Response(random.randbytes(profiles["huggingface"].payload_bytes), media_type="image/jpeg")
+
+    @app.post("/api/v1/upload")
+    async def tmpfiles_upload(request: Request):
+        await request.body()
+        failure = await simulate("tmpfiles")
+        if failure:
+            return failure
+        return {"data": {"url": f"https://tmpfiles.org/dl/{uuid.uuid4().hex[:8]}/file"}}
+
+    @app.post("/talks")
+    async def did_create_talk(request: Request):
+        await request.body()
+        failure = await simulate("d-id")
+        if failure:
+            return failure
+        talk_id = f"tlk_{uuid.uuid4().hex[:12]}"
+        talks[talk_id] = time.monotonic() + render_seconds
+        return JSONResponse({"id": talk_id, "status": "created"}, status_code=201)
+
+    @app.get("/talks/{talk_id}")
+    async def did_talk_status(talk_id: str):
+        failure = await simulate("d-id")
+        if failure:
+            return failure
+        if talk_id not in talks:
+            return JSONResponse({"kind": "NotFoundError"}, status_code=404)
+        if time.monotonic() < talks[talk_id]:
+            return {"id": talk_id, "status": "started"}
+        return {"id": talk_id, "status": "done", "result_url": f"https://cdn.bench.local/talks/{talk_id}.mp4"}
+
+    @app.post("/bench-upload")
+    async def cloudconvert_upload(request: Request):
+        async for _ in request.stream():
+            pass
+        failure = await simulate("cloudconvert")
+        if failure:
+            return failure
+        return Response(status_code=201)
+
+    @app.get("/{path:path}")
+    async def cdn_download(path: str):
+        failure = await simulate("cdn")
+        if failure:
+            return failure
+        return Response(random.randbytes(profiles["cdn"].payload_bytes), media_type="application/octet-stream")
+
+    return app
+
+
+def _blocking_call(profile: Profile, provider: str):
+    time.sleep(profile.delay())
+    if profile.fails():
+        raise FakeError(f"injected {provider} failure")
+
+
+class FakeFishSession:
+    """
+    Mirrors fish_audio_sdk.Session: tts() is a blocking generator of audio chunks.
+    """
+    chunk_size = 16 * 1024
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def tts(self, request):
+        _blocking_call(self.profile, "fish-audio")
+        remaining = self.profile.payload_bytes
+        chunks = max(1, remaining // self.chunk_size)
+        # Spread the rest of the synthesis time across the chunks
+        per_chunk = self.profile.delay() / chunks
+        while remaining > 0:
+            time.sleep(per_chunk)
+            size = min(self.chunk_size, remaining)
+            remaining -= size
+            yield b"\xff" * size
+
+    def create_model(self, **kwargs):
+        _blocking_call(self.profile, "fish-audio")
+        return SimpleNamespace(id=f"model_{uuid.uuid4().hex[:12]}")
+
+
+class FakeCloudinaryUploader:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def upload(self, file, **kwargs):
+        _blocking_call(self.profile, "cloudinary")
+        return {"secure_url": f"https://res.cloudinary.com/bench/video/upload/{uuid.uuid4().hex}.mp4"}
+
+
+class FakeCloudConvertJob:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+        self.frames = {}  # job id -> number of frames requested
+
+    def create(self, payload):
+        _blocking_call(self.profile, "cloudconvert")
+        tasks = [
+            {"name": name, "operation": task["operation"], "status": "waiting",
+             "result": {"form": {"url": "https://storage.cloudconvert.com/bench-upload", "parameters": {"key": "bench"}}}
+             if task["operation"] == "import/upload" else None}
+            for name, task in payload["tasks"].items()
+        ]
+        job_id = uuid.uuid4().hex
+        self.frames[job_id] = sum(1 for task in payload["tasks"].values() if task["operation"] == "convert")
+        return {"id": job_id, "status": "waiting", "tasks": tasks}
+
+    def wait(self, id):
+        _blocking_call(self.profile, "cloudconvert")
+        files = [
+            {"filename": f"frame_{i}.jpg", "url": f"https://cdn.bench.local/frames/{id}_{i}.jpg"}
+            for i in range(self.frames.pop(id, 1))
+        ]
+        return {"id": id, "status": "finished", "tasks": [
+            {"name": "export-frame", "operation": "export/url", "status": "finished", "result": {"files": files}},
+        ]}
+
+
+class FakeSupabase:
+    """
+    Accepts any chained query builder call (table().insert().execute(), .upsert(), .select()...).
+    """
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            return self
+        return call
+
+    def execute(self):
+        _blocking_call(self.profile, "supabase")
+        return SimpleNamespace(data=[], count=0)
@@ -0,0 +1,314 @@
+"""
+Offline load benchmark for the generation backend.
+
+Serves the real FastAPI app with uvicorn on a local socket, with every external
+provider replaced by the fakes in bench/fakes.py, drives the chosen endpoints at a
+target concurrency over real HTTP (so streamed bodies show their true first byte)
+and reports p50/p95/p99 latency, throughput and event-loop lag. Exits with status 1
+when a scenario's error rate is above --max-error-rate.
+
+    cd backend
+    python -m bench.run --scenario generate,prompt,speech --concurrency 20 --requests 200
+    python -m bench.run --scenario speech --latency fish-audio=300 --error-rate d-id=0.05 --max-error-rate 0.1 --json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+from contextlib import asynccontextmanager
+
+from bench.fakes import (
+    DEFAULT_PROFILES, PROVIDERS, Profile, build_provider_app,
+    FakeFishSession, FakeCloudinaryUploader, FakeCloudConvertJob, FakeSupabase,
+)
+
+SCENARIOS = ("generate", "prompt", "speech")
+FINAL_STATUSES = {"succeeded", "failed"}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list) -> dict:
+    samples = [round(s * 1000, 1) for s in samples]
+    return {
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": max(samples) if samples else None,
+    }
+
+
+class LoopLagProbe:
+    """
+    Measures how late the event loop wakes a task that asked to sleep for `interval`.
+    Blocking calls on the loop show up here directly.
+    """
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _prepare_environment():
+    # Dummy credentials so every HTTP provider counts as configured; nothing leaves the process
+    for key in ("D_ID_API_KEY", "HUGGING_FACE_API_KEY", "OPENAI_API_KEY"):
+        os.environ.setdefault(key, "bench")
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench-cache-"))
+    os.environ.setdefault("TALK_POLL_INITIAL_DELAY", "0.5")
+    # The SDK clients are replaced by fakes below, so don't import the real ones
+    os.environ.setdefault("PROVIDER_WARMUP", "0")
+    # Every bench request comes from one address; measure the pipeline, not the rate limiter
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+
+def install_fakes(profiles: dict, render_seconds: float):
+    """
+    Imports the app and swaps every provider for its fake. Returns the FastAPI app.
+    """
+    _prepare_environment()
+    import httpx
+    import main
+    from types import SimpleNamespace
+    from services import http, providers
+
+    http.use_transport(httpx.ASGITransport(app=build_provider_app(profiles, render_seconds)))
+    providers.override("fish-audio", FakeFishSession(profiles["fish-audio"]))
+    providers.override("cloudinary", FakeCloudinaryUploader(profiles["cloudinary"]))
+    providers.override("cloudconvert", SimpleNamespace(Job=FakeCloudConvertJob(profiles["cloudconvert"])))
+    providers.override("supabase", FakeSupabase(profiles["supabase"]))
+    return main.app
+
+
+async def _wait_for_job(client, status_url: str, poll_interval: float) -> dict:
+    while True:
+        job = (await client.get(status_url)).json()
+        if job.get("status") in FINAL_STATUSES:
+            return job
+        await asyncio.sleep(poll_interval)
+
+
+def _text(args) -> str:
+    if args.repeat_text:
+        return "Benchmark script with a fixed text so the caches get hits."
+    return f"Benchmark script {uuid.uuid4().hex}."
+
+
+async def one_request(client, scenario: str, args) -> dict:
+    """
+    Issues one request and returns its timings: `accept` is the HTTP round trip,
+    `first_byte`/`total` cover streamed bodies or the whole job.
+    """
+    started = time.perf_counter()
+    if scenario == "generate":
+        files = {"avatar": ("avatar.jpg", random.randbytes(args.avatar_bytes), "image/jpeg")}
+        response = await client.post("/api/generate", files=files, data={"script": _text(args)})
+    elif scenario == "prompt":
+        response = await client.post("/api/prompt-to-video", json={"prompt": _text(args)})
+    else:
+        first_byte = None
+        async with client.stream("POST", "/voice/generate-speech",
+                                 json={"text": _text(args), "voice_id": "bench-voice"}) as response:
+            async for _ in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+        total = time.perf_counter() - started
+        return {"ok": response.status_code == 200, "accept": first_byte or total, "first_byte": first_byte,
+                "total": total}
+
+    accept = time.perf_counter() - started
+    if response.status_code != 202:
+        return {"ok": False, "accept": accept, "total": accept}
+    job = await _wait_for_job(client, response.json()["status_url"], args.poll_interval)
+    return {"ok": job["status"] == "succeeded", "accept": accept, "total": time.perf_counter() - started}
+
+
+async def run_scenario(client, scenario: str, args) -> dict:
+    results = []
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            try:
+                results.append(await one_request(client, scenario, args))
+            except Exception as e:
+                results.append({"ok": False, "error": str(e)})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    report = {
+        "scenario": scenario,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "accept": summarize([r["accept"] for r in ok]),
+        "total": summarize([r["total"] for r in ok]),
+    }
+    first_bytes = [r["first_byte"] for r in ok if r.get("first_byte") is not None]
+    if first_bytes:
+        report["first_byte"] = summarize(first_bytes)
+    return report
+
+
+@asynccontextmanager
+async def serve(app):
+    """
+    Runs the app under uvicorn on a free localhost port, on the current event
+    loop, and yields its base URL. An in-memory ASGI transport would buffer
+    streamed responses, so time to first byte would equal the total.
+    """
+    import uvicorn
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level="warning", access_log=False))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    try:
+        while not server.started:
+            if task.done():
+                # Startup failed; surface its error
+                await task
+                raise RuntimeError("uvicorn exited before it started serving.")
+            await asyncio.sleep(0.05)
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        await task
+        sock.close()
+
+
+async def main_async(args) -> dict:
+    import httpx
+    profiles = {name: Profile(p.latency_ms, p.jitter_ms, p.error_rate, p.payload_bytes)
+                for name, p in DEFAULT_PROFILES.items()}
+    for name, value in args.latency:
+        profiles[name].latency_ms = value
+    for name, value in args.jitter:
+        profiles[name].jitter_ms = value
+    for name, value in args.error_rate:
+        profiles[name].error_rate = value
+    for name, value in args.payload:
+        profiles[name].payload_bytes = int(value)
+
+    app = install_fakes(profiles, args.render_seconds)
+    probe = LoopLagProbe()
+    reports = []
+    async with serve(app) as base_url:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+            probe.start()
+            for scenario in args.scenario:
+                reports.append(await run_scenario(client, scenario, args))
+            await probe.stop()
+
+    return {
+        "concurrency": args.concurrency,
+        "scenarios": reports,
+        "event_loop_lag": summarize(probe.lags),
+    }
+
+
+def _provider_value(text: str):
+    name, _, value = text.partition("=")
+    if name not in PROVIDERS or not value:
+        raise argparse.ArgumentTypeError(f"expected PROVIDER=VALUE with PROVIDER in {', '.join(PROVIDERS)}")
+    return name, float(value)
+
+
+def _scenarios(text: str):
+    names = [s.strip() for s in text.split(",") if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    return names
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", type=_scenarios, default=list(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--latency", type=_provider_value, action="append", default=[], metavar="PROVIDER=MS")
+    parser.add_argument("--jitter", type=_provider_value, action="append", default=[], metavar="PROVIDER=MS")
+    parser.add_argument("--error-rate", type=_provider_value, action="append", default=[], metavar="PROVIDER=P")
+    parser.add_argument("--payload", type=_provider_value, action="append", default=[], metavar="PROVIDER=BYTES")
+    parser.add_argument("--render-seconds", type=float, default=5.0, help="fake D-ID render time")
+    parser.add_argument("--avatar-bytes", type=int, default=200_000)
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="job status poll interval")
+    parser.add_argument("--repeat-text", action="store_true", help="reuse one script so caches hit")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="fail (exit 1) when a scenario's share of failed requests is above this")
+    return parser.parse_args(argv)
+
+
+def print_report(report: dict):
+    print(f"concurrency={report['concurrency']}")
+    header = f"{'scenario':<10} {'reqs':>5} {'errs':>5} {'rps':>7}  {'metric':<10} {'p50':>9} {'p95':>9} {'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in report["scenarios"]:
+        prefix = f"{r['scenario']:<10} {r['requests']:>5} {r['errors']:>5} {r['throughput_rps']:>7}"
+        for metric in ("accept", "first_byte", "total"):
+            if metric not in r:
+                continue
+            s = r[metric]
+            print(f"{prefix}  {metric:<10} {s['p50_ms'] or '-':>9} {s['p95_ms'] or '-':>9} {s['p99_ms'] or '-':>9}")
+            prefix = " " * len(prefix)
+    lag = report["event_loop_lag"]
+    print(f"event loop lag (ms): p50={lag['p50_ms']} p95={lag['p95_ms']} p99={lag['p99_ms']} max={lag['max_ms']}")
+
+
+def failed_scenarios(report: dict, max_error_rate: float) -> list:
+    return [r for r in report["scenarios"] if r["requests"] and r["errors"] / r["requests"] > max_error_rate]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    failed = failed_scenarios(report, args.max_error_rate)
+    for r in failed:
+        print(f"{r['scenario']}: {r['errors']}/{r['requests']} requests failed, "
+              f"above --max-error-rate {args.max_error_rate}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
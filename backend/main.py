@@ -1,12 +1,59 @@
-import os
-from fastapi import FastAPI
+import time
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+
+_started = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Loads .env once for the whole process
+from services.settings import settings
+from services import jobs, http, metrics, providers, supabase
+
+PROVIDER_WARMUP = settings.get("PROVIDER_WARMUP", "1") == "1"
+
+ROUTERS = ["clone", "video", "voice", "animation", "storage", "generate", "prompt", "youtube", "batch", "jobs", "metrics", "assets", "webhooks"]
+# router -> ms spent importing it (including anything it pulled in first)
+import_timings = {}
+
+
+def import_router(name: str):
+    started = time.perf_counter()
+    module = importlib.import_module(f"routers.{name}")
+    import_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return module
+
 
-app = FastAPI()
+def startup_report() -> str:
+    lines = [f"Startup: imports took {sum(import_timings.values()) + _base_import_ms:.0f} ms "
+             f"(framework and services {_base_import_ms:.0f} ms)"]
+    for name, ms in sorted(import_timings.items(), key=lambda item: -item[1]):
+        lines.append(f"  routers.{name:<10} {ms:>8.1f} ms")
+    lines.append("Providers (clients are built on first use):")
+    lines.extend(providers.report())
+    return "\n".join(lines)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(startup_report())
+    await http.startup()
+    await jobs.startup()
+    # Import the provider SDKs off the event loop once the app is already serving
+    warmup = asyncio.create_task(asyncio.to_thread(providers.warm)) if PROVIDER_WARMUP else None
+    yield
+    if warmup:
+        await warmup
+    await jobs.shutdown()
+    # Write out job rows still buffered for Supabase
+    await supabase.writer.stop()
+    await animation.talk_watcher.stop()
+    await http.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS (adjust origins as needed)
 app.add_middleware(
@@ -17,8 +64,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Routers (to be implemented)
-from routers import clone, video, voice, animation, storage, generate, prompt, youtube
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so IDs in the path don't explode the series count
+    route = request.scope.get("route")
+    metrics.http_request_seconds.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        endpoint=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+_base_import_ms = round((time.perf_counter() - _started) * 1000, 1)
+
+# Routers. A router whose provider isn't configured still loads; its endpoints answer 503
+clone, video, voice, animation, storage, generate, prompt, youtube, batch, jobs_router, metrics_router, assets_router, webhooks_router = (
+    import_router(name) for name in ROUTERS
+)
 app.include_router(clone.router)
 app.include_router(video.router, prefix="/video", tags=["video"])
 app.include_router(voice.router, prefix="/voice", tags=["voice"])
@@ -27,7 +92,11 @@ app.include_router(storage.router, prefix="/storage", tags=["storage"])
 app.include_router(generate.router)
 app.include_router(prompt.router)
 app.include_router(youtube.router)
+app.include_router(batch.router)
+app.include_router(jobs_router.router)
+app.include_router(metrics_router.router)
+app.include_router(assets_router.router)
+app.include_router(webhooks_router.router)
 
-# Celery config stub (to be implemented)
-# from worker import celery_app
-# app.celery_app = celery_app
\ No newline at end of file
+# Generation jobs run in-process by default; set JOB_BACKEND=celery (and REDIS_URL)
+# to hand them to the workers in worker.py instead.
@@ -1,45 +1,37 @@
-import os
-import requests
-import base64
-import time
+import asyncio
+import httpx
 from fastapi import APIRouter, HTTPException, Body, UploadFile, File
-from dotenv import load_dotenv
 
-load_dotenv()
+from services import assets, providers, resilience, webhooks
+from services.http import get_client, error_detail
+from services.talks import TalkWatcher
+from services.streams import iter_upload
 
 router = APIRouter()
 
-D_ID_API_KEY = os.getenv("D_ID_API_KEY")
-if not D_ID_API_KEY:
-    raise RuntimeError("D_ID_API_KEY environment variable not set.")
+async def fetch_talk(talk_id: str) -> httpx.Response:
+    return await get_client().get(f"https://api.d-id.com/talks/{talk_id}", headers=providers.get("d-id"))
 
-# Prepare the auth header
-auth_string = f"{D_ID_API_KEY}".encode('utf-8')
-b64_auth_string = base64.b64encode(auth_string).decode('utf-8')
-headers = {
-    "accept": "application/json",
-    "content-type": "application/json",
-    "authorization": f"Basic {b64_auth_string}"
-}
+async def lookup_talk(talk_id: str):
+    return await webhooks.inbox.lookup("d-id", talk_id)
+
+# Shared watcher that polls every in-flight talk from one task. With the D-ID
+# webhook configured it waits for the callback and only polls talks it is late for
+talk_watcher = TalkWatcher(
+    fetch_talk,
+    lookup=lookup_talk if webhooks.enabled("d-id") else None,
+    fallback_after=webhooks.WEBHOOK_GRACE_SECONDS if webhooks.enabled("d-id") else 0.0,
+)
 
 # Helper to upload files to a public URL
-def upload_to_public_url(file_bytes, content_type):
+async def upload_to_public_url(source, content_type, size=None, filename="file"):
+    """
+    Puts bytes, a local file path or an async chunk iterator in the asset store
+    and returns a URL providers can fetch. Identical files share one upload.
+    `size` is accepted for older callers; the store measures the file itself.
+    """
     try:
-        upload_response = requests.post(
-            'https://tmpfiles.org/api/v1/upload',
-            files={'file': ('file', file_bytes, content_type)}
-        )
-        upload_response.raise_for_status()
-        # The URL is in the format: https://tmpfiles.org/dl/{id}/{filename}
-        # We need the direct file URL, which is usually at a different path.
-        # Let's construct it from the data part of the URL.
-        url_data = upload_response.json()['data']['url']
-        file_id = url_data.split('/')[-2]
-        file_name = url_data.split('/')[-1]
-        direct_url = f"https://tmpfiles.org/dl/{file_id}/{file_name}"
-        # A small hack: let's reformat the URL for direct access if tmpfiles' format is tricky
-        direct_url = url_data.replace('/dl/', '/files/')
-        return direct_url
+        return await assets.put(source, content_type, filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload file for public URL: {str(e)}")
 
@@ -50,11 +42,11 @@ async def upload_for_animation(avatar: UploadFile = File(...), audio: UploadFile
     Uploads avatar and audio files and returns public URLs.
     """
     try:
-        avatar_bytes = await avatar.read()
-        audio_bytes = await audio.read()
-
-        avatar_url = upload_to_public_url(avatar_bytes, avatar.content_type)
-        audio_url = upload_to_public_url(audio_bytes, audio.content_type)
+        # Both uploads are streamed into the asset store instead of being read into memory
+        avatar_url, audio_url = await asyncio.gather(
+            upload_to_public_url(iter_upload(avatar), avatar.content_type, size=avatar.size, filename=avatar.filename or "file"),
+            upload_to_public_url(iter_upload(audio), audio.content_type, size=audio.size, filename=audio.filename or "file"),
+        )
 
         return {"avatar_url": avatar_url, "audio_url": audio_url}
     except Exception as e:
@@ -71,6 +63,7 @@ async def create_animation(payload: dict = Body(...)):
 
     if not avatar_url or not audio_url:
         raise HTTPException(status_code=400, detail="Missing 'avatar_url' or 'audio_url' in request body.")
+    headers = providers.get("d-id")
 
     try:
         # Create a talk
@@ -81,17 +74,25 @@ async def create_animation(payload: dict = Body(...)):
                 "audio_url": audio_url
             }
         }
-        
-        create_talk_response = requests.post("https://api.d-id.com/talks", headers=headers, json=talk_payload)
-        create_talk_response.raise_for_status()
+        if webhooks.enabled("d-id"):
+            talk_payload["webhook"] = webhooks.callback_url("d-id")
+
+        async def post():
+            response = await get_client().post("https://api.d-id.com/talks", headers=headers, json=talk_payload)
+            response.raise_for_status()
+            return response
+
+        # Creating a talk isn't idempotent: only retried when the request never reached D-ID
+        create_talk_response = await resilience.call("d-id", "create_talk", post, idempotent=False)
         talk_data = create_talk_response.json()
 
         return {"talk_id": talk_data.get("id")}
 
-    except requests.exceptions.RequestException as e:
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
         # Log the error response from D-ID if available
-        error_detail = e.response.json() if e.response else str(e)
-        raise HTTPException(status_code=500, detail=f"Failed to create D-ID talk: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"Failed to create D-ID talk: {error_detail(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
@@ -101,13 +102,28 @@ async def get_animation_status(talk_id: str):
     """
     Checks the status of a D-ID talk.
     """
+    providers.require("d-id")
     try:
-        status_response = requests.get(f"https://api.d-id.com/talks/{talk_id}", headers=headers)
+        status_response = await fetch_talk(talk_id)
         status_response.raise_for_status()
         return status_response.json()
 
-    except requests.exceptions.RequestException as e:
-        error_detail = e.response.json() if e.response else str(e)
-        raise HTTPException(status_code=500, detail=f"Failed to get D-ID talk status: {error_detail}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get D-ID talk status: {error_detail(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}") 
+
+
+@router.get("/talks/{talk_id}/wait")
+async def wait_for_animation(talk_id: str, timeout: float = 25):
+    """
+    Long-polls a D-ID talk: returns once it finishes, or 504 if it is still rendering after `timeout` seconds.
+    Clients can call this in a loop instead of polling /talks/{talk_id}.
+    """
+    providers.require("d-id")
+    try:
+        return await asyncio.wait_for(talk_watcher.wait(talk_id), timeout=min(timeout, 60))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Talk is still rendering.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"D-ID talk failed: {str(e)}")
@@ -0,0 +1,21 @@
+import os
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from services import assets
+
+router = APIRouter()
+
+@router.get("/assets/{key}")
+async def get_asset(key: str):
+    """
+    Serves an asset stored by the local backend, for providers fetching it by URL.
+    """
+    store = assets.get_store()
+    if store.backend.name != "local" or not assets.ASSET_KEY_PATTERN.match(key):
+        raise HTTPException(status_code=404, detail="Asset not found.")
+    path = store.backend.path(key)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Asset not found.")
+    # Content-addressed, so the bytes behind a key never change
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
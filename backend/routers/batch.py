@@ -0,0 +1,140 @@
+import json
+import uuid
+import asyncio
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
+
+from routers.animation import upload_to_public_url
+from routers.generate import GENERATE_STAGES, PIPELINE_PROVIDERS
+from services import events, providers, voices
+from services.admission import caller_lane, charge
+from services.auth import optional_user
+from services.settings import settings
+from services.jobs import pipeline, enqueue, get_job
+from services.pipeline import run_dag
+from services.streams import iter_upload
+
+router = APIRouter()
+
+BATCH_MAX_ITEMS = int(settings.get("BATCH_MAX_ITEMS", "100"))
+# Seconds a batch stream waits for item events before re-reading the job records
+BATCH_POLL_SECONDS = float(settings.get("BATCH_POLL_SECONDS", "15"))
+FINAL_STATUSES = ("succeeded", "failed")
+
+# Script items reuse the /api/generate stages, minus the avatar upload done once per batch
+BATCH_SCRIPT_STAGES = [stage for stage in GENERATE_STAGES if stage.name != "avatar_upload"]
+
+
+@pipeline("batch_script", stages=[stage.name for stage in BATCH_SCRIPT_STAGES], model="manual")
+async def run_batch_script(ctx, job_id: str, avatar_url: str, voice_id: str, script: str, user_id: str = None):
+    inputs = {"job_id": job_id, "avatar_url": avatar_url, "voice_id": voice_id, "script": script, "user_id": user_id}
+    values = await run_dag(ctx, BATCH_SCRIPT_STAGES, inputs)
+    return {"job_id": job_id, "script": script, "video_url": values["final_url"]}
+
+
+async def _wait_for_item(index: int, job_id: str, queue: asyncio.Queue) -> dict:
+    """
+    Waits for one queued item's job to finish, from its status events or, if
+    those went missing, from its job record.
+    """
+    while True:
+        try:
+            event, data = await asyncio.wait_for(queue.get(), BATCH_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            data = await get_job(job_id) or {}
+            event = "status"
+        if event != "status" or data.get("status") not in FINAL_STATUSES:
+            continue
+        if data["status"] == "failed":
+            return {"index": index, "job_id": job_id, "status": "failed", "error": data.get("error")}
+        return {"index": index, "status": "succeeded", **(data.get("result") or {"job_id": job_id})}
+
+
+def _encode(event: str, data: dict, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps(data) + "\n"
+
+
+@router.post("/api/batch")
+async def batch(
+    request: Request,
+    avatar: UploadFile = File(None),
+    scripts: List[str] = Form(None),
+    prompts: List[str] = Form(None),
+    voice_id: str = Form(None),
+    format: str = Form(None),
+    user_id: str = Depends(optional_user),
+    lane: str = Depends(caller_lane),
+):
+    """
+    Generates many videos for one avatar/voice. Pass repeated `scripts` fields (with
+    `avatar`) or repeated `prompts` fields. Shared assets are uploaded once, then every
+    item is queued as its own job in the caller's fair-share lane and charged one
+    admission token. Each result is streamed back as it finishes: NDJSON by default,
+    SSE with format=sse or Accept: text/event-stream. Items keep running if the client
+    disconnects; their jobs are listed in the `start` event.
+    """
+    if bool(scripts) == bool(prompts):
+        raise HTTPException(status_code=400, detail="Provide either 'scripts' or 'prompts'.")
+    items = scripts or prompts
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can contain at most {BATCH_MAX_ITEMS} items.")
+    if scripts and not avatar:
+        raise HTTPException(status_code=400, detail="Missing 'avatar' for a scripts batch.")
+
+    fmt = format or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")
+    if fmt not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'.")
+    providers.require(*PIPELINE_PROVIDERS, *(() if scripts else ("openai", "huggingface")))
+    # One token per video: a batch costs what the same jobs queued one by one would
+    charge(lane, cost=len(items))
+
+    batch_id = str(uuid.uuid4())
+    voice_id = await voices.registry.resolve(user_id, voice_id)
+
+    if scripts:
+        # Upload the shared avatar once for every item
+        avatar_url = await upload_to_public_url(
+            iter_upload(avatar), avatar.content_type or "image/jpeg",
+            size=avatar.size, filename=avatar.filename or "avatar.jpg"
+        )
+        kind = "batch_script"
+        make_inputs = lambda item: {"avatar_url": avatar_url, "voice_id": voice_id, "script": item, "user_id": user_id}
+    else:
+        kind = "prompt"
+        make_inputs = lambda item: {"voice_id": voice_id, "prompt": item, "user_id": user_id}
+
+    # Subscribed before queueing so no item can finish unseen
+    job_ids = [f"{batch_id}-{index}" for index in range(len(items))]
+    queues = {job_id: events.bus.subscribe(job_id) for job_id in job_ids}
+    try:
+        for job_id, item in zip(job_ids, items):
+            await enqueue(kind, make_inputs(item), job_id=job_id, lane=lane)
+    except Exception:
+        for job_id, queue in queues.items():
+            events.bus.unsubscribe(job_id, queue)
+        raise
+
+    async def results():
+        tasks = [
+            asyncio.create_task(_wait_for_item(index, job_id, queues[job_id]))
+            for index, job_id in enumerate(job_ids)
+        ]
+        succeeded = 0
+        try:
+            yield _encode("start", {"batch_id": batch_id, "items": len(items), "job_ids": job_ids}, fmt)
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                succeeded += result["status"] == "succeeded"
+                yield _encode("item", result, fmt)
+            yield _encode("done", {"batch_id": batch_id, "succeeded": succeeded, "failed": len(items) - succeeded}, fmt)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for job_id, queue in queues.items():
+                events.bus.unsubscribe(job_id, queue)
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(results(), media_type=media_type, headers={"X-Batch-Id": batch_id})
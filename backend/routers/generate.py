@@ -1,74 +1,128 @@
-import os
 import uuid
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends
 from fastapi.responses import JSONResponse
 
-from routers.voice import generate_speech
-from routers.animation import create_animation, get_animation_status
+from routers.voice import synthesize_to_file
+from routers.animation import create_animation, talk_watcher, upload_to_public_url
 from routers.storage import upload_video
+from services import providers, scratch, voices
+from services.admission import caller_lane, charge
+from services.auth import optional_user
 from services.supabase import save_job
+from services.jobs import pipeline, enqueue, accepted
+from services.pipeline import Stage, run_dag
+from services.streams import iter_upload
 
 router = APIRouter()
 
-TEMP_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp')
-os.makedirs(TEMP_DIR, exist_ok=True)
+# Providers every video pipeline needs: speech, animation and final storage
+PIPELINE_PROVIDERS = ("fish-audio", "d-id", "cloudinary")
 
-@router.post("/api/generate")
+@router.post("/api/generate", status_code=202)
 async def generate(
     avatar: UploadFile = File(...),
     script: str = Form(...),
-    dry_run: bool = Form(False)
+    voice_id: str = Form(None),
+    dry_run: bool = Form(False),
+    user_id: str = Depends(optional_user),
+    lane: str = Depends(caller_lane),
 ):
     job_id = str(uuid.uuid4())
-    avatar_path = os.path.abspath(os.path.join(TEMP_DIR, f"{job_id}_avatar.jpg"))
-
-    # Save avatar file
-    with open(avatar_path, "wb") as f:
-        f.write(await avatar.read())
 
     if dry_run:
-        return {"job_id": job_id, "video_url": f"https://mock.cdn/video/{job_id}.mp4"}
-
-    # 1. Generate speech (returns StreamingResponse, so we need to save to file)
-    try:
-        speech_resp = await generate_speech({"text": script, "voice_id": job_id})
-        voice_path = os.path.abspath(os.path.join(TEMP_DIR, f"{job_id}_voice.mp3"))
-        with open(voice_path, "wb") as vf:
-            async for chunk in speech_resp.body_iterator:
-                if isinstance(chunk, str):
-                    vf.write(chunk.encode())
-                else:
-                    vf.write(chunk)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Speech generation failed: {e}")
-
-    # 2. Create animation (returns talk_id)
-    try:
-        anim_resp = await create_animation({"avatar_url": avatar_path, "audio_url": voice_path})
-        talk_id = anim_resp.get("talk_id")
-        if not talk_id:
-            raise Exception("No talk_id returned from animation")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Animation creation failed: {e}")
-
-    # 3. Poll for animation status and get video URL
-    try:
-        status = await get_animation_status(talk_id)
-        video_url = status.get("result", {}).get("url")
-        if not video_url:
-            raise Exception("No video URL in animation status")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Animation status failed: {e}")
-
-    # 4. Upload video to storage
-    try:
-        storage_resp = await upload_video({"video_url": video_url})
-        final_url = storage_resp.get("url", video_url)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Storage upload failed: {e}")
+        # Nothing is queued, so not the route's 202
+        return JSONResponse({"job_id": job_id, "video_url": f"https://mock.cdn/video/{job_id}.mp4"}, status_code=200)
+
+    providers.require(*PIPELINE_PROVIDERS)
+    # Charged after the dry run and provider checks, so only queued jobs cost tokens
+    charge(lane)
+
+    # Save avatar file for the job, copied across in chunks and shared with whichever worker runs it
+    await scratch.save(job_id, "avatar.jpg", iter_upload(avatar))
+    voice_id = await voices.registry.resolve(user_id, voice_id)
+    await enqueue("generate", {"avatar_file": "avatar.jpg", "script": script, "voice_id": voice_id, "user_id": user_id},
+                  job_id=job_id, lane=lane)
+    return accepted(job_id, user_id)
+
+
+# Stages shared with the prompt-to-video pipeline
+
+async def speech_stage(job_id: str, voice_id: str, script: str):
+    # Generate speech, streamed straight to file
+    voice_path = await scratch.path(job_id, "voice.mp3")
+    await synthesize_to_file(script, voice_id, voice_path)
+    return {"voice_path": voice_path}
+
+
+async def audio_upload_stage(voice_path: str):
+    # D-ID needs a public URL for the audio
+    return {"audio_url": await upload_to_public_url(voice_path, "audio/mpeg")}
+
+
+async def animation_stage(avatar_url: str, audio_url: str):
+    # Create animation (returns talk_id)
+    anim_resp = await create_animation({"avatar_url": avatar_url, "audio_url": audio_url})
+    talk_id = anim_resp.get("talk_id")
+    if not talk_id:
+        raise Exception("No talk_id returned from animation")
+    return {"talk_id": talk_id}
+
 
+async def render_stage(talk_id: str):
+    # Wait for the animation to finish and get video URL
+    status = await talk_watcher.wait(talk_id)
+    video_url = status.get("result_url") or status.get("result", {}).get("url")
+    if not video_url:
+        raise Exception("No video URL in animation status")
+    return {"video_url": video_url}
+
+
+async def storage_stage(video_url: str):
+    # Upload video to storage
+    storage_resp = await upload_video({"video_url": video_url})
+    return {"final_url": storage_resp.get("url", video_url)}
+
+
+# Stages specific to /api/generate
+
+async def avatar_upload_stage(job_id: str, avatar_file: str):
+    # D-ID needs a public URL for the avatar
+    avatar_path = await scratch.fetch(job_id, avatar_file)
+    return {"avatar_url": await upload_to_public_url(avatar_path, "image/jpeg")}
+
+
+async def save_generate_stage(job_id: str, script: str, avatar_url: str, final_url: str, stage_timings: dict,
+                              user_id: str):
     # Save job to Supabase
-    # If you have a public URL for the avatar, use it. Otherwise, store the local path or a placeholder.
-    save_job(job_id, script, avatar_path, final_url, prompt="", model="manual")
+    save_job(job_id, script, avatar_url, final_url, prompt="", model="manual", stage_timings=stage_timings,
+             user_id=user_id)
+    return {}
+
+
+# The avatar upload overlaps with speech synthesis; animation waits for both URLs
+GENERATE_STAGES = [
+    Stage("avatar_upload", avatar_upload_stage, requires=["job_id", "avatar_file"], provides=["avatar_url"],
+          error="Avatar upload failed"),
+    Stage("speech", speech_stage, requires=["job_id", "voice_id", "script"], provides=["voice_path"],
+          error="Speech generation failed", checkpoint=False),
+    Stage("audio_upload", audio_upload_stage, requires=["voice_path"], provides=["audio_url"],
+          error="Audio upload failed"),
+    Stage("animation", animation_stage, requires=["avatar_url", "audio_url"], provides=["talk_id"],
+          error="Animation creation failed"),
+    Stage("render", render_stage, requires=["talk_id"], provides=["video_url"],
+          error="Animation status failed"),
+    Stage("storage", storage_stage, requires=["video_url"], provides=["final_url"],
+          error="Storage upload failed"),
+    Stage("save", save_generate_stage,
+          requires=["job_id", "script", "avatar_url", "final_url", "stage_timings", "user_id"]),
+]
+
 
-    return {"job_id": job_id, "video_url": final_url} 
\ No newline at end of file
+@pipeline("generate", stages=[stage.name for stage in GENERATE_STAGES], model="manual")
+async def run_generate(ctx, job_id: str, avatar_file: str, script: str, voice_id: str = None, user_id: str = None):
+    """
+    Speech -> D-ID -> Cloudinary -> Supabase chain behind /api/generate.
+    """
+    inputs = {"job_id": job_id, "voice_id": voice_id, "avatar_file": avatar_file, "script": script, "user_id": user_id}
+    values = await run_dag(ctx, GENERATE_STAGES, inputs)
+    return {"job_id": job_id, "video_url": values["final_url"]}
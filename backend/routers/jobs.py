@@ -0,0 +1,161 @@
+import json
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+
+from services import events, history, providers
+from services.settings import settings
+from services.admission import admit
+from services.auth import optional_user, require_user, verify_job_token
+from services.jobs import get_job, owns, resume, ResumeError, accepted
+
+router = APIRouter()
+
+# Seconds between keepalive comments on an idle event stream
+JOB_EVENTS_KEEPALIVE = float(settings.get("JOB_EVENTS_KEEPALIVE", "15"))
+FINAL_STATUSES = ("succeeded", "failed")
+
+
+def _timestamp(name: str, value: str):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be an ISO 8601 date or timestamp.")
+
+
+@router.get("/api/jobs")
+async def list_jobs(
+    user_id: str = Depends(require_user),
+    cursor: str = None,
+    limit: int = Query(20, ge=1, le=history.JOB_HISTORY_MAX_LIMIT),
+    model: str = None,
+    status: str = None,
+    since: str = None,
+    until: str = None,
+    fields: str = None,
+):
+    """
+    Lists the signed-in user's jobs, newest first. Pass the returned `next_cursor`
+    as `cursor` for the next page; `fields` is a comma-separated column list.
+    """
+    providers.require("supabase")
+    columns = None
+    if fields:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(columns) - set(history.HISTORY_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}.")
+    if cursor:
+        try:
+            history.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        return await history.list_jobs(
+            user_id, limit=limit, cursor=cursor, model=model, status=status,
+            since=_timestamp("since", since), until=_timestamp("until", until), fields=columns,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load job history: {e}")
+
+
+@router.get("/api/jobs/{job_id}")
+async def job_status(job_id: str, user_id: str = Depends(optional_user)):
+    """
+    Returns the overall and per-stage status of a queued generation job. A
+    signed-in user's job is only shown to them; its inputs and checkpoints
+    (e.g. the YouTube session URI) never are.
+    """
+    job = await get_job(job_id)
+    if not job or not owns(job, user_id):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return _snapshot(job)
+
+
+def _progress(stages: dict) -> float:
+    # Finished stages count fully, a running stage by its own percent when it reports one
+    if not stages:
+        return 0.0
+    done = 0.0
+    for stage in stages.values():
+        if stage.get("status") in ("done", "skipped"):
+            done += 1
+        elif stage.get("status") == "running" and stage.get("percent") is not None:
+            done += stage["percent"] / 100
+    return round(done * 100 / len(stages), 1)
+
+
+def _snapshot(job: dict) -> dict:
+    snapshot = {key: value for key, value in job.items() if key not in ("inputs", "checkpoints")}
+    snapshot["progress"] = _progress(job["stages"])
+    return snapshot
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, token: str = None, user_id: str = Depends(optional_user)):
+    """
+    Streams a job's progress as Server-Sent Events: a `snapshot` of its status,
+    then `stage` events (with overall `progress` in percent) and `status` events
+    as they happen. The stream ends once the job has succeeded or failed.
+    A signed-in user's job needs their Authorization header or the `token`
+    from the events_url the job was queued with.
+    """
+    # Subscribed before reading the snapshot so nothing falls in between
+    queue = events.bus.subscribe(job_id)
+    job = await get_job(job_id)
+    if not job or not (owns(job, user_id) or verify_job_token(token, job_id, job.get("user_id"))):
+        events.bus.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+
+    async def stream():
+        nonlocal job
+        try:
+            yield _sse("snapshot", _snapshot(job))
+            if job["status"] in FINAL_STATUSES:
+                return
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), JOB_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if event == "status" and data["status"] == "queued":
+                    # Resumed: its stages were reset, so start over from a fresh snapshot
+                    job = await get_job(job_id) or job
+                    yield _sse("snapshot", _snapshot(job))
+                    continue
+                if event == "stage":
+                    job["stages"][data["stage"]] = {key: value for key, value in data.items() if key != "stage"}
+                    data = {**data, "progress": _progress(job["stages"])}
+                yield _sse(event, data)
+                if event == "status" and data["status"] in FINAL_STATUSES:
+                    return
+        finally:
+            events.bus.unsubscribe(job_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/api/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str, user_id: str = Depends(optional_user), lane: str = Depends(admit)):
+    """
+    Re-queues a failed job from its first incomplete stage; finished stages
+    are restored from their checkpoints instead of being run again. Only the
+    owner can resume a signed-in user's job.
+    """
+    try:
+        await resume(job_id, lane=lane, user_id=user_id)
+    except ResumeError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return accepted(job_id, user_id)
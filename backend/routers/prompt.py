@@ -1,140 +1,124 @@
-import os
 import uuid
-import requests
-from fastapi import APIRouter, HTTPException, Body
+import asyncio
+from fastapi import APIRouter, Body, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-from routers.voice import generate_speech
-from routers.animation import create_animation, get_animation_status
-from routers.storage import upload_video
+from routers.animation import upload_to_public_url
+from routers.video import generate_image
+from routers.generate import PIPELINE_PROVIDERS, speech_stage, audio_upload_stage, animation_stage, render_stage, storage_stage
+from services import providers, scratch, scripts, voices
+from services.admission import caller_lane, charge
+from services.auth import optional_user
 from services.supabase import save_job
-
-load_dotenv()
+from services.jobs import pipeline, enqueue, accepted
+from services.pipeline import Stage, run_dag
+from services.cache import link_or_copy
 
 router = APIRouter()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-HUGGING_FACE_API_KEY = os.getenv("HUGGING_FACE_API_KEY")
-
 class PromptRequest(BaseModel):
     prompt: str
+    voice_id: str = None
     dry_run: bool = False
 
-@router.post("/api/prompt-to-video")
-async def prompt_to_video(payload: PromptRequest = Body(...)):
+@router.post("/api/prompt-to-video", status_code=202)
+async def prompt_to_video(payload: PromptRequest = Body(...), user_id: str = Depends(optional_user),
+                          lane: str = Depends(caller_lane)):
     job_id = str(uuid.uuid4())
     prompt = payload.prompt
     dry_run = payload.dry_run
 
-    # 1. Use OpenAI GPT to generate script and avatar_description
     if dry_run:
         script = f"This is a mock script for: {prompt}"
-        avatar_description = f"A mock avatar for: {prompt}"
         image_url = f"https://mock.cdn/image/{job_id}.jpg"
         video_url = f"https://mock.cdn/video/{job_id}.mp4"
-        return {
+        return JSONResponse({
             "job_id": job_id,
             "script": script,
             "image_url": image_url,
             "video_url": video_url
-        }
-
-    # OpenAI GPT call
-    try:
-        openai_url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        system_prompt = (
-            "You are an AI assistant that generates a short video script and a visual description for an avatar image, "
-            "based on a user's prompt. Respond in JSON with 'script' and 'avatar_description'."
-        )
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 400,
-            "temperature": 0.7
-        }
-        resp = requests.post(openai_url, headers=headers, json=data, timeout=30)
-        resp.raise_for_status()
-        gpt_content = resp.json()["choices"][0]["message"]["content"]
-        # Try to parse as JSON
-        import json as pyjson
-        try:
-            gpt_json = pyjson.loads(gpt_content)
-            script = gpt_json["script"]
-            avatar_description = gpt_json["avatar_description"]
-        except Exception:
-            # Fallback: try to extract script and description from text
-            script = gpt_content
-            avatar_description = prompt
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OpenAI GPT failed: {e}")
+        }, status_code=200)
+
+    providers.require("openai", "huggingface", *PIPELINE_PROVIDERS)
+    charge(lane)
+    voice_id = await voices.registry.resolve(user_id, payload.voice_id)
+    await enqueue("prompt", {"prompt": prompt, "voice_id": voice_id, "user_id": user_id}, job_id=job_id,
+                  lane=lane)
+    return accepted(job_id, user_id)
+
 
+async def script_stage(prompt: str, emit):
+    # 1. Use OpenAI GPT to generate script and avatar_description, streamed so the
+    # image stage can start as soon as the description is complete
+    async def on_field(key: str, value):
+        if key == "avatar_description" and isinstance(value, str):
+            emit("avatar_description", value)
+
+    return await scripts.generate_script(prompt, on_field=on_field)
+
+
+async def image_stage(job_id: str, avatar_description: str):
     # 2. Use Stable Diffusion (Hugging Face) to generate avatar image
-    try:
-        sd_url = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
-        sd_headers = {"Authorization": f"Bearer {HUGGING_FACE_API_KEY}"}
-        sd_resp = requests.post(sd_url, headers=sd_headers, json={"inputs": avatar_description}, timeout=60)
-        sd_resp.raise_for_status()
-        # Save image to temp and get a URL (mock: save to disk, in prod: upload to S3/CDN)
-        image_path = f"temp/{job_id}_avatar.jpg"
-        with open(image_path, "wb") as f:
-            f.write(sd_resp.content)
-        image_url = image_path  # In real use, upload to CDN and get URL
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Stable Diffusion failed: {e}")
-
-    # 3. Use Fish.audio to generate voice from script
-    try:
-        speech_resp = await generate_speech({"text": script, "voice_id": job_id})
-        voice_path = f"temp/{job_id}_voice.mp3"
-        with open(voice_path, "wb") as vf:
-            async for chunk in speech_resp.body_iterator:
-                if isinstance(chunk, str):
-                    vf.write(chunk.encode())
-                else:
-                    vf.write(chunk)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Speech generation failed: {e}")
-
-    # 4. Use D-ID to animate avatar with voice
-    try:
-        anim_resp = await create_animation({"avatar_url": image_url, "audio_url": voice_path})
-        talk_id = anim_resp.get("talk_id")
-        if not talk_id:
-            raise Exception("No talk_id returned from animation")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Animation creation failed: {e}")
-
-    # 5. Poll for animation status and get video URL
-    try:
-        status = await get_animation_status(talk_id)
-        video_url = status.get("result", {}).get("url")
-        if not video_url:
-            raise Exception("No video URL in animation status")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Animation status failed: {e}")
-
-    # 6. Upload video to Cloudinary
-    try:
-        storage_resp = await upload_video({"video_url": video_url})
-        final_url = storage_resp.get("url", video_url)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Storage upload failed: {e}")
+    cached_path = await generate_image(avatar_description)
+    # Link image into the job's scratch directory for the upload stage
+    image_path = await scratch.path(job_id, "avatar.jpg")
+    await asyncio.to_thread(link_or_copy, cached_path, image_path)
+    return {"image_path": image_path}
+
 
+async def image_upload_stage(image_path: str):
+    # D-ID needs a public URL for the avatar
+    return {"image_url": await upload_to_public_url(image_path, "image/jpeg")}
+
+
+async def prompt_animation_stage(image_url: str, audio_url: str):
+    # The generated image is the avatar D-ID animates
+    return await animation_stage(avatar_url=image_url, audio_url=audio_url)
+
+
+async def save_prompt_stage(job_id: str, script: str, image_url: str, final_url: str, prompt: str,
+                            stage_timings: dict, user_id: str):
     # Save job to Supabase
-    save_job(job_id, script, image_url, final_url, prompt, model="prompt")
+    save_job(job_id, script, image_url, final_url, prompt, model="prompt", stage_timings=stage_timings,
+             user_id=user_id)
+    return {}
+
+
+# Image generation and speech synthesis both only need the GPT output, so they
+# (and their uploads) run side by side before the D-ID render
+PROMPT_STAGES = [
+    Stage("script", script_stage, requires=["prompt", "emit"], provides=["script", "avatar_description"],
+          error="OpenAI GPT failed"),
+    Stage("image", image_stage, requires=["job_id", "avatar_description"], provides=["image_path"],
+          error="Stable Diffusion failed", checkpoint=False),
+    Stage("image_upload", image_upload_stage, requires=["image_path"], provides=["image_url"],
+          error="Avatar upload failed"),
+    Stage("speech", speech_stage, requires=["job_id", "voice_id", "script"], provides=["voice_path"],
+          error="Speech generation failed", checkpoint=False),
+    Stage("audio_upload", audio_upload_stage, requires=["voice_path"], provides=["audio_url"],
+          error="Audio upload failed"),
+    Stage("animation", prompt_animation_stage, requires=["image_url", "audio_url"], provides=["talk_id"],
+          error="Animation creation failed"),
+    Stage("render", render_stage, requires=["talk_id"], provides=["video_url"],
+          error="Animation status failed"),
+    Stage("storage", storage_stage, requires=["video_url"], provides=["final_url"],
+          error="Storage upload failed"),
+    Stage("save", save_prompt_stage,
+          requires=["job_id", "script", "image_url", "final_url", "prompt", "stage_timings", "user_id"]),
+]
+
 
+@pipeline("prompt", stages=[stage.name for stage in PROMPT_STAGES], model="prompt")
+async def run_prompt_to_video(ctx, job_id: str, prompt: str, voice_id: str = None, user_id: str = None):
+    """
+    GPT -> (SDXL | speech) -> D-ID -> Cloudinary -> Supabase DAG behind /api/prompt-to-video.
+    """
+    inputs = {"job_id": job_id, "voice_id": voice_id, "prompt": prompt, "user_id": user_id}
+    values = await run_dag(ctx, PROMPT_STAGES, inputs)
     return {
         "job_id": job_id,
-        "script": script,
-        "image_url": image_url,
-        "video_url": final_url
-    } 
\ No newline at end of file
+        "script": values["script"],
+        "image_url": values["image_url"],
+        "video_url": values["final_url"]
+    }
@@ -1,21 +1,12 @@
-import os
-import cloudinary
-import cloudinary.uploader
+import asyncio
+import hashlib
 from fastapi import APIRouter, HTTPException, Body
-from dotenv import load_dotenv
 
-load_dotenv()
+from services import providers, resilience
+from services.metrics import track
 
 router = APIRouter()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
-
 @router.post("/upload-video")
 async def upload_video(payload: dict = Body(...)):
     """
@@ -24,14 +15,27 @@ async def upload_video(payload: dict = Body(...)):
     video_url = payload.get("video_url")
     if not video_url:
         raise HTTPException(status_code=400, detail="Missing 'video_url' in request body.")
+    uploader = providers.get("cloudinary")
 
     try:
-        # Upload the video to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            video_url,
-            resource_type="video",
-            folder="generated_content" # Optional: specify a folder in Cloudinary
-        )
+        # Upload the video to Cloudinary; it fetches the URL itself, so no bytes pass
+        # through us. The SDK call is blocking, so it runs in the threadpool.
+        # The public_id is derived from the source URL, so a retried upload overwrites
+        # the same asset instead of creating a duplicate.
+        public_id = hashlib.sha256(video_url.encode("utf-8")).hexdigest()[:32]
+
+        async def upload():
+            with track("cloudinary", "upload"):
+                return await asyncio.to_thread(
+                    uploader.upload,
+                    video_url,
+                    resource_type="video",
+                    folder="generated_content", # Optional: specify a folder in Cloudinary
+                    public_id=public_id,
+                    overwrite=True
+                )
+
+        upload_result = await resilience.call("cloudinary", "upload", upload)
         return {"url": upload_result.get("secure_url")}
 
     except Exception as e:
@@ -1,90 +1,106 @@
 import os
-import tempfile
-import cloudconvert
-import requests
-import io
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
-from dotenv import load_dotenv
-
-load_dotenv()
+import shutil
+import asyncio
+import hashlib
+import httpx
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse
+
+from services import assets, frames, providers, resilience
+from services.settings import settings
+from services.http import get_client
+from services.cache import TieredCache, SingleFlight, cache_key
+from services.streams import iter_upload, spooled_path
 
 router = APIRouter()
 
-# It's recommended to move this to a central configuration file
-CLOUDCONVERT_API_KEY = os.getenv("CLOUDCONVERT_API_KEY")
+SDXL_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
+SDXL_URL = f"https://api-inference.huggingface.co/models/{SDXL_MODEL}"
+
+IMAGE_CACHE_MAX_BYTES = int(settings.get("IMAGE_CACHE_MAX_BYTES", str(1024 ** 3)))
+image_cache = TieredCache("sdxl", max_bytes=IMAGE_CACHE_MAX_BYTES, suffix=".jpg")
+_image_flights = SingleFlight()
+
+
+async def generate_image(inputs, parameters: dict = None) -> str:
+    """
+    Runs SDXL on a text prompt or image bytes and returns the cached image path.
+    Identical requests are served from the cache, and concurrent identical
+    requests share a single upstream call.
+    """
+    if isinstance(inputs, bytes):
+        key = cache_key(model=SDXL_MODEL, image_sha256=hashlib.sha256(inputs).hexdigest(), parameters=parameters or {})
+    else:
+        key = cache_key(model=SDXL_MODEL, prompt=inputs, parameters=parameters or {})
+
+    cached_path = await image_cache.get_path(key)
+    if cached_path:
+        return cached_path
+
+    headers = providers.get("huggingface")
+
+    async def post():
+        if isinstance(inputs, bytes):
+            response = await get_client().post(SDXL_URL, headers=headers, content=inputs, timeout=60)
+        else:
+            body = {"inputs": inputs}
+            if parameters:
+                body["parameters"] = parameters
+            response = await get_client().post(SDXL_URL, headers=headers, json=body, timeout=60)
+        response.raise_for_status()
+        return response
 
-if not CLOUDCONVERT_API_KEY:
-    raise RuntimeError("CLOUDCONVERT_API_KEY environment variable not set.")
+    async def call():
+        # Retried on 503s too, which is how the inference API reports a model still loading
+        response = await resilience.call("huggingface", "sdxl", post)
+        path = image_cache.disk.put(key, response.content)
+        await image_cache.publish(key)
+        return path
 
-HUGGING_FACE_API_KEY = os.getenv("HUGGING_FACE_API_KEY")
-if not HUGGING_FACE_API_KEY:
-    raise RuntimeError("HUGGING_FACE_API_KEY environment variable not set.")
+    return await _image_flights.do(key, call)
 
-cloudconvert.configure(api_key=CLOUDCONVERT_API_KEY, sandbox=False)
 
 @router.post("/extract-frame")
-async def extract_frame(file: UploadFile = File(...)):
+async def extract_frame(file: UploadFile = File(...), timestamps: str = Form("1")):
     """
-    Extracts the first frame from a video file and returns the URL to the frame.
+    Extracts frames from a video file at the given comma-separated timestamps
+    (seconds) and returns their URLs. `frame_url` is the first one.
     """
     if not file.content_type or not file.content_type.startswith('video/'):
         raise HTTPException(status_code=400, detail="File provided is not a video.")
+    try:
+        times = [float(t) for t in timestamps.split(",") if t.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamps '{timestamps}'.")
+    if not times or len(times) > frames.FRAME_MAX_TIMESTAMPS or min(times) < 0:
+        raise HTTPException(status_code=400, detail=f"Expected 1 to {frames.FRAME_MAX_TIMESTAMPS} non-negative timestamps.")
+
+    engine = frames.get_engine()
+    if engine.name == "cloudconvert":
+        providers.require("cloudconvert")
 
     try:
-        # The client is already configured and ready to use
-        
-        # 1. Create a job
-        job_payload = {
-            "tasks": {
-                'import-file': {
-                    'operation': 'import/upload'
-                },
-                'extract-frame': {
-                    'operation': 'convert',
-                    'input': 'import-file',
-                    'output_format': 'jpg',
-                    "engine": "ffmpeg",
-                    "capture_mode": "time",
-                    "capture_time": 1,
-                    'filename': 'frame.jpg'
-                },
-                'export-frame': {
-                    'operation': 'export/url',
-                    'input': 'extract-frame',
-                    'inline': False,
-                    'archive_multiple_files': False
-                }
-            }
+        # 1. Spool the upload to disk, since the engines seek in the file
+        suffix = os.path.splitext(file.filename or "")[1]
+        async with spooled_path(iter_upload(file), suffix=suffix) as video_path:
+            # 2. Grab every requested frame in one pass
+            out_dir, paths = await frames.extract(video_path, times, engine)
+        # 3. Serve them from the asset store
+        try:
+            urls = await asyncio.gather(*(assets.put(path, "image/jpeg", "frame.jpg") for path in paths))
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        return {
+            "frame_url": urls[0],
+            "frames": [{"time": t, "url": url} for t, url in zip(times, urls)],
+            "engine": engine.name,
         }
-        
-        job = cloudconvert.Job.create(payload=job_payload)
-        
-        # 2. Upload the file by saving it to a temporary file first
-        upload_task = next(task for task in job.get("tasks", []) if task.get('operation') == 'import/upload')
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename) as temp_file:
-            temp_file.write(await file.read())
-            temp_file_path = temp_file.name
-
-        cloudconvert.Task.upload(file_name=temp_file_path, task=upload_task)
-        
-        os.unlink(temp_file_path) # Clean up the temporary file
-
-        # 3. Wait for the job to finish
-        job = cloudconvert.Job.wait(id=job['id'])
-
-        # 4. Get the URL of the exported file
-        if job['status'] == 'finished':
-            export_task = next(task for task in job['tasks'] if task['name'] == 'export-frame')
-            if export_task and export_task['status'] == 'finished':
-                file_info = export_task['result']['files'][0]
-                return {"frame_url": file_info['url']}
-            else:
-                 raise HTTPException(status_code=500, detail="Frame export failed.")
-        else:
-            raise HTTPException(status_code=500, detail="CloudConvert job failed.")
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # A timestamp past the end of the video
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -93,23 +109,28 @@ async def generate_avatar(image_url: str):
     """
     Generates an avatar from an image URL using Stable Diffusion.
     """
-    API_URL = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
-    headers = {"Authorization": f"Bearer {HUGGING_FACE_API_KEY}"}
-
+    providers.require("huggingface")
     try:
         # Download the image from the provided URL
-        image_response = requests.get(image_url, stream=True)
+        image_response = await get_client().get(image_url)
         image_response.raise_for_status()
         image_bytes = image_response.content
 
-        # Call the Hugging Face API
-        response = requests.post(API_URL, headers=headers, data=image_bytes)
-        response.raise_for_status()
+        # Call the Hugging Face API (or reuse an identical earlier generation)
+        image_path = await generate_image(image_bytes)
 
-        # The response from the SDXL API is the image itself, return as a stream
-        return StreamingResponse(io.BytesIO(response.content), media_type="image/jpeg")
+        # The response from the SDXL API is the image itself
+        return FileResponse(image_path, media_type="image/jpeg")
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to call Hugging Face API: {e}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache-stats")
+async def image_cache_stats():
+    """
+    Hit/miss counters of the SDXL generation cache.
+    """
+    return {**image_cache.stats(), "coalesced": _image_flights.coalesced}
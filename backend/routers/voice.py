@@ -1,74 +1,219 @@
-import os
-import tempfile
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body
-from fastapi.responses import StreamingResponse
-from fish_audio_sdk import Session, TTSRequest, ReferenceAudio
-from dotenv import load_dotenv
+import asyncio
+import unicodedata
+from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Depends
+from fastapi.responses import StreamingResponse, FileResponse
 import io
 
-load_dotenv()
+from services import providers, resilience, voices
+from services.auth import optional_user, require_user
+from services.settings import settings
+from services.cache import TieredCache, SingleFlight, cache_key, iter_file, iter_in_thread, link_or_copy
+from services.metrics import track, provider_bytes
 
 router = APIRouter()
 
-FISH_AUDIO_API_KEY = os.getenv("FISH_AUDIO_API_KEY")
-if not FISH_AUDIO_API_KEY:
-    raise RuntimeError("FISH_AUDIO_API_KEY environment variable not set.")
+# Everything besides voice and text that changes the synthesized audio
+TTS_PARAMS = {"format": "mp3", "mp3_bitrate": 128}
 
-session = Session(FISH_AUDIO_API_KEY)
+TTS_CACHE_MAX_BYTES = int(settings.get("TTS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+tts_cache = TieredCache("tts", max_bytes=TTS_CACHE_MAX_BYTES, suffix=".mp3")
+# Chunks held for a slow listener before it is switched to reading the cached file
+TTS_STREAM_BUFFER = int(settings.get("TTS_STREAM_BUFFER", "64"))
+_tts_flights = SingleFlight()
 
 @router.post("/clone-voice")
-async def clone_voice(file: UploadFile = File(...)):
+async def clone_voice(file: UploadFile = File(...), user_id: str = Depends(optional_user)):
     """
-    Creates a new voice model from an audio file using Fish Audio.
+    Creates a voice model from an audio file using Fish Audio. Audio that was
+    cloned before reuses its existing model, and the voice becomes the signed-in
+    user's default for the generation pipelines.
     """
     if not file.content_type or not file.content_type.startswith('audio/'):
         raise HTTPException(status_code=400, detail="File provided is not an audio file.")
+    providers.require("fish-audio")
 
     try:
-        audio_bytes = await file.read()
-        
-        # Using a temporary file as the SDK can work with file paths
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file.write(audio_bytes)
-            temp_file_path = temp_file.name
-
-        # Create a voice model
-        model = session.create_model(
-            name="Generated User Voice",
-            files=[temp_file_path]
-        )
-        
-        os.unlink(temp_file_path) # Clean up the temp file
-
-        return {"voice_id": model.id}
+        voice, reused = await voices.registry.clone(await file.read(), user_id=user_id)
+        return {"voice_id": voice["voice_id"], "reused": reused}
 
     except Exception as e:
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
         raise HTTPException(status_code=500, detail=f"Failed to clone voice with Fish Audio: {str(e)}")
 
 
+@router.get("/voices")
+async def list_voices(user_id: str = Depends(require_user)):
+    """
+    The signed-in user's cloned voices, most recently used first.
+    """
+    return {"voices": await voices.registry.voices_for(user_id)}
+
+
+def tts_cache_key(text: str, voice_id: str) -> str:
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return cache_key(voice_id=voice_id, text=normalized, **TTS_PARAMS)
+
+
+async def _synthesize(key: str, text: str, voice_id: str):
+    """
+    Yields audio chunks as Fish Audio produces them while writing them into the
+    TTS cache. The SDK iterator and the file writes are blocking, so each step
+    runs in a worker thread.
+    """
+    request = providers.fish_tts_request(reference_id=voice_id, text=text, **TTS_PARAMS)
+    session = providers.get("fish-audio")
+
+    def open_stream():
+        return iter_in_thread(session.tts(request))
+
+    received = 0
+    # Retried until the first chunk arrives; after that a failure surfaces and the cache entry is dropped
+    with track("fish-audio", "tts"):
+        async with tts_cache.disk.async_writer(key) as f:
+            async for chunk in resilience.guard("fish-audio").stream("tts", open_stream):
+                received += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+                yield chunk
+    provider_bytes.inc(received, provider="fish-audio", direction="received")
+    await tts_cache.publish(key)
+
+
+class _Listener:
+    """
+    Chunks of a synthesis as they arrive (None marks the end), for the caller
+    that started it. At most TTS_STREAM_BUFFER are held: a listener that falls
+    further behind is detached and finishes from the cached file instead.
+    """
+    def __init__(self):
+        self.chunks = asyncio.Queue(maxsize=TTS_STREAM_BUFFER)
+        self.detached = False
+
+    def offer(self, chunk):
+        if self.detached:
+            return
+        try:
+            self.chunks.put_nowait(chunk)
+        except asyncio.QueueFull:
+            self.detached = True
+
+
+def _synthesis(key: str, text: str, voice_id: str, listener: _Listener = None) -> asyncio.Future:
+    """
+    The one synthesis of a cache entry shared by every concurrent caller,
+    started if none is running. It resolves to the cached file. Only the caller
+    that starts it gets the chunks on its listener as they arrive.
+    """
+    async def fill():
+        try:
+            async for chunk in _synthesize(key, text, voice_id):
+                if listener is not None:
+                    listener.offer(chunk)
+        finally:
+            if listener is not None:
+                listener.offer(None)
+        return tts_cache.disk.path(key)
+
+    return _tts_flights.start(key, fill)
+
+
+async def _stream_synthesis(key: str, text: str, voice_id: str):
+    """
+    Yields freshly synthesized audio. A request for speech that is already being
+    synthesized waits for that synthesis and streams the cached file instead.
+    """
+    if _tts_flights.running(key):
+        cached_path = await asyncio.shield(_synthesis(key, text, voice_id))
+        async for chunk in iter_file(cached_path):
+            yield chunk
+        return
+
+    listener = _Listener()
+    flight = _synthesis(key, text, voice_id, listener)
+    sent = 0
+    # Once detached nothing more is queued, so an empty queue means we've caught up
+    while not (listener.detached and listener.chunks.empty()):
+        chunk = await listener.chunks.get()
+        if chunk is None:
+            break
+        sent += len(chunk)
+        yield chunk
+    # Raises the synthesis error, if any
+    cached_path = await asyncio.shield(flight)
+    if listener.detached:
+        async for chunk in iter_file(cached_path, start=sent):
+            yield chunk
+
+
+async def stream_speech(text: str, voice_id: str):
+    """
+    Yields audio for the text, from the cache when possible.
+    """
+    key = tts_cache_key(text, voice_id)
+    cached_path = await tts_cache.get_path(key)
+    chunks = iter_file(cached_path) if cached_path else _stream_synthesis(key, text, voice_id)
+    async for chunk in chunks:
+        yield chunk
+
+
+async def synthesize_to_file(text: str, voice_id: str, path: str) -> str:
+    """
+    Makes sure the speech is cached and links it to path for the generation pipelines.
+    """
+    key = tts_cache_key(text, voice_id)
+    cached_path = await tts_cache.get_path(key)
+    if not cached_path:
+        cached_path = await asyncio.shield(_synthesis(key, text, voice_id))
+    await asyncio.to_thread(link_or_copy, cached_path, path)
+    return path
+
+
 @router.post("/generate-speech")
 async def generate_speech(payload: dict = Body(...)):
     """
     Generates speech from text using a specified voice ID with Fish Audio.
+    Audio is streamed to the client as it is synthesized unless "stream" is false.
     """
     text = payload.get("text")
     voice_id = payload.get("voice_id")
+    stream = payload.get("stream", True)
 
     if not text or not voice_id:
         raise HTTPException(status_code=400, detail="Missing 'text' or 'voice_id' in request body.")
+    providers.require("fish-audio")
 
     try:
-        # Generate audio stream
-        audio_stream = session.tts(TTSRequest(
-            reference_id=voice_id,
-            text=text
-        ))
-        
-        # Collect audio chunks and return as a stream
-        audio_bytes = b"".join(chunk for chunk in audio_stream)
-        return StreamingResponse(io.BytesIO(audio_bytes), media_type="audio/mpeg")
+        key = tts_cache_key(text, voice_id)
+        cached_path = await tts_cache.get_path(key)
+        if cached_path:
+            return FileResponse(cached_path, media_type="audio/mpeg", headers={"X-TTS-Cache": "hit"})
+
+        chunks = _stream_synthesis(key, text, voice_id)
+
+        if not stream:
+            # Collect audio chunks and return as a single body
+            audio_bytes = b"".join([chunk async for chunk in chunks])
+            return StreamingResponse(io.BytesIO(audio_bytes), media_type="audio/mpeg")
+
+        # Pull the first chunk before responding so upstream errors still surface as a 500
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = b""
+
+        async def body():
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+
+        return StreamingResponse(body(), media_type="audio/mpeg")
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate speech with Fish Audio: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to generate speech with Fish Audio: {str(e)}")
+
+
+
+@router.get("/cache-stats")
+async def tts_cache_stats():
+    """
+    Hit/miss counters and disk usage of the TTS cache, plus voice reuse counters.
+    """
+    return {**tts_cache.stats(), "voice_registry": voices.registry.stats()}
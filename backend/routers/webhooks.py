@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from services import webhooks
+from services.talks import DONE_STATUSES, FAILED_STATUSES
+from routers.animation import talk_watcher
+
+router = APIRouter()
+
+CLOUDCONVERT_FINAL_EVENTS = {"job.finished", "job.failed"}
+
+
+@router.post("/api/webhooks/d-id")
+async def d_id_webhook(request: Request, token: str = ""):
+    """
+    Receives D-ID's callback for a finished talk and wakes the stage waiting on it.
+    Repeat deliveries are acknowledged without being processed again.
+    """
+    if not webhooks.verify_token("d-id", token):
+        raise HTTPException(status_code=401, detail="Invalid webhook token.")
+    payload = await request.json()
+    talk_id = payload.get("id")
+    if not talk_id:
+        raise HTTPException(status_code=400, detail="Missing talk 'id' in webhook payload.")
+    if payload.get("status") not in DONE_STATUSES | FAILED_STATUSES:
+        return {"received": True, "ignored": True}
+
+    fresh = await webhooks.inbox.deliver("d-id", talk_id, payload)
+    # Settling an already settled talk is a no-op
+    talk_watcher.resolve(talk_id, payload)
+    return {"received": True, "duplicate": not fresh}
+
+
+@router.post("/api/webhooks/cloudconvert")
+async def cloudconvert_webhook(request: Request):
+    """
+    Receives CloudConvert's job.finished / job.failed events, signed with the
+    webhook's signing secret, and wakes the request waiting on the job.
+    """
+    body = await request.body()
+    if not webhooks.verify_signature("cloudconvert", body, request.headers.get("CloudConvert-Signature")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature.")
+    payload = await request.json()
+    job = payload.get("job") or {}
+    if payload.get("event") not in CLOUDCONVERT_FINAL_EVENTS or not job.get("id"):
+        return {"received": True, "ignored": True}
+
+    fresh = await webhooks.inbox.deliver("cloudconvert", job["id"], job)
+    return {"received": True, "duplicate": not fresh}
+
+
+@router.get("/api/webhooks/stats")
+async def webhook_stats():
+    """
+    Webhook deliveries received, repeated and matched to a waiting stage.
+    """
+    return {"enabled": {p: webhooks.enabled(p) for p in webhooks.SECRETS}, **webhooks.inbox.stats()}
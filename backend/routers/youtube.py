@@ -1,10 +1,12 @@
-import os
-import tempfile
-import requests
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Depends
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+
+from services import youtube
+from services.admission import caller_lane, charge
+from services.auth import optional_user
+from services.jobs import pipeline, enqueue, accepted
+from services.pipeline import Stage, run_dag
 
 router = APIRouter()
 
@@ -15,44 +17,70 @@ class YouTubeUploadRequest(BaseModel):
     access_token: str
     dry_run: bool = False
 
-@router.post("/youtube/upload")
-async def youtube_upload(payload: YouTubeUploadRequest = Body(...)):
+@router.post("/youtube/upload", status_code=202)
+async def youtube_upload(payload: YouTubeUploadRequest = Body(...), user_id: str = Depends(optional_user),
+                         lane: str = Depends(caller_lane)):
+    """
+    Queues an upload of a hosted video to YouTube. Poll the returned status_url:
+    the upload stage reports uploaded_bytes / total_bytes as it goes, and a failed
+    upload resumed through /api/jobs/{job_id}/resume continues from the last byte
+    YouTube acknowledged.
+    """
     if payload.dry_run:
-        return {"youtube_url": "https://youtube.com/watch?v=abc123", "dry_run": True}
+        return JSONResponse({"youtube_url": "https://youtube.com/watch?v=abc123", "dry_run": True})
+    charge(lane)
 
-    # Download video to temp file
+    kwargs = {
+        "video_url": payload.video_url,
+        "title": payload.title,
+        "description": payload.description,
+        "access_token": payload.access_token,
+        "user_id": user_id,
+    }
     try:
-        resp = requests.get(payload.video_url, stream=True)
-        resp.raise_for_status()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-            for chunk in resp.iter_content(chunk_size=8192):
-                tmp.write(chunk)
-            temp_video_path = tmp.name
+        job_id = await enqueue("youtube_upload", kwargs, lane=lane)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to download video: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue YouTube upload: {e}")
+    return accepted(job_id, user_id)
+
+
+async def session_stage(video_url: str, title: str, description: str, access_token: str):
+    # 1. Open a resumable session; its URI is checkpointed so a resumed job reuses it
+    if not access_token:
+        raise Exception("The upload session expired and no access token was kept; upload the video again.")
+    size = await youtube.source_size(video_url)
+    session_uri = await youtube.start_session(access_token, youtube.video_metadata(title, description), size)
+    return {"session_uri": session_uri, "total_bytes": size}
+
+
+async def upload_stage(ctx, session_uri: str, video_url: str, total_bytes: int):
+    # 2. Stream the video from its URL into the session, chunk by chunk
+    async def report(uploaded: int, size: int):
+        await ctx.progress("upload", uploaded_bytes=uploaded, total_bytes=size,
+                           percent=round(uploaded * 100 / size, 1) if size else 100.0)
 
-    # Upload to YouTube
     try:
-        credentials = type('Creds', (), {'token': payload.access_token, 'valid': True, 'expired': False, 'refresh_token': None})()
-        youtube = build('youtube', 'v3', credentials=credentials)
-        body = {
-            'snippet': {
-                'title': payload.title,
-                'description': payload.description,
-                'categoryId': '22',  # People & Blogs
-            },
-            'status': {
-                'privacyStatus': 'unlisted',
-            }
-        }
-        media = MediaFileUpload(temp_video_path, mimetype='video/mp4', resumable=True)
-        request = youtube.videos().insert(part=','.join(body.keys()), body=body, media_body=media)
-        response = request.execute()
-        youtube_url = f"https://youtube.com/watch?v={response['id']}"
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"YouTube upload failed: {e}")
-    finally:
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
+        video = await youtube.upload(session_uri, video_url, total_bytes, on_progress=report)
+    except youtube.UploadSessionExpired:
+        raise Exception("The YouTube upload session expired; upload the video again.")
+    return {"youtube_id": video["id"], "youtube_url": f"https://youtube.com/watch?v={video['id']}"}
+
+
+YOUTUBE_STAGES = [
+    Stage("session", session_stage, requires=["video_url", "title", "description", "access_token"],
+          provides=["session_uri", "total_bytes"], error="Failed to start YouTube upload"),
+    Stage("upload", upload_stage, requires=["ctx", "session_uri", "video_url", "total_bytes"],
+          provides=["youtube_id", "youtube_url"], error="YouTube upload failed"),
+]
+
 
-    return {"youtube_url": youtube_url, "dry_run": False} 
\ No newline at end of file
+@pipeline("youtube_upload", stages=[stage.name for stage in YOUTUBE_STAGES], model="youtube")
+async def run_youtube_upload(ctx, job_id: str, video_url: str, title: str, description: str,
+                             access_token: str = None, user_id: str = None):
+    """
+    Resumable YouTube upload streamed from the video's URL. The access token is
+    never stored, so resuming relies on the checkpointed session URI.
+    """
+    inputs = {"video_url": video_url, "title": title, "description": description, "access_token": access_token}
+    values = await run_dag(ctx, YOUTUBE_STAGES, inputs)
+    return {"job_id": job_id, "youtube_url": values["youtube_url"], "dry_run": False}
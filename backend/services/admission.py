@@ -0,0 +1,237 @@
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from fastapi import Depends, HTTPException, Request
+
+from services import metrics
+from services.auth import optional_user
+from services.settings import settings
+
+ADMISSION_ENABLED = settings.get("ADMISSION_ENABLED", "1") == "1"
+# Per-user token bucket: sustained generation requests per second and the burst allowed on top
+ADMISSION_USER_RATE = float(settings.get("ADMISSION_USER_RATE", "0.2"))
+ADMISSION_USER_BURST = float(settings.get("ADMISSION_USER_BURST", "5"))
+# Jobs waiting for a worker, across everyone and per user
+ADMISSION_MAX_QUEUED = int(settings.get("ADMISSION_MAX_QUEUED", "100"))
+ADMISSION_USER_MAX_QUEUED = int(settings.get("ADMISSION_USER_MAX_QUEUED", "10"))
+# Jobs a lane gets per round-robin turn; anonymous callers are grouped by client address
+ADMISSION_USER_WEIGHT = int(settings.get("ADMISSION_USER_WEIGHT", "2"))
+ADMISSION_ANONYMOUS_WEIGHT = int(settings.get("ADMISSION_ANONYMOUS_WEIGHT", "1"))
+# Bucket entries kept before idle (full) buckets are dropped
+ADMISSION_MAX_BUCKETS = int(settings.get("ADMISSION_MAX_BUCKETS", "10000"))
+
+admission_decisions = metrics.Counter(
+    "admission_decisions_total", "Generation requests admitted or rejected with 429.", ["decision", "reason"])
+
+
+class AdmissionRejected(HTTPException):
+    """
+    Raised instead of queueing work the service can't take on right now.
+    """
+    def __init__(self, reason: str, detail: str, retry_after: float):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"{detail} Retry in {seconds}s.",
+            headers={"Retry-After": str(seconds)},
+        )
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1) -> float:
+        """
+        Takes cost tokens and returns 0, or returns the seconds until they'd be available.
+        A cost is capped at the burst, so a large batch empties a full bucket
+        instead of locking its caller out for longer than a refill.
+        """
+        self._refill()
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= needed
+            return 0.0
+        return (needed - self.tokens) / self.rate if self.rate > 0 else 3600.0
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class FairQueue:
+    """
+    Job queue with one lane per user, served by weighted round-robin: each lane
+    hands out up to `weight` jobs per turn before the next lane is served, so a
+    user with a long backlog can't hold back anyone else's first job.
+    """
+    def __init__(self):
+        self._lanes = OrderedDict()  # lane -> deque of items, in serving order
+        self._credit = {}  # lane -> items left in its current turn
+        self._weights = {}
+        self._available = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._available is None:
+            self._available = asyncio.Semaphore(0)
+        return self._available
+
+    def put(self, lane: str, item, weight: int = 1):
+        if lane not in self._lanes:
+            self._lanes[lane] = deque()
+            self._credit[lane] = max(1, weight)
+        self._weights[lane] = max(1, weight)
+        self._lanes[lane].append(item)
+        self._semaphore().release()
+
+    async def get(self):
+        await self._semaphore().acquire()
+        lane, items = next(iter(self._lanes.items()))
+        item = items.popleft()
+        self._credit[lane] -= 1
+        if not items:
+            del self._lanes[lane], self._credit[lane], self._weights[lane]
+        elif self._credit[lane] <= 0:
+            # Turn used up: back of the line with a fresh allowance
+            self._lanes.move_to_end(lane)
+            self._credit[lane] = self._weights[lane]
+        return item
+
+    def qsize(self) -> int:
+        return sum(len(items) for items in self._lanes.values())
+
+    def lane_size(self, lane: str) -> int:
+        return len(self._lanes.get(lane, ()))
+
+    def stats(self) -> dict:
+        return {"queued": self.qsize(), "lanes": len(self._lanes)}
+
+
+class AdmissionController:
+    """
+    Decides whether a generation request may queue a job: the caller's token
+    bucket must have a token, and neither the global backlog nor the caller's
+    own backlog may be full. The global concurrency budget is the job backend's
+    worker count (`capacity`); jobs beyond it wait in the fair queue.
+    """
+    def __init__(self):
+        self.queue = FairQueue()
+        self.capacity = None  # set by a job backend that runs jobs from self.queue
+        self.running = 0
+        self._buckets = {}
+        # Smoothed job run time, for Retry-After estimates
+        self.avg_job_seconds = 30.0
+
+    def _bucket(self, lane: str) -> TokenBucket:
+        bucket = self._buckets.get(lane)
+        if bucket is None:
+            if len(self._buckets) >= ADMISSION_MAX_BUCKETS:
+                for idle in [key for key, b in self._buckets.items() if b.full]:
+                    del self._buckets[idle]
+            bucket = self._buckets[lane] = TokenBucket(ADMISSION_USER_RATE, ADMISSION_USER_BURST)
+        return bucket
+
+    def _drain_seconds(self, jobs_ahead: int) -> float:
+        # How long until a worker frees up for a job that has jobs_ahead in front of it
+        return (jobs_ahead + 1) * self.avg_job_seconds / max(1, self.capacity or 1)
+
+    def check(self, lane: str, cost: int = 1):
+        """
+        Raises AdmissionRejected, or takes the request's tokens: one per job it queues.
+        A request's jobs must all fit in the backlog caps.
+        """
+        if not ADMISSION_ENABLED:
+            return
+        if self.capacity is not None:
+            if cost > ADMISSION_USER_MAX_QUEUED:
+                raise HTTPException(status_code=400,
+                                    detail=f"At most {ADMISSION_USER_MAX_QUEUED} jobs can be queued at once.")
+            queued = self.queue.qsize()
+            if queued + cost > ADMISSION_MAX_QUEUED:
+                raise AdmissionRejected("busy", "The service is at capacity; try again shortly.",
+                                        self._drain_seconds(queued + cost - 1 - ADMISSION_MAX_QUEUED))
+            own = self.queue.lane_size(lane)
+            if own + cost > ADMISSION_USER_MAX_QUEUED:
+                # Round-robin serves this lane about once per turn of all active lanes
+                raise AdmissionRejected("user_queue", f"You already have {own} jobs waiting.",
+                                        self._drain_seconds(self.queue.stats()["lanes"]))
+        wait = self._bucket(lane).take(cost)
+        if wait:
+            raise AdmissionRejected("rate", "Too many generation requests; slow down.", wait)
+
+    def job_started(self):
+        self.running += 1
+
+    def job_finished(self, seconds: float):
+        self.running -= 1
+        self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * seconds
+
+    def stats(self) -> dict:
+        return {**self.queue.stats(), "running": self.running, "capacity": self.capacity,
+                "avg_job_seconds": round(self.avg_job_seconds, 1)}
+
+
+controller = AdmissionController()
+
+
+def lane_weight(lane: str) -> int:
+    return ADMISSION_ANONYMOUS_WEIGHT if lane.startswith("ip:") else ADMISSION_USER_WEIGHT
+
+
+def lane_for(user_id: str = None, request: Request = None) -> str:
+    if user_id:
+        return user_id
+    return f"ip:{request.client.host if request and request.client else 'unknown'}"
+
+
+async def caller_lane(request: Request, user_id: str = Depends(optional_user)) -> str:
+    """
+    Dependency returning the caller's fair-queue lane without charging it, for
+    endpoints that only know their cost (or that they're a dry run) from the body.
+    """
+    return lane_for(user_id, request)
+
+
+def charge(lane: str, cost: int = 1):
+    """
+    Admits `cost` jobs for the lane, or raises AdmissionRejected (429 with Retry-After).
+    """
+    try:
+        controller.check(lane, cost)
+    except AdmissionRejected as e:
+        admission_decisions.inc(decision="rejected", reason=e.reason)
+        raise
+    admission_decisions.inc(decision="admitted", reason="")
+
+
+async def admit(lane: str = Depends(caller_lane)) -> str:
+    """
+    Dependency for endpoints that start one job. Returns the caller's fair-queue
+    lane, or answers 429 with Retry-After.
+    """
+    charge(lane)
+    return lane
+
+
+def _render_admission_metrics():
+    stats = controller.stats()
+    yield "# HELP admission_queued_jobs Jobs waiting in the fair-share queue."
+    yield "# TYPE admission_queued_jobs gauge"
+    yield f"admission_queued_jobs {stats['queued']}"
+    yield "# HELP admission_running_jobs Jobs running on in-process workers."
+    yield "# TYPE admission_running_jobs gauge"
+    yield f"admission_running_jobs {stats['running']}"
+
+
+metrics.COLLECTORS.append(_render_admission_metrics)
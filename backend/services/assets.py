@@ -0,0 +1,247 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import hashlib
+import mimetypes
+
+from services import providers, resilience
+from services.settings import settings
+from services.cache import CACHE_DIR, SharedCache, SingleFlight, link_or_copy
+from services.http import get_client
+from services.streams import as_chunks, multipart_body
+
+ASSET_PUBLIC_URL = (settings.get("ASSET_PUBLIC_URL") or "").rstrip("/")
+# local | s3 | cloudinary | tmpfiles. Local needs ASSET_PUBLIC_URL, the address providers reach this API at
+ASSET_BACKEND = settings.get("ASSET_BACKEND") or ("local" if ASSET_PUBLIC_URL else "tmpfiles")
+ASSET_DIR = settings.get("ASSET_DIR", os.path.join(CACHE_DIR, "assets"))
+ASSET_S3_PREFIX = settings.get("ASSET_S3_PREFIX", "assets/")
+ASSET_URL_TTL = int(settings.get("ASSET_URL_TTL", str(30 * 24 * 3600)))
+
+# sha256 hex digest plus an optional extension
+ASSET_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+
+
+def _extension(content_type: str, filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext:
+        ext = mimetypes.guess_extension(content_type or "") or ""
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else ""
+
+
+class LocalBackend:
+    """
+    Keeps assets on local disk and serves them from GET /assets/{key}. With more
+    than one API instance, ASSET_DIR must be a shared volume.
+    """
+    name = "local"
+    url_ttl = ASSET_URL_TTL
+
+    def __init__(self, directory: str = ASSET_DIR):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def url(self, key: str) -> str:
+        return f"{ASSET_PUBLIC_URL}/assets/{key}"
+
+    async def put(self, key: str, path: str, content_type: str) -> str:
+        if not os.path.exists(self.path(key)):
+            await asyncio.to_thread(link_or_copy, path, self.path(key))
+        return self.url(key)
+
+
+class S3Backend:
+    """
+    Any S3-compatible bucket (AWS, R2, MinIO...). Objects must be publicly readable,
+    either through the bucket policy or ASSET_PUBLIC_URL pointing at a CDN.
+    """
+    name = "s3"
+    url_ttl = ASSET_URL_TTL
+
+    def url(self, key: str) -> str:
+        object_key = f"{ASSET_S3_PREFIX}{key}"
+        if ASSET_PUBLIC_URL:
+            return f"{ASSET_PUBLIC_URL}/{object_key}"
+        client = providers.get("s3")
+        return f"{client.meta.endpoint_url}/{settings.asset_s3_bucket}/{object_key}"
+
+    async def put(self, key: str, path: str, content_type: str) -> str:
+        client = providers.get("s3")
+        object_key = f"{ASSET_S3_PREFIX}{key}"
+
+        async def upload():
+            await asyncio.to_thread(
+                client.upload_file, path, settings.asset_s3_bucket, object_key,
+                ExtraArgs={"ContentType": content_type, "CacheControl": "public, max-age=31536000, immutable"}
+            )
+
+        # Same key, same bytes: re-uploading is harmless, so retries are safe
+        await resilience.call("s3", "upload", upload)
+        return self.url(key)
+
+
+class CloudinaryBackend:
+    """
+    Stores assets in Cloudinary under their hash, so re-uploads are no-ops.
+    """
+    name = "cloudinary"
+    url_ttl = ASSET_URL_TTL
+
+    async def put(self, key: str, path: str, content_type: str) -> str:
+        uploader = providers.get("cloudinary")
+        public_id = os.path.splitext(key)[0]
+
+        async def upload():
+            return await asyncio.to_thread(
+                uploader.upload, path, resource_type="auto", folder="assets",
+                public_id=public_id, overwrite=False
+            )
+
+        result = await resilience.call("cloudinary", "upload_asset", upload)
+        return result["secure_url"]
+
+
+class TmpfilesBackend:
+    """
+    tmpfiles.org, for setups without a store of their own. Files expire after an hour.
+    """
+    name = "tmpfiles"
+    url_ttl = 30 * 60
+
+    async def put(self, key: str, path: str, content_type: str) -> str:
+        size = os.path.getsize(path)
+
+        async def post():
+            upload_headers, body = multipart_body({}, "file", key, content_type, as_chunks(path), size=size)
+            response = await get_client().post('https://tmpfiles.org/api/v1/upload', headers=upload_headers, content=body)
+            response.raise_for_status()
+            return response
+
+        response = await resilience.call("tmpfiles", "upload", post)
+        # tmpfiles answers with its HTML page URL (/dl/...); the raw file lives under /files/
+        return response.json()['data']['url'].replace('/dl/', '/files/')
+
+
+BACKENDS = {
+    "local": LocalBackend,
+    "s3": S3Backend,
+    "cloudinary": CloudinaryBackend,
+    "tmpfiles": TmpfilesBackend,
+}
+
+
+class AssetStore:
+    """
+    Content-addressed store for the files providers fetch by URL (avatars, audio,
+    frames). Assets are keyed by the sha256 of their bytes, so the same file is
+    uploaded once and its public URL is reused across jobs and workers.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.staging = os.path.join(ASSET_DIR, ".staging")
+        os.makedirs(self.staging, exist_ok=True)
+        # key -> (url, expires_at); shared across workers through Redis when configured
+        self._urls = {}
+        self._shared = SharedCache(f"assets:{backend.name}", ttl=backend.url_ttl)
+        self._flights = SingleFlight()
+        self.counters = {"hits": 0, "uploads": 0}
+
+    async def _stage(self, source) -> tuple:
+        """
+        Copies the source to a staging file, hashing it on the way. Returns (path, sha256).
+        """
+        digest = hashlib.sha256()
+        path = os.path.join(self.staging, uuid.uuid4().hex)
+        try:
+            with open(path, "wb") as f:
+                async for chunk in as_chunks(source):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, digest.hexdigest()
+
+    async def _lookup(self, key: str):
+        cached = self._urls.get(key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        url = await self._shared.get(key)
+        if url is not None:
+            url = url.decode() if isinstance(url, bytes) else url
+            self._urls[key] = (url, time.time() + self.backend.url_ttl)
+        return url
+
+    async def put(self, source, content_type: str, filename: str = "") -> str:
+        """
+        Stores bytes, a local path or an async chunk iterator and returns its public URL.
+        """
+        staged = None
+        if isinstance(source, str):
+            sha = await asyncio.to_thread(_hash_file, source)
+            path = source
+        else:
+            staged, sha = await self._stage(source)
+        key = f"{sha}{_extension(content_type, filename)}"
+
+        url = await self._lookup(key)
+        if url:
+            self.counters["hits"] += 1
+            if staged:
+                os.unlink(staged)
+            return url
+
+        if staged:
+            # Named by content, so the upload doesn't depend on this caller's file
+            # (identical uploads coalesce onto whichever started first)
+            path = os.path.join(self.staging, key)
+            os.replace(staged, path)
+
+        async def upload():
+            try:
+                url = await self._lookup(key)
+                if url:
+                    return url
+                url = await self.backend.put(key, path, content_type)
+                self._urls[key] = (url, time.time() + self.backend.url_ttl)
+                await self._shared.set(key, url.encode())
+                self.counters["uploads"] += 1
+                return url
+            finally:
+                if staged and os.path.exists(path):
+                    os.unlink(path)
+
+        return await self._flights.do(key, upload)
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "known_urls": len(self._urls), **self.counters}
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_store = None
+
+
+def get_store() -> AssetStore:
+    global _store
+    if _store is None:
+        if ASSET_BACKEND not in BACKENDS:
+            raise RuntimeError(f"Unknown ASSET_BACKEND '{ASSET_BACKEND}'. Expected one of: {', '.join(BACKENDS)}")
+        if ASSET_BACKEND == "local" and not ASSET_PUBLIC_URL:
+            print("Warning: ASSET_BACKEND=local without ASSET_PUBLIC_URL; providers won't be able to fetch assets.")
+        _store = AssetStore(BACKENDS[ASSET_BACKEND]())
+    return _store
+
+
+async def put(source, content_type: str, filename: str = "") -> str:
+    return await get_store().put(source, content_type, filename)
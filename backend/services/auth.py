@@ -0,0 +1,100 @@
+import hmac
+import time
+import asyncio
+import hashlib
+import secrets
+from fastapi import Depends, Header, HTTPException
+
+from services import providers
+from services.metrics import track
+from services.settings import settings
+
+# How long a verified Supabase access token is trusted before asking Supabase again
+AUTH_CACHE_TTL = float(settings.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(settings.get("AUTH_CACHE_SIZE", "10000"))
+# Signs the events_url handed out with queued jobs, since EventSource can't send an
+# Authorization header. Set it when more than one process serves the API.
+JOB_TOKEN_SECRET = (settings.get("JOB_TOKEN_SECRET") or secrets.token_hex(32)).encode()
+JOB_TOKEN_TTL = int(settings.get("JOB_TOKEN_TTL", "3600"))
+
+# sha256(token) -> (user id, expires_at)
+_sessions = {}
+
+
+async def verify_token(token: str):
+    """
+    Returns the Supabase user id behind an access token, or None if it isn't valid.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _sessions.get(key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    client = providers.get("supabase")
+
+    def get_user():
+        with track("supabase", "get_user"):
+            return client.auth.get_user(token)
+
+    try:
+        response = await asyncio.to_thread(get_user)
+    except Exception as e:
+        print(f"Supabase rejected an access token: {e}")
+        return None
+    user = getattr(response, "user", None)
+    if user is None:
+        return None
+
+    if len(_sessions) >= AUTH_CACHE_SIZE:
+        now = time.monotonic()
+        for stale in [k for k, (_, expires_at) in _sessions.items() if expires_at <= now] or list(_sessions):
+            del _sessions[stale]
+    _sessions[key] = (user.id, time.monotonic() + AUTH_CACHE_TTL)
+    return user.id
+
+
+async def optional_user(authorization: str = Header(None)):
+    """
+    Dependency: the signed-in user's id from `Authorization: Bearer <Supabase access token>`,
+    or None for anonymous requests.
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected 'Authorization: Bearer <access token>'.")
+    user_id = await verify_token(token.strip())
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session.")
+    return user_id
+
+
+async def require_user(user_id: str = Depends(optional_user)):
+    """
+    Dependency: like optional_user, but anonymous requests get a 401.
+    """
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Sign in to access this endpoint.")
+    return user_id
+
+
+def _job_signature(job_id: str, user_id: str, expires: str) -> str:
+    message = f"{job_id}:{user_id or ''}:{expires}".encode()
+    return hmac.new(JOB_TOKEN_SECRET, message, hashlib.sha256).hexdigest()
+
+
+def sign_job(job_id: str, user_id: str = None, ttl: int = JOB_TOKEN_TTL) -> str:
+    """
+    Short-lived token that stands in for user_id on the job's own URLs.
+    """
+    expires = str(int(time.time()) + ttl)
+    return f"{expires}.{_job_signature(job_id, user_id, expires)}"
+
+
+def verify_job_token(token: str, job_id: str, user_id: str = None) -> bool:
+    """
+    Whether the token was signed for this job and owner and hasn't expired.
+    """
+    expires, _, signature = (token or "").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(_job_signature(job_id, user_id, expires), signature)
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import threading
+import weakref
+from uuid import uuid4
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from starlette.concurrency import iterate_in_threadpool
+
+from services import metrics
+from services.settings import settings
+
+CACHE_DIR = settings.get("CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'cache'))
+CACHE_REDIS_URL = settings.get("CACHE_REDIS_URL")
+CACHE_REDIS_TTL = int(settings.get("CACHE_REDIS_TTL", str(7 * 24 * 3600)))
+
+
+def cache_key(**parts) -> str:
+    """
+    Content-addressed key: sha256 over the canonical JSON of the given parts.
+    """
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def iter_file(path: str, chunk_size: int = 64 * 1024, start: int = 0):
+    """
+    Reads a file in chunks, from byte `start`, without blocking the event loop.
+    """
+    def read_chunks():
+        with open(path, "rb") as f:
+            f.seek(start)
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async for chunk in iterate_in_threadpool(read_chunks()):
+        yield chunk
+
+
+async def iter_in_thread(iterator):
+    """
+    Steps a blocking iterator (e.g. an SDK's response stream) in a worker thread per item.
+    """
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            break
+        yield item
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def link_or_copy(src: str, dst: str):
+    """
+    Hard-links a cached file to dst (falls back to a copy across filesystems).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key onto one in-flight coroutine.
+    """
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    def running(self, key: str) -> bool:
+        return key in self._inflight
+
+    def start(self, key: str, fn) -> asyncio.Future:
+        """
+        The in-flight task for key, starting fn() if there is none.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return task
+
+    async def do(self, key: str, fn):
+        # Shielded so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(self.start(key, fn))
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of files on local disk.
+    Recency is kept in file mtimes so the order survives restarts.
+    """
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ""):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                # Left behind by an interrupted write (other workers may still own recent ones)
+                if time.time() - os.path.getmtime(path) > 3600:
+                    os.unlink(path)
+                continue
+            if not name.endswith(self.suffix):
+                continue
+            key = name[:len(name) - len(self.suffix)]
+            stat = os.stat(path)
+            files.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str):
+        """
+        Returns the cached file path and marks it recently used, or None.
+        """
+        path = self.path(key)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            if not os.path.exists(path):
+                self._bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    @contextmanager
+    def writer(self, key: str):
+        """
+        Yields a file to write the entry into; it is only committed if the block completes.
+        """
+        part_path = self._part_path(key)
+        f = open(part_path, "wb")
+        try:
+            yield f
+            f.close()
+            self._commit(key, part_path)
+        except BaseException:
+            _discard(f, part_path)
+            raise
+
+    @asynccontextmanager
+    async def async_writer(self, key: str):
+        """
+        writer() for coroutines: opening, closing and committing the file run in a
+        worker thread. Writes to the yielded file should go through to_thread too.
+        """
+        part_path = self._part_path(key)
+        f = await asyncio.to_thread(open, part_path, "wb")
+        try:
+            yield f
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(self._commit, key, part_path)
+        except BaseException:
+            await asyncio.to_thread(_discard, f, part_path)
+            raise
+
+    def _part_path(self, key: str) -> str:
+        # Unique per writer: two coroutines on one thread may be filling the same key
+        return f"{self.path(key)}.{uuid4().hex}.part"
+
+    def put(self, key: str, data: bytes) -> str:
+        with self.writer(key) as f:
+            f.write(data)
+        return self.path(key)
+
+    def _commit(self, key: str, part_path: str):
+        size = os.path.getsize(part_path)
+        os.replace(part_path, self.path(key))
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+def _discard(f, part_path: str):
+    f.close()
+    if os.path.exists(part_path):
+        os.unlink(part_path)
+
+
+class SharedCache:
+    """
+    Optional Redis tier shared by every worker/pod. Disabled when CACHE_REDIS_URL is unset.
+    """
+    # Every instance, so close_shared() can drop clients bound to a finished event loop
+    _instances = weakref.WeakSet()
+
+    def __init__(self, namespace: str, url: str = CACHE_REDIS_URL, ttl: int = CACHE_REDIS_TTL):
+        self.namespace = namespace
+        self.url = url
+        self.ttl = ttl
+        self._client = None
+        SharedCache._instances.add(self)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def _redis(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def get(self, key: str):
+        if not self.enabled:
+            return None
+        try:
+            return await self._redis().get(f"{self.namespace}:{key}")
+        except Exception as e:
+            print(f"Shared cache read failed: {e}")
+            return None
+
+    async def set(self, key: str, data: bytes):
+        if not self.enabled:
+            return
+        try:
+            await self._redis().set(f"{self.namespace}:{key}", data, ex=self.ttl)
+        except Exception as e:
+            print(f"Shared cache write failed: {e}")
+
+    async def incr(self, key: str):
+        """
+        Atomically increments a counter and returns its new value (None when disabled).
+        """
+        if not self.enabled:
+            return None
+        try:
+            value = await self._redis().incr(f"{self.namespace}:{key}")
+            await self._redis().expire(f"{self.namespace}:{key}", self.ttl)
+            return value
+        except Exception as e:
+            print(f"Shared cache write failed: {e}")
+            return None
+
+    async def close(self):
+        """
+        Closes the Redis client; the next call opens a new one on the running loop.
+        """
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"Failed to close shared cache client: {e}")
+
+
+async def close_shared():
+    """
+    Closes every SharedCache's Redis client. Called where an event loop ends
+    (each Celery task runs its own), since redis.asyncio clients are bound to
+    the loop they were created on.
+    """
+    for shared in list(SharedCache._instances):
+        await shared.close()
+
+
+class TieredCache:
+    """
+    Local disk LRU in front of an optional shared tier, with hit/miss counters.
+    """
+    def __init__(self, namespace: str, max_bytes: int, suffix: str = ""):
+        self.namespace = namespace
+        self.disk = DiskCache(os.path.join(CACHE_DIR, namespace), max_bytes, suffix)
+        self.shared = SharedCache(namespace)
+        self.counters = {"disk_hits": 0, "shared_hits": 0, "misses": 0}
+        CACHES.append(self)
+
+    async def get_path(self, key: str):
+        """
+        Returns a local path for the entry, pulling it from the shared tier if needed.
+        """
+        path = self.disk.get(key)
+        if path:
+            self.counters["disk_hits"] += 1
+            return path
+        data = await self.shared.get(key)
+        if data is not None:
+            self.counters["shared_hits"] += 1
+            return await asyncio.to_thread(self.disk.put, key, data)
+        self.counters["misses"] += 1
+        return None
+
+    async def publish(self, key: str):
+        """
+        Copies a committed disk entry to the shared tier.
+        """
+        if not self.shared.enabled:
+            return
+        path = self.disk.get(key)
+        if path:
+            await self.shared.set(key, await asyncio.to_thread(read_file, path))
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters.values())
+        hits = self.counters["disk_hits"] + self.counters["shared_hits"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "disk": self.disk.stats(),
+            "shared": self.shared.enabled,
+        }
+
+
+CACHES = []
+
+
+def _render_cache_metrics():
+    yield "# HELP cache_lookups_total Cache lookups by cache and outcome."
+    yield "# TYPE cache_lookups_total counter"
+    for cache in CACHES:
+        for outcome, count in cache.counters.items():
+            yield f'cache_lookups_total{{cache="{cache.namespace}",outcome="{outcome}"}} {count}'
+    yield "# HELP cache_disk_bytes Bytes held by each disk cache tier."
+    yield "# TYPE cache_disk_bytes gauge"
+    for cache in CACHES:
+        yield f'cache_disk_bytes{{cache="{cache.namespace}"}} {cache.disk.stats()["bytes"]}'
+
+
+metrics.COLLECTORS.append(_render_cache_metrics)
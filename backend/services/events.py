@@ -0,0 +1,107 @@
+import json
+import asyncio
+
+from services import metrics
+from services.settings import settings
+
+# Redis for fanning job events out across API workers and Celery workers; in-process only when unset
+EVENTS_REDIS_URL = settings.get("EVENTS_REDIS_URL", settings.get("REDIS_URL"))
+EVENTS_CHANNEL_PREFIX = "job-events:"
+# Events buffered per subscriber; a client that falls further behind loses the oldest ones
+EVENTS_QUEUE_SIZE = int(settings.get("EVENTS_QUEUE_SIZE", "100"))
+
+
+class JobEvents:
+    """
+    Pub/sub for job progress. Subscribers get an asyncio.Queue of (event, data)
+    for one job. With Redis, every event goes through a Redis channel and each
+    process runs a single listener that hands them to its local subscribers, so
+    an event published by any worker reaches every open stream.
+    """
+    def __init__(self, url: str = EVENTS_REDIS_URL):
+        self.url = url
+        self._subscribers = {}  # job id -> set of queues
+        self._client = None
+        self._listener = None
+        self.counters = {"published": 0, "dropped": 0}
+
+    def _redis(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    def _deliver(self, job_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.counters["dropped"] += 1
+            queue.put_nowait((event, data))
+
+    async def publish(self, job_id: str, event: str, data: dict):
+        self.counters["published"] += 1
+        if not self.url:
+            self._deliver(job_id, event, data)
+            return
+        try:
+            await self._redis().publish(f"{EVENTS_CHANNEL_PREFIX}{job_id}", json.dumps({"event": event, "data": data}))
+        except Exception as e:
+            # Streams still get the final state from their snapshot on reconnect
+            print(f"Failed to publish job event: {e}")
+            self._deliver(job_id, event, data)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis().pubsub()
+                await pubsub.psubscribe(f"{EVENTS_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    job_id = message["channel"][len(EVENTS_CHANNEL_PREFIX):]
+                    if job_id in self._subscribers:
+                        payload = json.loads(message["data"])
+                        self._deliver(job_id, payload["event"], payload["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job event listener lost Redis, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        if self.url and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[job_id]
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"streams": sum(len(queues) for queues in self._subscribers.values()), **self.counters}
+
+
+bus = JobEvents()
+
+
+def _render_event_metrics():
+    yield "# HELP job_event_streams Open job progress streams in this process."
+    yield "# TYPE job_event_streams gauge"
+    yield f"job_event_streams {bus.stats()['streams']}"
+
+
+metrics.COLLECTORS.append(_render_event_metrics)
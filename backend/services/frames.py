@@ -0,0 +1,214 @@
+import os
+import shutil
+import asyncio
+import tempfile
+
+from services import providers, resilience, webhooks
+from services.settings import settings
+from services.http import get_client
+from services.metrics import track
+from services.streams import as_chunks, multipart_body, iter_url
+
+# auto | pyav | ffmpeg | cloudconvert. auto picks the first local engine that is installed
+FRAME_ENGINE = settings.get("FRAME_ENGINE", "auto")
+FFMPEG_BINARY = settings.get("FFMPEG_BINARY", "ffmpeg")
+FRAME_JPEG_QUALITY = int(settings.get("FRAME_JPEG_QUALITY", "90"))
+FRAME_MAX_TIMESTAMPS = int(settings.get("FRAME_MAX_TIMESTAMPS", "10"))
+
+
+class PyAVEngine:
+    """
+    Decodes in-process with PyAV. Each timestamp is a seek to the keyframe before
+    it plus a decode up to the frame itself, so the rest of the file is never read.
+    """
+    name = "pyav"
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import av  # noqa: F401
+            import PIL  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _extract(self, video_path: str, timestamps: list, out_dir: str) -> list:
+        import av
+
+        frames = {}
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            for t in sorted(set(timestamps)):
+                container.seek(int(t / stream.time_base), stream=stream, backward=True)
+                for frame in container.decode(stream):
+                    if frame.time is not None and frame.time >= t:
+                        break
+                else:
+                    # Decoding ran out first: the video ends before t
+                    raise ValueError(f"No frame at {t:g}s: the video is shorter.")
+                path = os.path.join(out_dir, f"frame_{t:g}.jpg")
+                frame.to_image().save(path, quality=FRAME_JPEG_QUALITY)
+                frames[t] = path
+        return [frames[t] for t in timestamps]
+
+    async def extract(self, video_path: str, timestamps: list, out_dir: str) -> list:
+        return await asyncio.to_thread(self._extract, video_path, timestamps, out_dir)
+
+
+class FFmpegEngine:
+    """
+    Runs one ffmpeg process for all timestamps. Each is opened as its own input
+    with -ss before -i, which seeks by keyframe instead of decoding from the start.
+    """
+    name = "ffmpeg"
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which(FFMPEG_BINARY) is not None
+
+    async def extract(self, video_path: str, timestamps: list, out_dir: str) -> list:
+        args = [FFMPEG_BINARY, "-v", "error", "-y"]
+        for t in timestamps:
+            args += ["-ss", f"{t:g}", "-i", video_path]
+        # ffmpeg's -q:v runs 2 (best) to 31 (worst)
+        qscale = str(max(2, round(31 - FRAME_JPEG_QUALITY * 0.29)))
+        paths = []
+        for i in range(len(timestamps)):
+            path = os.path.join(out_dir, f"frame_{i}.jpg")
+            args += ["-map", f"{i}:v:0", "-frames:v", "1", "-q:v", qscale, path]
+            paths.append(path)
+
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+        for t, path in zip(timestamps, paths):
+            if not os.path.exists(path):
+                raise ValueError(f"No frame at {t:g}s: the video is shorter.")
+        return paths
+
+
+class CloudConvertEngine:
+    """
+    The original remote path: uploads the whole video to CloudConvert, waits for
+    the job and downloads the exported frames.
+    """
+    name = "cloudconvert"
+
+    @staticmethod
+    def available() -> bool:
+        return providers.configured("cloudconvert")
+
+    async def extract(self, video_path: str, timestamps: list, out_dir: str) -> list:
+        cloudconvert = providers.get("cloudconvert")
+
+        # 1. Create a job with one capture task per timestamp
+        tasks = {'import-file': {'operation': 'import/upload'}}
+        for i, t in enumerate(timestamps):
+            tasks[f'extract-frame-{i}'] = {
+                'operation': 'convert',
+                'input': 'import-file',
+                'output_format': 'jpg',
+                "engine": "ffmpeg",
+                "capture_mode": "time",
+                "capture_time": t,
+                'filename': f'frame_{i}.jpg'
+            }
+        tasks['export-frame'] = {
+            'operation': 'export/url',
+            'input': [f'extract-frame-{i}' for i in range(len(timestamps))],
+            'inline': False,
+            'archive_multiple_files': False
+        }
+        job_payload = {"tasks": tasks}
+        if webhooks.enabled("cloudconvert"):
+            job_payload["webhook_url"] = webhooks.callback_url("cloudconvert")
+
+        # The SDK calls are blocking, so they run in the threadpool
+        async def create_job():
+            with track("cloudconvert", "create_job"):
+                return await asyncio.to_thread(cloudconvert.Job.create, payload=job_payload)
+
+        job = await resilience.call("cloudconvert", "create_job", create_job, idempotent=False)
+
+        # 2. Stream the upload straight into the import task's upload form
+        upload_task = next(task for task in job.get("tasks", []) if task.get('operation') == 'import/upload')
+        form = upload_task['result']['form']
+
+        async def upload():
+            upload_headers, body = multipart_body(
+                form.get('parameters', {}), "file", os.path.basename(video_path),
+                "application/octet-stream", as_chunks(video_path), size=os.path.getsize(video_path)
+            )
+            response = await get_client().post(form['url'], headers=upload_headers, content=body)
+            response.raise_for_status()
+            return response
+
+        await resilience.call("cloudconvert", "upload", upload)
+
+        # 3. Wait for the job to finish: on the webhook when configured, polling
+        # CloudConvert only if it's late. This is a long wait rather than a request,
+        # so it doesn't take one of the provider's concurrency slots
+        with track("cloudconvert", "wait_job"):
+            finished = None
+            if webhooks.enabled("cloudconvert"):
+                try:
+                    finished = await webhooks.inbox.wait("cloudconvert", job['id'])
+                except asyncio.TimeoutError:
+                    print(f"CloudConvert webhook for job {job['id']} is late; polling instead.")
+            job = finished or await asyncio.to_thread(cloudconvert.Job.wait, id=job['id'])
+
+        # 4. Download the exported frames (their URLs expire after a day)
+        if job['status'] != 'finished':
+            raise RuntimeError("CloudConvert job failed.")
+        export_task = next((task for task in job['tasks'] if task['name'] == 'export-frame'), None)
+        if not export_task or export_task['status'] != 'finished':
+            raise RuntimeError("Frame export failed.")
+        urls = {f['filename']: f['url'] for f in export_task['result']['files']}
+
+        paths = []
+        for i in range(len(timestamps)):
+            path = os.path.join(out_dir, f'frame_{i}.jpg')
+            with open(path, "wb") as f:
+                async for chunk in iter_url(urls[f'frame_{i}.jpg']):
+                    f.write(chunk)
+            paths.append(path)
+        return paths
+
+
+ENGINES = {
+    "pyav": PyAVEngine,
+    "ffmpeg": FFmpegEngine,
+    "cloudconvert": CloudConvertEngine,
+}
+
+
+def get_engine(name: str = None):
+    """
+    Returns the configured engine. `auto` prefers PyAV, then the ffmpeg binary,
+    and falls back to CloudConvert when neither is installed.
+    """
+    name = name or FRAME_ENGINE
+    if name == "auto":
+        name = next((n for n in ("pyav", "ffmpeg") if ENGINES[n].available()), "cloudconvert")
+    if name not in ENGINES:
+        raise ValueError(f"Unknown FRAME_ENGINE '{name}'. Expected auto or one of: {', '.join(ENGINES)}")
+    return ENGINES[name]()
+
+
+async def extract(video_path: str, timestamps: list, engine=None) -> tuple:
+    """
+    Extracts one JPEG per timestamp (in seconds). Returns (temp dir, frame paths);
+    the caller removes the directory once the frames are stored.
+    """
+    engine = engine or get_engine()
+    out_dir = tempfile.mkdtemp(prefix="frames_")
+    try:
+        with track("frames", engine.name):
+            return out_dir, await engine.extract(video_path, timestamps, out_dir)
+    except BaseException:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
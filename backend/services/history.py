@@ -0,0 +1,152 @@
+import json
+import time
+import base64
+import asyncio
+from collections import OrderedDict
+
+from services import providers
+from services.settings import settings
+from services.cache import SharedCache, SingleFlight, cache_key
+from services.metrics import track
+
+JOB_HISTORY_CACHE_TTL = float(settings.get("JOB_HISTORY_CACHE_TTL", "10"))
+JOB_HISTORY_CACHE_SIZE = int(settings.get("JOB_HISTORY_CACHE_SIZE", "2000"))
+JOB_HISTORY_MAX_LIMIT = int(settings.get("JOB_HISTORY_MAX_LIMIT", "100"))
+
+# Columns a client may ask for with ?fields=. id and created_at always come back, for the cursor
+HISTORY_FIELDS = (
+    "id", "created_at", "updated_at", "model", "status", "error",
+    "script", "prompt", "image_url", "video_url", "stage_timings",
+)
+
+# History reads filter on user_id and walk (created_at, id) backwards. Recommended indexes:
+#   alter table jobs
+#     add column if not exists user_id uuid,
+#     add column if not exists status text,
+#     add column if not exists error text,
+#     add column if not exists updated_at timestamptz;
+#   create index if not exists jobs_user_created_idx on jobs (user_id, created_at desc, id desc);
+#   create index if not exists jobs_user_model_created_idx on jobs (user_id, model, created_at desc, id desc);
+#   create index if not exists jobs_user_status_created_idx on jobs (user_id, status, created_at desc, id desc);
+# Queued and failed jobs have no script or URLs yet, so those columns must be nullable.
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Returns (created_at, id) from a cursor. Raises ValueError if it's malformed.
+    """
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+    return str(created_at), str(job_id)
+
+
+def _quote(value: str) -> str:
+    # PostgREST filter values with reserved characters (timestamps have ':' and '+') must be quoted
+    return '"' + value.replace('"', '\\"') + '"'
+
+
+def query_jobs(user_id: str, limit: int = 20, cursor: str = None, model: str = None, status: str = None,
+               since: str = None, until: str = None, fields: list = None) -> dict:
+    """
+    Reads one page of a user's jobs, newest first. Keyset pagination: each page
+    continues strictly after the cursor's (created_at, id), so deep pages cost
+    the same as the first one.
+    """
+    columns = list(dict.fromkeys(["id", "created_at", *(fields or HISTORY_FIELDS)]))
+    query = providers.get("supabase").table("jobs").select(",".join(columns)).eq("user_id", user_id)
+    if model:
+        query = query.eq("model", model)
+    if status:
+        query = query.eq("status", status)
+    if since:
+        query = query.gte("created_at", since)
+    if until:
+        query = query.lt("created_at", until)
+    if cursor:
+        created_at, job_id = decode_cursor(cursor)
+        query = query.or_(
+            f"created_at.lt.{_quote(created_at)},"
+            f"and(created_at.eq.{_quote(created_at)},id.lt.{_quote(job_id)})"
+        )
+    # One extra row tells us whether there's a next page
+    query = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+    with track("supabase", "list_jobs"):
+        rows = query.execute().data or []
+    page = rows[:limit]
+    return {
+        "jobs": page,
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None,
+    }
+
+
+class HistoryCache:
+    """
+    Short-lived cache of job history pages. A user's pages are keyed by a version
+    that is bumped whenever one of their job rows is written, so a change drops
+    all of them at once (in every worker when Redis is configured).
+    """
+    def __init__(self, ttl: float = JOB_HISTORY_CACHE_TTL, max_entries: int = JOB_HISTORY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._pages = OrderedDict()  # cache key -> (page, expires_at)
+        self._versions = {}  # user id -> local version
+        self._shared = SharedCache("jobs:history", ttl=24 * 3600)
+        self._flights = SingleFlight()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    async def _version(self, user_id: str) -> str:
+        shared = await self._shared.get(f"version:{user_id}")
+        return f"{self._versions.get(user_id, 0)}.{int(shared or 0)}"
+
+    async def get(self, user_id: str, query: dict, load):
+        """
+        Returns the cached page for the query, or awaits load() and caches it.
+        Concurrent misses for the same page share one load.
+        """
+        key = cache_key(user_id=user_id, version=await self._version(user_id), query=query)
+        cached = self._pages.get(key)
+        if cached and cached[1] > time.monotonic():
+            self._pages.move_to_end(key)
+            self.counters["hits"] += 1
+            return cached[0]
+        self.counters["misses"] += 1
+
+        async def fill():
+            page = await load()
+            self._pages[key] = (page, time.monotonic() + self.ttl)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+            return page
+
+        return await self._flights.do(key, fill)
+
+    async def invalidate(self, user_id: str):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self.counters["invalidations"] += 1
+        await self._shared.incr(f"version:{user_id}")
+
+    def stats(self) -> dict:
+        return {"pages": len(self._pages), **self.counters}
+
+
+cache = HistoryCache()
+
+
+async def on_jobs_written(rows: list):
+    """
+    Supabase writer hook: drops the cached history of every user whose jobs just changed.
+    """
+    for user_id in {row.get("user_id") for row in rows if row.get("user_id")}:
+        await cache.invalidate(user_id)
+
+
+async def list_jobs(user_id: str, **query) -> dict:
+    return await cache.get(user_id, query, lambda: asyncio.to_thread(query_jobs, user_id, **query))
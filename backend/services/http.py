@@ -0,0 +1,153 @@
+import time
+import asyncio
+import httpx
+
+from services import metrics
+from services.settings import settings
+
+HTTP_MAX_CONNECTIONS = int(settings.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(settings.get("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_MAX_KEEPALIVE = int(settings.get("HTTP_MAX_KEEPALIVE", "40"))
+HTTP_KEEPALIVE_EXPIRY = float(settings.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(settings.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(settings.get("HTTP_READ_TIMEOUT", "60"))
+HTTP_WRITE_TIMEOUT = float(settings.get("HTTP_WRITE_TIMEOUT", "60"))
+HTTP_POOL_TIMEOUT = float(settings.get("HTTP_POOL_TIMEOUT", "30"))
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """
+    Wraps a response body so the per-host slot is held until the body is closed.
+    Also counts the bytes received for the provider metrics.
+    """
+    def __init__(self, stream, release, provider: str):
+        self._stream = stream
+        self._release = release
+        self._provider = provider
+        self._received = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._received += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+            metrics.provider_bytes.inc(self._received, provider=self._provider, direction="received")
+            self._received = 0
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx only caps the pool as a whole; this caps in-flight requests per host
+    so one slow provider can't take every pooled connection.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self._transport = transport
+        self._per_host = per_host
+        self._semaphores = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self._per_host)
+        return self._semaphores[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphore(request.url.host)
+        await semaphore.acquire()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                semaphore.release()
+
+        provider = metrics.provider_for_host(request.url.host)
+        sent = int(request.headers.get("content-length") or 0)
+        metrics.provider_bytes.inc(sent, provider=provider, direction="sent")
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            metrics.provider_request_seconds.observe(
+                time.perf_counter() - started, provider=provider, operation=request.method, status="error")
+            raise
+        # Time to response headers; body transfer is covered by the bytes counter
+        metrics.provider_request_seconds.observe(
+            time.perf_counter() - started, provider=provider, operation=request.method,
+            status=str(response.status_code))
+        response.stream = _ReleasingStream(response.stream, release, provider)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+_client = None
+_transport_override = None
+
+
+def use_transport(transport: httpx.AsyncBaseTransport):
+    """
+    Routes the shared client through another transport, e.g. an httpx.ASGITransport
+    over the offline benchmark fakes. Call before the client is first used.
+    """
+    global _transport_override, _client
+    _transport_override = transport
+    _client = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=HTTP_CONNECT_TIMEOUT,
+        read=HTTP_READ_TIMEOUT,
+        write=HTTP_WRITE_TIMEOUT,
+        pool=HTTP_POOL_TIMEOUT,
+    )
+    inner = _transport_override or httpx.AsyncHTTPTransport(limits=limits)
+    transport = HostLimitedTransport(inner, HTTP_MAX_CONNECTIONS_PER_HOST)
+    return httpx.AsyncClient(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the app-wide pooled async HTTP client, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def error_detail(e: Exception):
+    """
+    Best-effort error body from a failed upstream call, for HTTPException details.
+    """
+    response = getattr(e, "response", None) if isinstance(e, httpx.HTTPStatusError) else None
+    if response is None:
+        return str(e)
+    try:
+        return response.json()
+    except ValueError:
+        return response.text or str(e)
+
+
+async def startup():
+    get_client()
+
+
+async def shutdown():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,444 @@
+import json
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+
+from services import admission, events, history, metrics, scratch, supabase
+from services.auth import sign_job
+from services.settings import settings
+
+JOB_BACKEND = settings.get("JOB_BACKEND", "inprocess")
+JOB_WORKERS = int(settings.get("JOB_WORKERS", "4"))
+JOB_TTL_SECONDS = int(settings.get("JOB_TTL_SECONDS", str(24 * 3600)))
+REDIS_URL = settings.get("REDIS_URL")
+
+# Runner kwargs that are passed to the run but never stored (job record, Supabase checkpoints)
+SECRET_INPUTS = {"access_token"}
+
+# Job history pages are cached; drop a user's pages once their job rows are written
+supabase.writer.on_write("jobs", history.on_jobs_written)
+
+# kind -> (coroutine function, ordered stage names)
+PIPELINES = {}
+# kind -> value of the `model` column in the Supabase jobs table
+MODELS = {}
+
+
+def pipeline(kind: str, stages: list, model: str = None):
+    """
+    Registers a coroutine as the runner for a job kind.
+    The runner is called as fn(ctx, **kwargs) and returns the job result dict.
+    """
+    def decorator(fn):
+        PIPELINES[kind] = (fn, list(stages))
+        MODELS[kind] = model or kind
+        return fn
+    return decorator
+
+
+class MemoryStore:
+    """
+    Minimal in-process stand-in for the subset of the redis hash API we use.
+    """
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+
+    async def hset(self, key, mapping):
+        self._data.setdefault(key, {}).update(mapping)
+
+    async def hget(self, key, field):
+        return (await self.hgetall(key)).get(field)
+
+    async def hgetall(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at < time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return dict(self._data.get(key, {}))
+
+    async def expire(self, key, seconds):
+        self._expires[key] = time.time() + seconds
+
+    async def aclose(self):
+        pass
+
+
+_store = None
+
+
+def get_store():
+    """
+    Returns the job status store: Redis when REDIS_URL is set, in-memory otherwise.
+    """
+    global _store
+    if _store is None:
+        if REDIS_URL:
+            import redis.asyncio as redis
+            _store = redis.from_url(REDIS_URL, decode_responses=True)
+        else:
+            _store = MemoryStore()
+    return _store
+
+
+def _key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+async def _write(job_id: str, mapping: dict):
+    store = get_store()
+    mapping = {k: json.dumps(v) for k, v in mapping.items()}
+    mapping["updated_at"] = json.dumps(time.time())
+    await store.hset(_key(job_id), mapping=mapping)
+    await store.expire(_key(job_id), JOB_TTL_SECONDS)
+
+
+async def create_job(kind: str, job_id: str = None, inputs: dict = None) -> str:
+    """
+    Records a queued job. `inputs` are the runner's kwargs, kept so the job can be resumed.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    stages = PIPELINES[kind][1]
+    inputs = _storable(inputs)
+    user_id = (inputs or {}).get("user_id")
+    mapping = {
+        "job_id": job_id,
+        "kind": kind,
+        "user_id": user_id,
+        "status": "queued",
+        "result": None,
+        "error": None,
+        "inputs": inputs,
+        "created_at": time.time(),
+    }
+    for name in stages:
+        mapping[f"stage:{name}"] = {"status": "pending"}
+    await _write(job_id, mapping)
+    supabase.save_job_status(job_id, "queued", user_id, model=MODELS.get(kind, kind), error=None)
+    return job_id
+
+
+def _storable(inputs: dict):
+    if inputs is None:
+        return None
+    return {key: value for key, value in inputs.items() if key not in SECRET_INPUTS}
+
+
+async def get_job(job_id: str):
+    """
+    Returns the job record with its per-stage status, or None if unknown/expired.
+    """
+    raw = await get_store().hgetall(_key(job_id))
+    if not raw:
+        return None
+    job = {"stages": {}, "checkpoints": {}}
+    for field, value in raw.items():
+        value = json.loads(value)
+        if field.startswith("stage:"):
+            job["stages"][field[len("stage:"):]] = value
+        elif field.startswith("checkpoint:"):
+            job["checkpoints"][field[len("checkpoint:"):]] = value
+        else:
+            job[field] = value
+    kind = job.get("kind")
+    if kind in PIPELINES:
+        order = PIPELINES[kind][1]
+        job["stages"] = {name: job["stages"][name] for name in order if name in job["stages"]}
+    return job
+
+
+async def update_job(job_id: str, **fields):
+    await _write(job_id, fields)
+    if "status" in fields:
+        await events.bus.publish(job_id, "status", {
+            key: fields[key] for key in ("status", "result", "error", "duration_ms") if key in fields
+        })
+        # Mirrored to Supabase for job history, tagged with the owner so their cached pages are dropped
+        user_id = await get_store().hget(_key(job_id), "user_id")
+        supabase.save_job_status(job_id, fields["status"], json.loads(user_id) if user_id else None,
+                                 error=fields.get("error"))
+
+
+async def set_stage(job_id: str, stage: str, **fields):
+    await _write(job_id, {f"stage:{stage}": fields})
+    await events.bus.publish(job_id, "stage", {"stage": stage, **fields})
+
+
+# Checkpoint row holding the job's kind and inputs, so Supabase alone is enough to resume
+INPUTS_CHECKPOINT = "__inputs__"
+
+
+async def save_checkpoint(job_id: str, kind: str, stage: str, output: dict):
+    """
+    Stores a finished stage's outputs in the job record and queues them for
+    Supabase, which outlives the record's TTL.
+    """
+    await _write(job_id, {f"checkpoint:{stage}": output})
+    supabase.save_checkpoint(job_id, kind, stage, output)
+
+
+async def load_checkpoints(job_id: str) -> dict:
+    """
+    Returns stage -> outputs for every checkpointed stage of the job, from its
+    record or, once that has expired, from Supabase.
+    """
+    job = await get_job(job_id)
+    if job is not None:
+        return job["checkpoints"]
+    rows = await asyncio.to_thread(supabase.load_checkpoints, job_id)
+    return {row["stage"]: row["output"] for row in rows if row["stage"] != INPUTS_CHECKPOINT}
+
+
+def _error_detail(e: Exception) -> str:
+    return str(getattr(e, "detail", None) or e)
+
+
+class JobContext:
+    """
+    Handed to pipeline runners so they can report per-stage progress.
+    """
+    def __init__(self, job_id: str, kind: str = "", checkpoints: dict = None):
+        self.job_id = job_id
+        self.kind = kind
+        # stage name -> wall time in milliseconds
+        self.timings = {}
+        # stage name -> outputs saved by an earlier run of this job
+        self.checkpoints = dict(checkpoints or {})
+        # running stage -> start time
+        self._started_at = {}
+
+    async def checkpoint(self, name: str, output: dict):
+        self.checkpoints[name] = output
+        await save_checkpoint(self.job_id, self.kind, name, output)
+
+    async def restore(self, name: str):
+        """
+        Marks a stage done from its checkpoint without running it.
+        """
+        await set_stage(self.job_id, name, status="done", restored=True)
+
+    async def skip(self, name: str):
+        await set_stage(self.job_id, name, status="skipped")
+
+    async def progress(self, name: str, **fields):
+        """
+        Adds progress fields (e.g. bytes uploaded) to a running stage's status.
+        """
+        await set_stage(self.job_id, name, status="running", started_at=self._started_at.get(name), **fields)
+
+    @asynccontextmanager
+    async def stage(self, name: str, error: str = None):
+        started_at = time.time()
+        self._started_at[name] = started_at
+        await set_stage(self.job_id, name, status="running", started_at=started_at)
+
+        async def finish(status, **fields):
+            finished_at = time.time()
+            self.timings[name] = round((finished_at - started_at) * 1000, 1)
+            metrics.stage_seconds.observe(finished_at - started_at, pipeline=self.kind, stage=name, status=status)
+            await set_stage(self.job_id, name, status=status, started_at=started_at,
+                            finished_at=finished_at, duration_ms=self.timings[name], **fields)
+
+        try:
+            yield
+        except asyncio.CancelledError:
+            await finish("cancelled")
+            raise
+        except Exception as e:
+            detail = _error_detail(e)
+            if error:
+                detail = f"{error}: {detail}"
+            await finish("failed", error=detail)
+            raise RuntimeError(detail) from e
+        await finish("done")
+
+
+async def run_job(job_id: str, kind: str, kwargs: dict):
+    """
+    Executes a queued job to completion and records the outcome.
+    """
+    fn, _ = PIPELINES[kind]
+    ctx = JobContext(job_id, kind, checkpoints=await load_checkpoints(job_id))
+    started_at = time.time()
+    await update_job(job_id, status="running", started_at=started_at)
+    try:
+        async with scratch.get_store().hold(job_id):
+            result = await fn(ctx, job_id=job_id, **kwargs)
+    except asyncio.CancelledError:
+        # The worker is shutting down; left as "running", the job could never be resumed
+        print(f"Job {job_id} ({kind}) interrupted")
+        await update_job(job_id, status="failed", error="Interrupted by a worker shutdown; resume the job to continue.",
+                         timings=ctx.timings, duration_ms=round((time.time() - started_at) * 1000, 1))
+        raise
+    except Exception as e:
+        print(f"Job {job_id} ({kind}) failed: {e}")
+        # Its scratch files stay until SCRATCH_TTL so the job can be resumed
+        await update_job(job_id, status="failed", error=_error_detail(e), timings=ctx.timings,
+                         duration_ms=round((time.time() - started_at) * 1000, 1))
+        return
+    await update_job(job_id, status="succeeded", result=result, timings=ctx.timings,
+                     duration_ms=round((time.time() - started_at) * 1000, 1))
+    await scratch.release(job_id)
+
+
+class InProcessBackend:
+    """
+    Runs jobs on a fixed pool of asyncio workers inside the API process. The
+    pool size is the global concurrency budget; waiting jobs sit in the
+    admission fair-share queue, one lane per user.
+    """
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.queue = admission.controller.queue
+        self._tasks = []
+        admission.controller.capacity = workers
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job_id: str, kind: str, kwargs: dict, lane: str = None):
+        self.start()
+        lane = lane or kwargs.get("user_id") or "anonymous"
+        self.queue.put(lane, (job_id, kind, kwargs), weight=admission.lane_weight(lane))
+
+    async def _worker(self):
+        while True:
+            job_id, kind, kwargs = await self.queue.get()
+            started = time.monotonic()
+            admission.controller.job_started()
+            try:
+                await run_job(job_id, kind, kwargs)
+            finally:
+                admission.controller.job_finished(time.monotonic() - started)
+
+
+class CeleryBackend:
+    """
+    Hands jobs to Celery workers (see worker.py). Job status is shared through Redis.
+    """
+    def __init__(self):
+        if not REDIS_URL:
+            raise RuntimeError("REDIS_URL must be set when JOB_BACKEND=celery.")
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def submit(self, job_id: str, kind: str, kwargs: dict, lane: str = None):
+        # Celery workers take jobs in broker order; only the token buckets apply here
+        from worker import run_pipeline
+        # Publishing to the broker is a blocking network call
+        await asyncio.to_thread(run_pipeline.delay, job_id, kind, kwargs)
+
+
+BACKENDS = {
+    "inprocess": InProcessBackend,
+    "celery": CeleryBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if JOB_BACKEND not in BACKENDS:
+            raise RuntimeError(f"Unknown JOB_BACKEND '{JOB_BACKEND}'. Expected one of: {', '.join(BACKENDS)}")
+        _backend = BACKENDS[JOB_BACKEND]()
+    return _backend
+
+
+async def enqueue(kind: str, kwargs: dict, job_id: str = None, lane: str = None) -> str:
+    """
+    Records a new job and hands it to the configured backend. Returns the job_id.
+    lane is the caller's fair-share queue lane (see services/admission.py).
+    """
+    job_id = await create_job(kind, job_id, inputs=kwargs)
+    supabase.save_checkpoint(job_id, kind, INPUTS_CHECKPOINT, _storable(kwargs))
+    await get_backend().submit(job_id, kind, kwargs, lane=lane)
+    return job_id
+
+
+class ResumeError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def owns(job: dict, user_id: str = None) -> bool:
+    """
+    Whether the caller may see or resume the job: a signed-in user's job
+    belongs to them alone, an anonymous one to whoever holds its id.
+    """
+    return not job.get("user_id") or job["user_id"] == user_id
+
+
+async def resume(job_id: str, lane: str = None, user_id: str = None) -> str:
+    """
+    Re-queues a failed job on behalf of user_id. Checkpointed stages are
+    restored instead of rerun, so it continues from the first incomplete stage.
+    The job record is rebuilt from Supabase if it has already expired.
+    """
+    job = await get_job(job_id)
+    if job is not None and not owns(job, user_id):
+        raise ResumeError(404, f"Job '{job_id}' not found.")
+    if job is None:
+        rows = await asyncio.to_thread(supabase.load_checkpoints, job_id)
+        saved = next((row for row in rows if row["stage"] == INPUTS_CHECKPOINT), None)
+        if saved is None or not owns(saved["output"], user_id):
+            raise ResumeError(404, f"Job '{job_id}' not found.")
+        kind, inputs = saved["kind"], saved["output"]
+        await create_job(kind, job_id, inputs=inputs)
+        await _write(job_id, {f"checkpoint:{row['stage']}": row["output"] for row in rows if row is not saved})
+    else:
+        if job["status"] in ("queued", "running"):
+            raise ResumeError(409, f"Job '{job_id}' is already {job['status']}.")
+        if job["status"] == "succeeded":
+            raise ResumeError(409, f"Job '{job_id}' already succeeded.")
+        kind, inputs = job["kind"], job.get("inputs")
+        if inputs is None:
+            raise ResumeError(409, f"Job '{job_id}' can't be resumed: its inputs weren't recorded.")
+        if kind not in PIPELINES:
+            raise ResumeError(409, f"Job '{job_id}' has unknown kind '{kind}'.")
+        stages = {f"stage:{name}": {"status": "pending"} for name in PIPELINES[kind][1]
+                  if name not in job["checkpoints"]}
+        await update_job(job_id, status="queued", error=None, **stages)
+
+    await scratch.reserve(job_id)
+    await get_backend().submit(job_id, kind, inputs, lane=lane)
+    return job_id
+
+
+def accepted(job_id: str, user_id: str = None) -> dict:
+    """
+    Standard 202 body for endpoints that enqueue work. The events_url carries a
+    token signed for the job's owner, for clients that can't set headers.
+    """
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}",
+            "events_url": f"/api/jobs/{job_id}/events?token={sign_job(job_id, user_id)}"}
+
+
+async def startup():
+    get_backend().start()
+
+
+async def shutdown():
+    global _store
+    if _backend is not None:
+        await _backend.stop()
+    await events.bus.stop()
+    if _store is not None:
+        await _store.aclose()
+        _store = None
@@ -0,0 +1,136 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, wide enough for multi-minute D-ID renders
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+PROVIDER_DOMAINS = {
+    "openai.com": "openai",
+    "huggingface.co": "huggingface",
+    "d-id.com": "d-id",
+    "tmpfiles.org": "tmpfiles",
+    "cloudconvert.com": "cloudconvert",
+    "googleapis.com": "youtube",
+    "cloudinary.com": "cloudinary",
+    "supabase.co": "supabase",
+}
+
+
+def provider_for_host(host: str) -> str:
+    for domain, provider in PROVIDER_DOMAINS.items():
+        if host == domain or host.endswith("." + domain):
+            return provider
+    return host
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the wall time of the block. Yields a dict whose "status" entry,
+        if the histogram has that label, may be set inside the block.
+        """
+        outcome = {"status": "ok"}
+        started = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["status"] = "error"
+            raise
+        finally:
+            if "status" in self.labels:
+                labels.setdefault("status", outcome["status"])
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, ('le', bound))} {count}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}"
+
+
+REGISTRY = []
+# Callables returning extra exposition lines (e.g. cache counters owned by a router)
+COLLECTORS = []
+
+http_request_seconds = Histogram(
+    "http_request_seconds", "API request latency by endpoint.", ["method", "endpoint", "status"])
+stage_seconds = Histogram(
+    "pipeline_stage_seconds", "Wall time of each generation pipeline stage.", ["pipeline", "stage", "status"])
+provider_request_seconds = Histogram(
+    "provider_request_seconds", "Latency of calls to external providers.", ["provider", "operation", "status"])
+provider_bytes = Counter(
+    "provider_bytes_total", "Bytes sent to and received from external providers.", ["provider", "direction"])
+provider_retries = Counter(
+    "provider_retries_total", "Retried calls to external providers.", ["provider", "operation"])
+
+
+def track(provider: str, operation: str):
+    """
+    Times an SDK call (Fish Audio, Cloudinary, Supabase...) that doesn't go through the shared HTTP client.
+    """
+    return provider_request_seconds.time(provider=provider, operation=operation)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,130 @@
+import asyncio
+
+
+class Stage:
+    """
+    One step of a generation pipeline.
+
+    fn is called with the values named in `requires` as keyword arguments and
+    returns a dict with the values named in `provides`. A stage starts as soon
+    as everything it requires is available, so independent stages overlap.
+    With checkpoint=False its outputs aren't saved (e.g. local file paths), so a
+    resumed job runs it again when a later stage needs them.
+    """
+    def __init__(self, name: str, fn, requires=(), provides=(), error: str = None, checkpoint: bool = True):
+        self.name = name
+        self.fn = fn
+        self.requires = list(requires)
+        self.provides = list(provides)
+        self.error = error
+        self.checkpoint = checkpoint
+
+
+def _stages_to_run(stages: list, restored: set) -> list:
+    """
+    The stages a (possibly resumed) run has to execute, in their original order.
+    Restored stages never run. Stages nothing else consumes (the pipeline's
+    results, or ones like "save" that provide nothing) run, and so does every
+    stage whose outputs one of those still needs, transitively.
+    """
+    producers = {key: stage for stage in stages for key in stage.provides}
+    consumed = {key for stage in stages for key in stage.requires}
+    needed = [
+        stage for stage in stages
+        if stage.name not in restored and not any(key in consumed for key in stage.provides)
+    ]
+    to_run = {stage.name for stage in needed}
+    while needed:
+        stage = needed.pop()
+        for key in stage.requires:
+            producer = producers.get(key)
+            if producer is not None and producer.name not in restored and producer.name not in to_run:
+                to_run.add(producer.name)
+                needed.append(producer)
+    return [stage for stage in stages if stage.name in to_run]
+
+
+async def run_dag(ctx, stages: list, inputs: dict) -> dict:
+    """
+    Runs the stages concurrently in dependency order, reporting each one through
+    the job context. Returns every input and provided value. The first failing
+    stage cancels the rest and its error is raised.
+
+    Stages may also require "stage_timings": the job's live stage -> ms dict,
+    which holds every finished upstream stage by the time they run, and "ctx",
+    the job context itself (e.g. to report progress). A stage requiring "emit"
+    gets emit(key, value), which hands one of its outputs to downstream stages
+    before the stage itself has finished.
+
+    Stages with a checkpoint in ctx.checkpoints aren't run again: their saved
+    outputs are provided instead, so a resumed job continues where it stopped.
+    """
+    loop = asyncio.get_running_loop()
+    values = {}
+    inputs = {"stage_timings": ctx.timings, "ctx": ctx, **inputs}
+    for stage in stages:
+        for key in stage.provides:
+            values[key] = loop.create_future()
+    for key, value in inputs.items():
+        future = values.setdefault(key, loop.create_future())
+        if not future.done():
+            future.set_result(value)
+
+    for stage in stages:
+        missing = [key for key in stage.requires if key not in values and key != "emit"]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' requires {missing}, which nothing provides")
+
+    restored = set()
+    for stage in stages:
+        output = ctx.checkpoints.get(stage.name) if stage.checkpoint else None
+        if output is None or any(key not in output for key in stage.provides):
+            continue
+        restored.add(stage.name)
+        await ctx.restore(stage.name)
+        for key in stage.provides:
+            values[key].set_result(output[key])
+
+    def emitter(stage: Stage):
+        def emit(key: str, value):
+            if key not in stage.provides:
+                raise ValueError(f"Stage '{stage.name}' does not provide '{key}'")
+            if not values[key].done():
+                values[key].set_result(value)
+        return emit
+
+    async def run_stage(stage: Stage):
+        kwargs = {key: emitter(stage) if key == "emit" else await values[key] for key in stage.requires}
+        async with ctx.stage(stage.name, error=stage.error):
+            result = await stage.fn(**kwargs) or {}
+            absent = [key for key in stage.provides if key not in result]
+            if absent:
+                raise RuntimeError(f"Stage '{stage.name}' did not provide {absent}")
+            if stage.checkpoint:
+                await ctx.checkpoint(stage.name, {key: result[key] for key in stage.provides})
+        for key in stage.provides:
+            if not values[key].done():
+                values[key].set_result(result[key])
+
+    to_run = _stages_to_run(stages, restored)
+    for stage in stages:
+        if stage.name not in restored and stage not in to_run:
+            # Its outputs are only needed by stages restored from checkpoints
+            await ctx.skip(stage.name)
+
+    tasks = [asyncio.create_task(run_stage(stage), name=stage.name) for stage in to_run]
+    try:
+        if tasks:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for future in values.values():
+            if not future.done():
+                future.cancel()
+
+    return {key: future.result() for key, future in values.items() if future.done() and not future.cancelled()}
@@ -0,0 +1,184 @@
+import time
+import base64
+import threading
+from types import SimpleNamespace
+from fastapi import HTTPException
+
+from services import metrics
+from services.settings import settings
+
+provider_init_seconds = metrics.Histogram(
+    "provider_client_init_seconds", "Time to import and construct a provider client on first use.", ["provider"])
+
+
+class ProviderUnavailable(HTTPException):
+    """
+    Raised when an endpoint or stage needs a provider whose credentials aren't set.
+    """
+    def __init__(self, provider: str, missing: list):
+        super().__init__(status_code=503, detail=f"{provider} is not configured: set {', '.join(missing)}.")
+        self.provider = provider
+
+
+class _Provider:
+    def __init__(self, name: str, required: dict, factory):
+        self.name = name
+        self.required = required  # env var -> settings attribute
+        self.factory = factory
+        self.client = None
+        self.init_ms = None
+        self.overridden = False
+
+    def missing(self) -> list:
+        return [env for env, attr in self.required.items() if not getattr(settings, attr)]
+
+
+PROVIDERS = {}
+_lock = threading.Lock()
+
+
+def provider(name: str, **required):
+    """
+    Registers a client factory, built on first get(). Keyword arguments map the
+    env vars the provider needs to their settings attributes.
+    """
+    def decorator(factory):
+        PROVIDERS[name] = _Provider(name, required, factory)
+        return factory
+    return decorator
+
+
+def configured(name: str) -> bool:
+    entry = PROVIDERS[name]
+    return entry.client is not None or not entry.missing()
+
+
+def require(*names: str):
+    for name in names:
+        entry = PROVIDERS[name]
+        missing = entry.missing()
+        if entry.client is None and missing:
+            raise ProviderUnavailable(name, missing)
+
+
+def get(name: str):
+    """
+    Returns the provider's client, importing its SDK and building it the first
+    time. Safe to call from threadpool workers.
+    """
+    entry = PROVIDERS[name]
+    if entry.client is not None:
+        return entry.client
+    with _lock:
+        if entry.client is None:
+            require(name)
+            started = time.perf_counter()
+            entry.client = entry.factory()
+            elapsed = time.perf_counter() - started
+            entry.init_ms = round(elapsed * 1000, 1)
+            provider_init_seconds.observe(elapsed, provider=name)
+    return entry.client
+
+
+def override(name: str, client):
+    """
+    Replaces a provider's client, e.g. with a fake in the benchmark harness.
+    """
+    PROVIDERS[name].client = client
+    PROVIDERS[name].overridden = True
+
+
+def warm():
+    """
+    Builds every configured client. Run in a thread after startup so the first
+    request doesn't pay for the SDK imports on the event loop.
+    """
+    for name in PROVIDERS:
+        if configured(name):
+            try:
+                get(name)
+            except Exception as e:
+                print(f"Failed to initialize {name} client: {e}")
+
+
+def report() -> list:
+    lines = []
+    for entry in PROVIDERS.values():
+        missing = entry.missing()
+        if entry.overridden:
+            lines.append(f"  {entry.name:<12} overridden ({type(entry.client).__name__})")
+        elif missing:
+            lines.append(f"  {entry.name:<12} disabled (missing {', '.join(missing)})")
+        else:
+            lines.append(f"  {entry.name:<12} configured")
+    return lines
+
+
+@provider("d-id", D_ID_API_KEY="d_id_api_key")
+def _d_id_headers():
+    auth = base64.b64encode(settings.d_id_api_key.encode("utf-8")).decode("utf-8")
+    return {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "authorization": f"Basic {auth}",
+    }
+
+
+@provider("openai", OPENAI_API_KEY="openai_api_key")
+def _openai_headers():
+    return {"Authorization": f"Bearer {settings.openai_api_key}", "Content-Type": "application/json"}
+
+
+@provider("huggingface", HUGGING_FACE_API_KEY="hugging_face_api_key")
+def _huggingface_headers():
+    return {"Authorization": f"Bearer {settings.hugging_face_api_key}"}
+
+
+@provider("fish-audio", FISH_AUDIO_API_KEY="fish_audio_api_key")
+def _fish_session():
+    from fish_audio_sdk import Session
+    return Session(settings.fish_audio_api_key)
+
+
+def fish_tts_request(**fields):
+    """
+    A TTS request for the fish-audio client. An overridden client (the
+    benchmark's fake) gets the fields as a namespace, so the SDK isn't needed.
+    """
+    if PROVIDERS["fish-audio"].overridden:
+        return SimpleNamespace(**fields)
+    from fish_audio_sdk import TTSRequest
+    return TTSRequest(**fields)
+
+
+@provider("cloudconvert", CLOUDCONVERT_API_KEY="cloudconvert_api_key")
+def _cloudconvert():
+    import cloudconvert
+    cloudconvert.configure(api_key=settings.cloudconvert_api_key, sandbox=False)
+    return cloudconvert
+
+
+@provider("cloudinary", CLOUDINARY_CLOUD_NAME="cloudinary_cloud_name", CLOUDINARY_API_KEY="cloudinary_api_key",
+          CLOUDINARY_API_SECRET="cloudinary_api_secret")
+def _cloudinary_uploader():
+    import cloudinary
+    import cloudinary.uploader
+    cloudinary.config(
+        cloud_name=settings.cloudinary_cloud_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+    return cloudinary.uploader
+
+
+@provider("supabase", SUPABASE_URL="supabase_url", SUPABASE_KEY="supabase_key")
+def _supabase():
+    from supabase import create_client
+    return create_client(settings.supabase_url, settings.supabase_key)
+
+
+@provider("s3", ASSET_S3_BUCKET="asset_s3_bucket")
+def _s3():
+    import boto3
+    return boto3.client("s3", endpoint_url=settings.asset_s3_endpoint_url)
@@ -0,0 +1,276 @@
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+import httpx
+from fastapi import HTTPException
+
+from services import metrics
+from services.settings import settings
+
+PROVIDER_RETRIES = int(settings.get("PROVIDER_RETRIES", "3"))
+PROVIDER_RETRY_BASE_DELAY = float(settings.get("PROVIDER_RETRY_BASE_DELAY", "0.5"))
+PROVIDER_RETRY_MAX_DELAY = float(settings.get("PROVIDER_RETRY_MAX_DELAY", "10"))
+BREAKER_THRESHOLD = int(settings.get("BREAKER_THRESHOLD", "5"))  # consecutive failures
+BREAKER_RESET_SECONDS = float(settings.get("BREAKER_RESET_SECONDS", "30"))
+
+# provider -> (max in-flight calls, requests per second on its API key)
+# Each can be overridden with <PROVIDER>_CONCURRENCY / <PROVIDER>_RATE_LIMIT, e.g. D_ID_RATE_LIMIT
+DEFAULT_LIMITS = {
+    "openai": (16, 50),
+    "huggingface": (4, 2),
+    "d-id": (8, 5),
+    "fish-audio": (8, 5),
+    "cloudconvert": (4, 5),
+    "cloudinary": (8, 10),
+    "tmpfiles": (8, 10),
+    "youtube": (4, 5),
+}
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Errors raised before the request reached the provider: safe to retry even non-idempotent calls
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+provider_circuit_opens = metrics.Counter(
+    "provider_circuit_opens_total", "Times a provider's circuit breaker opened.", ["provider"])
+
+
+class CircuitOpen(HTTPException):
+    """
+    Raised without calling the provider while its circuit breaker is open.
+    """
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} is failing; calls are paused for {retry_after:.0f}s.",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+        self.provider = provider
+
+
+def is_retryable(e: Exception) -> bool:
+    """
+    Transient failures worth another attempt: network errors, throttling and 5xx.
+    Client errors and our own 503s (missing config, open circuit) are not.
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRYABLE_STATUSES
+    if isinstance(e, httpx.TransportError):
+        return True
+    if isinstance(e, HTTPException):
+        return False
+    # SDK errors (Fish Audio, Cloudinary, CloudConvert) don't expose a status reliably
+    return True
+
+
+def _retry_after(e: Exception):
+    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+        try:
+            return float(e.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts up to `burst`.
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                # Wait for the next token while holding the lock so callers stay in order
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_seconds`.
+    Then one trial call is let through: success closes the circuit, failure reopens it.
+    """
+    def __init__(self, provider: str, threshold: int = BREAKER_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.provider = provider
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None  # when the half-open trial call started
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        state = self.state
+        now = time.monotonic()
+        # A trial that never reported back (e.g. cancelled) stops blocking after reset_seconds
+        trial_pending = self._trial_at is not None and now - self._trial_at < self.reset_seconds
+        if state == "open" or (state == "half_open" and trial_pending):
+            raise CircuitOpen(self.provider, max(self.opened_at + self.reset_seconds - now, 1))
+        if state == "half_open":
+            self._trial_at = now
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None or self._trial_at is not None:
+                provider_circuit_opens.inc(provider=self.provider)
+            self.opened_at = time.monotonic()
+            self._trial_at = None
+
+
+class ProviderGuard:
+    """
+    Everything between the app and one provider: a concurrency cap, a token
+    bucket for its API key's rate limit, a circuit breaker and retries.
+    """
+    def __init__(self, provider: str, concurrency: int, rate: float):
+        self.provider = provider
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(provider)
+
+    @asynccontextmanager
+    async def _slot(self):
+        self.breaker.check()
+        async with self.semaphore:
+            await self.bucket.acquire()
+            yield
+
+    def _record(self, e: Exception = None):
+        # A client error still means the provider is up
+        if e is None or not is_retryable(e):
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+    def _should_retry(self, e: Exception, attempt: int, idempotent: bool) -> bool:
+        if attempt >= PROVIDER_RETRIES:
+            return False
+        if idempotent:
+            return is_retryable(e)
+        return isinstance(e, NOT_SENT_ERRORS)
+
+    async def _backoff(self, e: Exception, attempt: int, operation: str):
+        metrics.provider_retries.inc(provider=self.provider, operation=operation)
+        delay = min(PROVIDER_RETRY_BASE_DELAY * 2 ** attempt, PROVIDER_RETRY_MAX_DELAY)
+        await asyncio.sleep(_retry_after(e) or delay * random.uniform(0.5, 1.5))
+
+    async def call(self, operation: str, fn, idempotent: bool = True):
+        """
+        Awaits fn() under the provider's limits. Transient failures are retried
+        with exponential backoff when the call is idempotent; otherwise only when
+        the request never left (connection errors), so nothing runs twice upstream.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._slot():
+                    try:
+                        result = await fn()
+                    except Exception as e:
+                        self._record(e)
+                        raise
+                    self._record()
+                    return result
+            except CircuitOpen:
+                raise
+            except Exception as e:
+                if not self._should_retry(e, attempt, idempotent):
+                    raise
+                await self._backoff(e, attempt, operation)
+                attempt += 1
+
+    async def stream(self, operation: str, open_stream):
+        """
+        Yields from the async iterator open_stream() returns, holding a slot
+        until it is exhausted. It is retried only until the first chunk arrives,
+        so callers never see a repeated or partial prefix.
+        """
+        attempt = 0
+        while True:
+            error = None
+            async with self._slot():
+                chunks = open_stream()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    self._record()
+                    return
+                except Exception as e:
+                    self._record(e)
+                    if not self._should_retry(e, attempt, idempotent=True):
+                        raise
+                    error = e
+                if error is None:
+                    yield first
+                    try:
+                        async for chunk in chunks:
+                            yield chunk
+                    except Exception as e:
+                        self._record(e)
+                        raise
+                    self._record()
+                    return
+            await self._backoff(error, attempt, operation)
+            attempt += 1
+
+
+GUARDS = {}
+
+
+def guard(provider: str) -> ProviderGuard:
+    if provider not in GUARDS:
+        concurrency, rate = DEFAULT_LIMITS.get(provider, (8, 10))
+        env = provider.upper().replace("-", "_")
+        GUARDS[provider] = ProviderGuard(
+            provider,
+            int(settings.get(f"{env}_CONCURRENCY", str(concurrency))),
+            float(settings.get(f"{env}_RATE_LIMIT", str(rate))),
+        )
+    return GUARDS[provider]
+
+
+async def call(provider: str, operation: str, fn, idempotent: bool = True):
+    return await guard(provider).call(operation, fn, idempotent=idempotent)
+
+
+def reset():
+    """
+    Drops every guard. The Celery worker calls this between tasks, since each
+    task runs on a fresh event loop.
+    """
+    GUARDS.clear()
+
+
+def _render_breaker_metrics():
+    yield "# HELP provider_circuit_state Circuit breaker state per provider (0 closed, 1 half open, 2 open)."
+    yield "# TYPE provider_circuit_state gauge"
+    for provider, g in sorted(GUARDS.items()):
+        value = {"closed": 0, "half_open": 1, "open": 2}[g.breaker.state]
+        yield f'provider_circuit_state{{provider="{provider}"}} {value}'
+
+
+metrics.COLLECTORS.append(_render_breaker_metrics)
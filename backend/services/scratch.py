@@ -0,0 +1,355 @@
+import os
+import time
+import shutil
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from services import metrics, providers, resilience
+from services.settings import settings
+from services.cache import CACHE_DIR, SharedCache, read_file
+
+# Per-job working files (uploaded avatars, synthesized audio, generated images)
+SCRATCH_DIR = os.path.abspath(settings.get("SCRATCH_DIR", os.path.join(CACHE_DIR, "scratch")))
+# local | redis | s3. Anything but local also keeps job inputs where every worker can fetch them
+SCRATCH_BACKEND = settings.get("SCRATCH_BACKEND", "local")
+SCRATCH_TTL = int(settings.get("SCRATCH_TTL", str(24 * 3600)))
+SCRATCH_MAX_BYTES = int(settings.get("SCRATCH_MAX_BYTES", str(5 * 1024 ** 3)))
+SCRATCH_GC_INTERVAL = float(settings.get("SCRATCH_GC_INTERVAL", "300"))
+# Directories touched this recently are never evicted to meet the quota
+SCRATCH_GRACE_SECONDS = float(settings.get("SCRATCH_GRACE_SECONDS", "600"))
+# A running job renews the lease file in its directory; any worker's sweep leaves leased directories alone
+SCRATCH_LEASE_SECONDS = float(settings.get("SCRATCH_LEASE_SECONDS", "120"))
+# Queued jobs' directories are leased this long, so they survive the wait for a worker
+SCRATCH_QUEUED_LEASE_SECONDS = float(settings.get("SCRATCH_QUEUED_LEASE_SECONDS", "3600"))
+LEASE_FILE = ".lease"
+SCRATCH_REDIS_MAX_BYTES = int(settings.get("SCRATCH_REDIS_MAX_BYTES", str(32 * 1024 ** 2)))
+SCRATCH_S3_PREFIX = settings.get("SCRATCH_S3_PREFIX", "scratch/")
+
+
+class LocalBackend:
+    """
+    Nothing beyond SCRATCH_DIR. With several workers or pods, SCRATCH_DIR must be a shared volume.
+    """
+    name = "local"
+
+    async def upload(self, key: str, path: str):
+        pass
+
+    async def download(self, key: str, path: str) -> bool:
+        return False
+
+    async def delete(self, prefix: str):
+        pass
+
+
+class RedisBackend:
+    """
+    Small files in Redis (CACHE_REDIS_URL), expiring after SCRATCH_TTL.
+    """
+    name = "redis"
+
+    def __init__(self):
+        self.shared = SharedCache("scratch", ttl=SCRATCH_TTL)
+        if not self.shared.enabled:
+            raise RuntimeError("CACHE_REDIS_URL must be set when SCRATCH_BACKEND=redis.")
+
+    async def upload(self, key: str, path: str):
+        if os.path.getsize(path) > SCRATCH_REDIS_MAX_BYTES:
+            raise RuntimeError(f"{os.path.basename(path)} is over SCRATCH_REDIS_MAX_BYTES.")
+        await self.shared.set(key, await asyncio.to_thread(read_file, path))
+
+    async def download(self, key: str, path: str) -> bool:
+        data = await self.shared.get(key)
+        if data is None:
+            return False
+        await asyncio.to_thread(_write_file, path, data)
+        return True
+
+    async def delete(self, prefix: str):
+        # Entries expire on their own after SCRATCH_TTL
+        pass
+
+
+class S3Backend:
+    """
+    The asset bucket (ASSET_S3_BUCKET) under SCRATCH_S3_PREFIX. Add a lifecycle
+    rule expiring that prefix to clean up after jobs that never finish.
+    """
+    name = "s3"
+
+    async def upload(self, key: str, path: str):
+        client = providers.get("s3")
+
+        async def upload():
+            await asyncio.to_thread(client.upload_file, path, settings.asset_s3_bucket, f"{SCRATCH_S3_PREFIX}{key}")
+
+        await resilience.call("s3", "upload_scratch", upload)
+
+    async def download(self, key: str, path: str) -> bool:
+        client = providers.get("s3")
+
+        async def download():
+            await asyncio.to_thread(client.download_file, settings.asset_s3_bucket, f"{SCRATCH_S3_PREFIX}{key}", path)
+
+        try:
+            await resilience.call("s3", "download_scratch", download)
+        except Exception as e:
+            print(f"Scratch file {key} not found in S3: {e}")
+            return False
+        return True
+
+    async def delete(self, prefix: str):
+        client = providers.get("s3")
+
+        def delete():
+            listed = client.list_objects_v2(Bucket=settings.asset_s3_bucket, Prefix=f"{SCRATCH_S3_PREFIX}{prefix}")
+            keys = [{"Key": item["Key"]} for item in listed.get("Contents", [])]
+            if keys:
+                client.delete_objects(Bucket=settings.asset_s3_bucket, Delete={"Objects": keys})
+
+        await asyncio.to_thread(delete)
+
+
+BACKENDS = {
+    "local": LocalBackend,
+    "redis": RedisBackend,
+    "s3": S3Backend,
+}
+
+
+def _write_file(path: str, data: bytes):
+    part_path = f"{path}.part"
+    with open(part_path, "wb") as f:
+        f.write(data)
+    os.replace(part_path, path)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ScratchStore:
+    """
+    Working files of generation jobs, one directory per job under SCRATCH_DIR.
+    Files a job needs on another worker (its uploaded inputs) are also published
+    to the shared backend and fetched back on demand. Directories are removed
+    when their job succeeds, after SCRATCH_TTL otherwise, and oldest first while
+    the store is over SCRATCH_MAX_BYTES.
+    """
+    def __init__(self, backend, directory: str = SCRATCH_DIR):
+        self.backend = backend
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._active = set()  # job ids running in this process
+        self._last_sweep = 0.0
+        self._sweeper = None
+        self._sweep_lock = threading.Lock()
+        self.counters = {"fetched": 0, "expired": 0, "evicted": 0}
+        self.bytes = 0
+
+    def job_dir(self, job_id: str) -> str:
+        if not job_id or os.sep in job_id or job_id.startswith("."):
+            raise ValueError(f"Invalid job id '{job_id}'.")
+        return os.path.join(self.directory, job_id)
+
+    async def path(self, job_id: str, name: str) -> str:
+        """
+        Local path for one of the job's files. The job's directory is created and
+        marked as recently used; a periodic sweep runs if one is due.
+        """
+        directory = self.job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        os.utime(directory)
+        if time.monotonic() - self._last_sweep > SCRATCH_GC_INTERVAL:
+            self._last_sweep = time.monotonic()
+            self._sweeper = asyncio.create_task(asyncio.to_thread(self.sweep))
+        return os.path.join(directory, name)
+
+    async def save(self, job_id: str, name: str, chunks) -> str:
+        """
+        Writes a stream into the job's directory and publishes it to the shared
+        backend, so any worker can run the job. Returns the local path. The job's
+        directory is reserved until a worker holds it.
+        """
+        await self.reserve(job_id)
+        path = await self.path(job_id, name)
+        with open(path, "wb") as f:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+        await self.backend.upload(f"{job_id}/{name}", path)
+        return path
+
+    async def fetch(self, job_id: str, name: str) -> str:
+        """
+        Local path of a file saved with save(), downloaded from the shared backend
+        when this worker doesn't have it.
+        """
+        path = await self.path(job_id, name)
+        if not os.path.exists(path):
+            if not await self.backend.download(f"{job_id}/{name}", path):
+                raise FileNotFoundError(f"Scratch file '{name}' of job {job_id} is gone; it may have expired.")
+            self.counters["fetched"] += 1
+        return path
+
+    async def release(self, job_id: str):
+        """
+        Removes the job's files here and in the shared backend.
+        """
+        await asyncio.to_thread(shutil.rmtree, self.job_dir(job_id), True)
+        try:
+            await self.backend.delete(f"{job_id}/")
+        except Exception as e:
+            print(f"Failed to delete shared scratch files of job {job_id}: {e}")
+
+    def _renew_lease(self, job_id: str, until: float = None):
+        directory = self.job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LEASE_FILE), "a"):
+            pass
+        # A lease dated in the future lasts SCRATCH_LEASE_SECONDS past that date
+        os.utime(os.path.join(directory, LEASE_FILE), None if until is None else (until, until))
+
+    def _drop_lease(self, job_id: str):
+        try:
+            os.unlink(os.path.join(self.job_dir(job_id), LEASE_FILE))
+        except FileNotFoundError:
+            pass
+
+    async def _keep_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(SCRATCH_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self._renew_lease, job_id)
+            except OSError as e:
+                print(f"Failed to renew scratch lease of job {job_id}: {e}")
+
+    async def reserve(self, job_id: str):
+        """
+        Leases a queued job's directory for SCRATCH_QUEUED_LEASE_SECONDS, so no
+        worker's sweep evicts its inputs before one of them runs it.
+        """
+        await asyncio.to_thread(self._renew_lease, job_id, time.time() + SCRATCH_QUEUED_LEASE_SECONDS)
+
+    @asynccontextmanager
+    async def hold(self, job_id: str):
+        """
+        Keeps every worker's sweep away from a running job's directory. The lease
+        file is renewed while the job runs, so a worker that dies mid-job only
+        protects the directory until SCRATCH_LEASE_SECONDS have passed.
+        """
+        self._active.add(job_id)
+        await asyncio.to_thread(self._renew_lease, job_id)
+        keeper = asyncio.create_task(self._keep_lease(job_id))
+        try:
+            yield
+        finally:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+            self._active.discard(job_id)
+            await asyncio.to_thread(self._drop_lease, job_id)
+
+    def _leased(self, path: str, now: float) -> bool:
+        try:
+            return now - os.path.getmtime(os.path.join(path, LEASE_FILE)) < SCRATCH_LEASE_SECONDS
+        except OSError:
+            return False
+
+    def sweep(self):
+        """
+        Drops expired job directories, then the least recently used ones until
+        the store fits in SCRATCH_MAX_BYTES.
+        """
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            entries = []
+            held = 0
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if not os.path.isdir(path):
+                    continue
+                if name in self._active or self._leased(path, now):
+                    # Running here or on another worker sharing the volume
+                    held += _dir_size(path)
+                    continue
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if now - mtime > SCRATCH_TTL:
+                    shutil.rmtree(path, ignore_errors=True)
+                    self.counters["expired"] += 1
+                else:
+                    entries.append((mtime, path, _dir_size(path)))
+
+            total = held + sum(size for _, _, size in entries)
+            for mtime, path, size in sorted(entries):
+                if total <= SCRATCH_MAX_BYTES:
+                    break
+                if now - mtime < SCRATCH_GRACE_SECONDS:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                self.counters["evicted"] += 1
+                total -= size
+            self.bytes = total
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "bytes": self.bytes, "active": len(self._active), **self.counters}
+
+
+_store = None
+
+
+def get_store() -> ScratchStore:
+    global _store
+    if _store is None:
+        if SCRATCH_BACKEND not in BACKENDS:
+            raise RuntimeError(f"Unknown SCRATCH_BACKEND '{SCRATCH_BACKEND}'. Expected one of: {', '.join(BACKENDS)}")
+        _store = ScratchStore(BACKENDS[SCRATCH_BACKEND]())
+    return _store
+
+
+def _render_scratch_metrics():
+    if _store is None:
+        return
+    yield "# HELP scratch_bytes Bytes held in job scratch directories at the last sweep."
+    yield "# TYPE scratch_bytes gauge"
+    yield f"scratch_bytes {_store.bytes}"
+    yield "# HELP scratch_removed_total Job scratch directories removed by the sweep."
+    yield "# TYPE scratch_removed_total counter"
+    for reason in ("expired", "evicted"):
+        yield f'scratch_removed_total{{reason="{reason}"}} {_store.counters[reason]}'
+
+
+metrics.COLLECTORS.append(_render_scratch_metrics)
+
+
+async def path(job_id: str, name: str) -> str:
+    return await get_store().path(job_id, name)
+
+
+async def save(job_id: str, name: str, chunks) -> str:
+    return await get_store().save(job_id, name, chunks)
+
+
+async def fetch(job_id: str, name: str) -> str:
+    return await get_store().fetch(job_id, name)
+
+
+async def release(job_id: str):
+    await get_store().release(job_id)
+
+
+async def reserve(job_id: str):
+    await get_store().reserve(job_id)
@@ -0,0 +1,219 @@
+import json
+import asyncio
+
+from services import providers, resilience
+from services.cache import TieredCache, SingleFlight, cache_key, read_file
+from services.http import get_client
+from services.metrics import track
+from services.settings import settings
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = settings.get("OPENAI_MODEL", "gpt-3.5-turbo")
+# Per-read timeout: a streamed completion may take longer overall as long as tokens keep coming
+OPENAI_TIMEOUT = float(settings.get("OPENAI_TIMEOUT", "30"))
+OPENAI_STREAM = settings.get("OPENAI_STREAM", "1") not in ("0", "false", "no")
+SCRIPT_CACHE_MAX_BYTES = int(settings.get("SCRIPT_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+
+# avatar_description is asked for first so the image can start while the script is still streaming
+SYSTEM_PROMPT = (
+    "You are an AI assistant that generates a short video script and a visual description for an avatar image, "
+    "based on a user's prompt. Respond with a JSON object whose first key is 'avatar_description' "
+    "followed by 'script'."
+)
+# Everything besides the prompt that changes the completion
+CHAT_PARAMS = {
+    "model": OPENAI_MODEL,
+    "max_tokens": 400,
+    "temperature": 0.7,
+    "response_format": {"type": "json_object"},
+}
+
+script_cache = TieredCache("scripts", max_bytes=SCRIPT_CACHE_MAX_BYTES, suffix=".json")
+_script_flights = SingleFlight()
+
+
+class JSONObjectStream:
+    """
+    Incremental parser for a JSON object that arrives in pieces. feed() takes the
+    next piece of text and returns the top-level fields it completed, so a field
+    can be used before the rest of the object has been generated. Text before the
+    opening brace (e.g. a ```json fence) and after the closing one is ignored.
+    Raises ValueError on malformed input.
+    """
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start, key, colon, value, comma
+        self._key = None
+        # The token (key or value) being scanned: start index, kind and nesting state
+        self._start = None
+        self._kind = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def _begin(self, char: str):
+        self._start = self._pos
+        self._kind = "string" if char == '"' else "container" if char in "{[" else "scalar"
+        self._depth, self._in_string, self._escaped = 0, False, False
+
+    def _string_ends(self, char: str) -> bool:
+        if self._escaped:
+            self._escaped = False
+        elif char == "\\":
+            self._escaped = True
+        elif char == '"':
+            return True
+        return False
+
+    def _token_ends(self, char: str) -> bool:
+        if self._kind == "string":
+            return self._pos > self._start and self._string_ends(char)
+        if self._kind == "scalar":
+            return char in ",}]" or char.isspace()
+        if self._in_string:
+            self._in_string = not self._string_ends(char)
+        elif char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            return self._depth == 0
+        return False
+
+    def feed(self, text: str) -> dict:
+        self._buffer += text
+        completed = {}
+        while self._pos < len(self._buffer) and not self.done:
+            char = self._buffer[self._pos]
+            if self._start is not None:
+                if not self._token_ends(char):
+                    self._pos += 1
+                    continue
+                # Scalars end just before their delimiter, strings and containers on their closing character
+                end = self._pos if self._kind == "scalar" else self._pos + 1
+                try:
+                    value = json.loads(self._buffer[self._start:end])
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Malformed JSON value: {e}")
+                self._start, self._pos = None, end
+                if self._state == "key":
+                    self._key, self._state = value, "colon"
+                else:
+                    self.fields[self._key] = completed[self._key] = value
+                    self._state = "comma"
+                continue
+
+            if char.isspace() or (self._state == "start" and char != "{"):
+                pass
+            elif self._state == "start":
+                self._state = "key"
+            elif self._state == "key" and char == '"':
+                self._begin(char)
+                continue
+            elif self._state == "colon" and char == ":":
+                self._state = "value"
+            elif self._state == "value":
+                self._begin(char)
+                continue
+            elif self._state == "comma" and char == ",":
+                self._state = "key"
+            elif self._state in ("key", "comma") and char == "}":
+                self.done = True
+            else:
+                raise ValueError(f"Unexpected '{char}' at offset {self._pos} of the JSON object.")
+            self._pos += 1
+        return completed
+
+
+async def _stream_completion(headers: dict, body: dict):
+    """
+    Yields the content deltas of a streamed chat completion.
+    """
+    async with get_client().stream("POST", OPENAI_CHAT_URL, headers=headers, json={**body, "stream": True},
+                                   timeout=OPENAI_TIMEOUT) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+async def _complete(headers: dict, body: dict):
+    """
+    Yields the whole content of a non-streamed chat completion as one piece.
+    """
+    response = await get_client().post(OPENAI_CHAT_URL, headers=headers, json=body, timeout=OPENAI_TIMEOUT)
+    response.raise_for_status()
+    yield response.json()["choices"][0]["message"]["content"]
+
+
+async def _generate(prompt: str, on_field=None):
+    """
+    Returns (result, parsed); parsed is False when the fallback was used.
+    """
+    headers = providers.get("openai")
+    body = {
+        **CHAT_PARAMS,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+    }
+    parser = JSONObjectStream()
+    content = []
+    malformed = False
+    open_stream = (lambda: _stream_completion(headers, body)) if OPENAI_STREAM else (lambda: _complete(headers, body))
+
+    with track("openai", "chat"):
+        async for piece in resilience.guard("openai").stream("chat", open_stream):
+            content.append(piece)
+            if malformed:
+                continue
+            try:
+                completed = parser.feed(piece)
+            except ValueError as e:
+                print(f"GPT output isn't the requested JSON, using it as plain text: {e}")
+                malformed = True
+                continue
+            if on_field:
+                for key, value in completed.items():
+                    await on_field(key, value)
+
+    fields = parser.fields
+    if isinstance(fields.get("script"), str) and isinstance(fields.get("avatar_description"), str):
+        return {"script": fields["script"], "avatar_description": fields["avatar_description"]}, True
+    # Fallback: use the raw text as the script and the prompt (unless already handed out) as the description
+    return {"script": "".join(content), "avatar_description": fields.get("avatar_description") or prompt}, False
+
+
+async def generate_script(prompt: str, on_field=None) -> dict:
+    """
+    Returns {"script", "avatar_description"} for a prompt. Results are cached by
+    prompt and chat parameters, and concurrent identical prompts share one call.
+    The completion is streamed, and on_field(key, value) is awaited for each
+    top-level field as soon as the model has finished writing it.
+    """
+    key = cache_key(prompt=prompt, system=SYSTEM_PROMPT, **CHAT_PARAMS)
+    cached_path = await script_cache.get_path(key)
+    if cached_path:
+        return json.loads(await asyncio.to_thread(read_file, cached_path))
+
+    async def call():
+        result, parsed = await _generate(prompt, on_field)
+        # Fallback results aren't cached, so the next request gets another chance at proper JSON
+        if parsed:
+            await asyncio.to_thread(script_cache.disk.put, key, json.dumps(result).encode("utf-8"))
+            await script_cache.publish(key)
+        return result
+
+    return await _script_flights.do(key, call)
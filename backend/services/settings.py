@@ -0,0 +1,30 @@
+import os
+from dotenv import load_dotenv
+
+
+class Settings:
+    """
+    Environment configuration, read once per process. `.env` is loaded here and
+    nowhere else; provider credentials are attributes, tuning knobs go through get().
+    """
+    def __init__(self):
+        load_dotenv()
+        self.d_id_api_key = os.getenv("D_ID_API_KEY")
+        self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.hugging_face_api_key = os.getenv("HUGGING_FACE_API_KEY")
+        self.fish_audio_api_key = os.getenv("FISH_AUDIO_API_KEY")
+        self.cloudconvert_api_key = os.getenv("CLOUDCONVERT_API_KEY")
+        self.cloudinary_cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
+        self.cloudinary_api_key = os.getenv("CLOUDINARY_API_KEY")
+        self.cloudinary_api_secret = os.getenv("CLOUDINARY_API_SECRET")
+        self.supabase_url = os.getenv("SUPABASE_URL")
+        self.supabase_key = os.getenv("SUPABASE_KEY")
+        # S3-compatible asset store; credentials come from the usual AWS_* variables
+        self.asset_s3_bucket = os.getenv("ASSET_S3_BUCKET")
+        self.asset_s3_endpoint_url = os.getenv("ASSET_S3_ENDPOINT_URL")
+
+    def get(self, name: str, default: str = None) -> str:
+        return os.getenv(name, default)
+
+
+settings = Settings()
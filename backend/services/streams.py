@@ -0,0 +1,110 @@
+import os
+import uuid
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+
+from services.http import get_client
+from services.cache import iter_file
+from services.settings import settings
+
+STREAM_CHUNK_SIZE = int(settings.get("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+SPOOL_MAX_MEMORY = int(settings.get("SPOOL_MAX_MEMORY", str(32 * 1024 * 1024)))
+
+
+async def iter_upload(upload, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yields an UploadFile's body in chunks instead of reading it whole.
+    """
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def iter_url(url: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yields a remote file in chunks as it downloads.
+    """
+    async with get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(chunk_size):
+            yield chunk
+
+
+async def iter_bytes(data: bytes):
+    yield data
+
+
+def as_chunks(source, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Normalizes bytes, a local path or an async iterable into an async chunk iterator.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return iter_bytes(bytes(source))
+    if isinstance(source, str):
+        return iter_file(source, chunk_size)
+    return source
+
+
+def multipart_body(fields: dict, file_field: str, filename: str, content_type: str, chunks, size: int = None):
+    """
+    Builds a streamed multipart/form-data body around a chunk iterator.
+    Returns (headers, async body). Content-Length is set when the file size is known,
+    since some upload targets reject chunked transfer encoding.
+    """
+    boundary = uuid.uuid4().hex
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    )
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async def body():
+        yield head
+        async for chunk in chunks:
+            yield chunk
+        yield tail
+
+    headers = {"content-type": f"multipart/form-data; boundary={boundary}"}
+    if size is not None:
+        headers["content-length"] = str(len(head) + size + len(tail))
+    return headers, body()
+
+
+async def spool(chunks, max_memory: int = SPOOL_MAX_MEMORY):
+    """
+    Collects a stream into a SpooledTemporaryFile (memory first, disk past max_memory),
+    rewound and ready to read. For SDKs that need a seekable file object.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    async for chunk in chunks:
+        if spooled._rolled:
+            await asyncio.to_thread(spooled.write, chunk)
+        else:
+            spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+@asynccontextmanager
+async def spooled_path(chunks, suffix: str = ""):
+    """
+    Last resort for SDKs that only take a file path: writes the stream to a temp
+    file, yields its path and removes it afterwards.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
@@ -1,23 +1,271 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
 
-load_dotenv()
+from services import metrics, providers
+from services.cache import CACHE_DIR
+from services.metrics import track
+from services.settings import settings
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_BATCH_SIZE = int(settings.get("SUPABASE_BATCH_SIZE", "100"))
+SUPABASE_FLUSH_INTERVAL = float(settings.get("SUPABASE_FLUSH_INTERVAL", "1"))
+SUPABASE_BUFFER_MAX = int(settings.get("SUPABASE_BUFFER_MAX", "5000"))  # rows held in memory
+SUPABASE_SPILL_PATH = settings.get("SUPABASE_SPILL_PATH", os.path.join(CACHE_DIR, "supabase_spill.jsonl"))
+SUPABASE_SPILL_MAX_BYTES = int(settings.get("SUPABASE_SPILL_MAX_BYTES", str(256 * 1024 * 1024)))
+SUPABASE_SPILL_RETRY = float(settings.get("SUPABASE_SPILL_RETRY", "15"))
 
-supabase: Client = None
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-else:
-    print("Warning: SUPABASE_URL or SUPABASE_KEY not set. Supabase will not be available.")
+# table -> columns identifying a row. Writes to the same row are merged while buffered
+TABLE_KEYS = {
+    "jobs": ("id",),
+    "job_checkpoints": ("job_id", "stage"),
+}
 
-def save_job(job_id: str, script: str, image_url: str, video_url: str, prompt: str = "", model: str = "prompt") -> None:
+
+class SupabaseWriter:
+    """
+    Buffers row writes and upserts them in batches from a background task, so
+    Supabase latency never sits on the request path. A batch goes out every
+    SUPABASE_FLUSH_INTERVAL seconds or as soon as SUPABASE_BATCH_SIZE rows are waiting.
+
+    Rows that can't be written (Supabase unreachable, or the buffer is full) are
+    appended to a local spill file, which is replayed in order once writes succeed.
+    """
+    def __init__(self, spill_path: str = SUPABASE_SPILL_PATH):
+        self.spill_path = spill_path
+        self._buffer = {}  # (table, key values) -> row, in arrival order
+        self._overflow = []  # (table, row) pushed out of a full buffer, spilled by the flush task
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._task = None
+        self._wakeup = None
+        self._closing = False
+        self._replay_at = 0.0
+        self._listeners = {}  # table -> [async fn(rows)], called after rows are written
+        self.counters = {"written": 0, "batches": 0, "failed_batches": 0, "spilled": 0, "replayed": 0, "dropped": 0}
+
+    def add(self, table: str, row: dict):
+        """
+        Queues an upsert. Never blocks on the network or the disk.
+        """
+        key = (table, tuple(row[column] for column in TABLE_KEYS[table]))
+        overflow = False
+        with self._lock:
+            if key in self._buffer:
+                self._buffer[key].update(row)
+            else:
+                self._buffer[key] = dict(row)
+            if len(self._buffer) > SUPABASE_BUFFER_MAX:
+                oldest = next(iter(self._buffer))
+                self._overflow.append((oldest[0], self._buffer.pop(oldest)))
+                overflow = True
+            size = len(self._buffer)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a thread: the next flush on the loop picks it up
+            return
+        self._ensure_running()
+        if size >= SUPABASE_BATCH_SIZE or overflow:
+            self._wakeup.set()
+
+    def on_write(self, table: str, listener):
+        """
+        Registers an async listener(rows) called after rows of `table` are written.
+        """
+        self._listeners.setdefault(table, []).append(listener)
+
+    async def _notify(self, table: str, rows: list):
+        for listener in self._listeners.get(table, []):
+            try:
+                await listener(rows)
+            except Exception as e:
+                print(f"Supabase write listener failed: {e}")
+
+    def pending(self, table: str, **match) -> list:
+        """
+        Buffered rows of `table` whose columns equal `match`, for reads that
+        must see writes not flushed yet.
+        """
+        with self._lock:
+            rows = [dict(row) for t, row in self._overflow if t == table]
+            rows += [dict(row) for (t, _), row in self._buffer.items() if t == table]
+        return [row for row in rows if all(row.get(k) == v for k, v in match.items())]
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=SUPABASE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Supabase writer flush failed: {e}")
+
+    async def flush(self):
+        """
+        Writes everything buffered so far, then replays the spill file if there is one.
+        """
+        with self._lock:
+            overflow, self._overflow = self._overflow, []
+            rows, self._buffer = list(self._buffer.items()), {}
+        if overflow:
+            # The oldest rows go to disk first; the rest queue behind them below
+            await asyncio.to_thread(self._spill, overflow)
+        if not rows:
+            if os.path.exists(self.spill_path) and time.monotonic() >= self._replay_at:
+                await asyncio.to_thread(self._replay, asyncio.get_running_loop())
+            return
+
+        rows = [(table, row) for (table, _), row in rows]
+        if os.path.exists(self.spill_path):
+            # Older rows are still on disk; queue behind them so writes stay in order
+            await asyncio.to_thread(self._spill, rows)
+            if time.monotonic() >= self._replay_at:
+                await asyncio.to_thread(self._replay, asyncio.get_running_loop())
+            return
+
+        for table, batch in _batches(rows):
+            if await asyncio.to_thread(self._write, table, batch):
+                await self._notify(table, batch)
+            else:
+                await asyncio.to_thread(self._spill, [(table, row) for row in batch])
+
+    def _write(self, table: str, rows: list) -> bool:
+        if not providers.configured("supabase"):
+            return True
+        try:
+            with track("supabase", f"upsert_{table}"):
+                providers.get("supabase").table(table) \
+                    .upsert(rows, on_conflict=",".join(TABLE_KEYS[table])).execute()
+        except Exception as e:
+            print(f"Failed to write {len(rows)} {table} rows to Supabase: {e}")
+            self.counters["failed_batches"] += 1
+            self._replay_at = time.monotonic() + SUPABASE_SPILL_RETRY
+            return False
+        self.counters["batches"] += 1
+        self.counters["written"] += len(rows)
+        return True
+
+    def _spill(self, rows: list):
+        with self._spill_lock:
+            size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+            if size >= SUPABASE_SPILL_MAX_BYTES:
+                print(f"Supabase spill file is full; dropping {len(rows)} rows.")
+                self.counters["dropped"] += len(rows)
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            with open(self.spill_path, "a") as f:
+                for table, row in rows:
+                    f.write(json.dumps({"table": table, "row": row}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.counters["spilled"] += len(rows)
+
+    def _replay(self, loop):
+        """
+        Writes the spill file back in order, a batch at a time. On failure the
+        unwritten tail is kept for the next attempt.
+        """
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            done, failed = 0, False
+            with open(self.spill_path) as f:
+                for table, batch in _batches(_read_spill(f)):
+                    if not self._write(table, batch):
+                        failed = True
+                        break
+                    asyncio.run_coroutine_threadsafe(self._notify(table, batch), loop)
+                    done += len(batch)
+                    self.counters["replayed"] += len(batch)
+            if not failed:
+                os.unlink(self.spill_path)
+                return
+            # Rewrite the file without the rows that made it
+            remaining = f"{self.spill_path}.tmp"
+            with open(self.spill_path) as src, open(remaining, "w") as dst:
+                for i, line in enumerate(line for line in src if line.strip()):
+                    if i >= done:
+                        dst.write(line)
+            os.replace(remaining, self.spill_path)
+
+    async def stop(self):
+        """
+        Flushes what's left. Called on shutdown; anything Supabase rejects stays in the spill file.
+        """
+        if self._task is not None and not self._task.done():
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._closing = False
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer) + len(self._overflow)
+        spilled = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        return {"buffered": buffered, "spill_bytes": spilled, **self.counters}
+
+
+def _read_spill(f):
+    for line in f:
+        if line.strip():
+            entry = json.loads(line)
+            yield entry["table"], entry["row"]
+
+
+def _batches(rows):
     """
-    Insert a job row into the jobs table in Supabase.
+    Groups consecutive rows into upsert batches of one table and one column set
+    (PostgREST bulk upserts need every row to have the same keys).
     """
-    if not supabase:
+    batch, shape = [], None
+    for table, row in rows:
+        row_shape = (table, tuple(sorted(row)))
+        if batch and (row_shape != shape or len(batch) >= SUPABASE_BATCH_SIZE):
+            yield shape[0], batch
+            batch = []
+        shape = row_shape
+        batch.append(row)
+    if batch:
+        yield shape[0], batch
+
+
+writer = SupabaseWriter()
+
+
+def _render_writer_metrics():
+    stats = writer.stats()
+    yield "# HELP supabase_writer_buffered_rows Rows waiting to be written to Supabase."
+    yield "# TYPE supabase_writer_buffered_rows gauge"
+    yield f"supabase_writer_buffered_rows {stats['buffered']}"
+    yield "# HELP supabase_writer_spill_bytes Size of the Supabase spill file."
+    yield "# TYPE supabase_writer_spill_bytes gauge"
+    yield f"supabase_writer_spill_bytes {stats['spill_bytes']}"
+
+
+metrics.COLLECTORS.append(_render_writer_metrics)
+
+
+def save_job(job_id: str, script: str, image_url: str, video_url: str, prompt: str = "", model: str = "prompt",
+             stage_timings: dict = None, user_id: str = None) -> None:
+    """
+    Queue a job row for the jobs table in Supabase.
+    stage_timings (stage -> ms) goes into the optional jsonb `stage_timings` column.
+    """
+    if not providers.configured("supabase"):
         print("Supabase client not initialized. Skipping save_job.")
         return
     data = {
@@ -28,7 +276,58 @@ def save_job(job_id: str, script: str, image_url: str, video_url: str, prompt: s
         "video_url": video_url,
         "model": model,
     }
+    if stage_timings:
+        data["stage_timings"] = dict(stage_timings)
+    if user_id:
+        data["user_id"] = user_id
+    writer.add("jobs", data)
+
+
+def save_job_status(job_id: str, status: str, user_id: str = None, **fields) -> None:
+    """
+    Queue a status change of a job row (queued, running, succeeded, failed),
+    so job history shows jobs that are still running or failed.
+    """
+    if not providers.configured("supabase"):
+        return
+    data = {"id": job_id, "status": status, "user_id": user_id,
+            "updated_at": datetime.now(timezone.utc).isoformat(), **fields}
+    writer.add("jobs", data)
+
+
+# Stage outputs of generation jobs, so a failed job can resume where it stopped:
+#   create table job_checkpoints (
+#     job_id text not null,
+#     stage text not null,
+#     kind text not null,
+#     output jsonb not null,
+#     created_at timestamptz not null default now(),
+#     primary key (job_id, stage)
+#   );
+def save_checkpoint(job_id: str, kind: str, stage: str, output: dict) -> None:
+    """
+    Queue an upsert of one stage's output into the job_checkpoints table.
+    """
+    if not providers.configured("supabase"):
+        return
+    writer.add("job_checkpoints", {"job_id": job_id, "kind": kind, "stage": stage, "output": output})
+
+
+def load_checkpoints(job_id: str) -> list:
+    """
+    Returns the job's checkpoint rows ({"stage", "kind", "output"}), or [] if unavailable.
+    Rows still waiting in the writer's buffer are included.
+    """
+    if not providers.configured("supabase"):
+        return []
+    pending = {row["stage"]: row for row in writer.pending("job_checkpoints", job_id=job_id)}
     try:
-        supabase.table("jobs").insert(data).execute()
+        with track("supabase", "load_checkpoints"):
+            response = providers.get("supabase").table("job_checkpoints") \
+                .select("stage, kind, output").eq("job_id", job_id).execute()
+        rows = response.data or []
     except Exception as e:
-        print(f"Failed to save job to Supabase: {e}") 
\ No newline at end of file
+        print(f"Failed to load checkpoints from Supabase: {e}")
+        rows = []
+    rows = [row for row in rows if row["stage"] not in pending]
+    return rows + [{"stage": row["stage"], "kind": row["kind"], "output": row["output"]} for row in pending.values()]
@@ -0,0 +1,212 @@
+import time
+import random
+import asyncio
+
+from services import metrics
+from services.settings import settings
+
+TALK_POLL_INITIAL_DELAY = float(settings.get("TALK_POLL_INITIAL_DELAY", "2"))
+TALK_POLL_MAX_DELAY = float(settings.get("TALK_POLL_MAX_DELAY", "15"))
+TALK_POLL_BACKOFF = float(settings.get("TALK_POLL_BACKOFF", "1.5"))
+TALK_POLL_JITTER = float(settings.get("TALK_POLL_JITTER", "0.2"))
+TALK_POLL_BATCH_SIZE = int(settings.get("TALK_POLL_BATCH_SIZE", "25"))
+TALK_POLL_RATE = float(settings.get("TALK_POLL_RATE", "5"))  # status requests per second
+TALK_TIMEOUT = float(settings.get("TALK_TIMEOUT", "600"))
+TALK_MAX_ERRORS = int(settings.get("TALK_MAX_ERRORS", "5"))
+
+DONE_STATUSES = {"done"}
+FAILED_STATUSES = {"error", "rejected"}
+
+
+class _Watch:
+    def __init__(self, talk_id: str, future: asyncio.Future, deadline: float):
+        self.talk_id = talk_id
+        self.future = future
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.delay = TALK_POLL_INITIAL_DELAY
+        self.next_poll_at = self.started + self.delay
+        self.errors = 0
+
+
+class TalkWatcher:
+    """
+    Tracks any number of in-flight D-ID talks from a single asyncio task.
+
+    Each talk is polled on its own adaptive schedule (exponential backoff with
+    jitter). Due talks are checked together in batches, total request rate is
+    capped, and a 429 pauses all polling for the Retry-After period.
+
+    When D-ID webhooks are configured, talks are settled by resolve() as the
+    callback arrives; D-ID is only polled for talks older than `fallback_after`
+    seconds, and until then a check just asks `lookup` (webhooks received by
+    other workers).
+    """
+    def __init__(self, fetch_status, lookup=None, fallback_after: float = 0.0):
+        # fetch_status(talk_id) -> httpx.Response for GET /talks/{talk_id}
+        self._fetch_status = fetch_status
+        # lookup(talk_id) -> final talk payload or None
+        self._lookup = lookup
+        self._fallback_after = fallback_after
+        self._watches = {}
+        self._task = None
+        self._wakeup = None
+        self._paused_until = 0.0
+        self._next_slot = 0.0
+
+    def watch(self, talk_id: str, callback=None, timeout: float = TALK_TIMEOUT) -> asyncio.Future:
+        """
+        Starts tracking a talk. Returns a future resolved with the final talk
+        payload; callback, if given, is called with that future when it's done.
+        """
+        self._ensure_running()
+        watch = self._watches.get(talk_id)
+        if watch is None:
+            future = asyncio.get_running_loop().create_future()
+            watch = _Watch(talk_id, future, time.monotonic() + timeout)
+            self._watches[talk_id] = watch
+            self._wakeup.set()
+        if callback:
+            watch.future.add_done_callback(callback)
+        return watch.future
+
+    async def wait(self, talk_id: str, timeout: float = TALK_TIMEOUT) -> dict:
+        """
+        Waits until the talk finishes and returns its final status payload.
+        """
+        return await asyncio.shield(self.watch(talk_id, timeout=timeout))
+
+    def resolve(self, talk_id: str, data: dict) -> bool:
+        """
+        Settles a watched talk from a final payload pushed by D-ID. Returns
+        False if the talk isn't watched here or the payload isn't final.
+        """
+        watch = self._watches.get(talk_id)
+        if watch is None or data.get("status") not in DONE_STATUSES | FAILED_STATUSES:
+            return False
+        self._settle(watch, data)
+        return True
+
+    def pending(self) -> int:
+        return len(self._watches)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for watch in self._watches.values():
+            if not watch.future.done():
+                watch.future.cancel()
+        self._watches = {}
+        self._task = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _finish(self, watch: _Watch, result=None, error: Exception = None):
+        self._watches.pop(watch.talk_id, None)
+        if watch.future.done():
+            return
+        if error:
+            watch.future.set_exception(error)
+        else:
+            watch.future.set_result(result)
+
+    def _reschedule(self, watch: _Watch, not_before: float = 0.0):
+        watch.delay = min(watch.delay * TALK_POLL_BACKOFF, TALK_POLL_MAX_DELAY)
+        jitter = 1 + random.uniform(-TALK_POLL_JITTER, TALK_POLL_JITTER)
+        watch.next_poll_at = max(time.monotonic() + watch.delay * jitter, not_before)
+
+    async def _throttle(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot, self._paused_until)
+        self._next_slot = slot + 1 / TALK_POLL_RATE
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _run(self):
+        while True:
+            if not self._watches:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            due = sorted(
+                (w for w in self._watches.values() if w.next_poll_at <= now),
+                key=lambda w: w.next_poll_at,
+            )[:TALK_POLL_BATCH_SIZE]
+
+            if not due:
+                next_at = min(w.next_poll_at for w in self._watches.values())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_at - now, 0))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            checks = []
+            for watch in due:
+                await self._throttle()
+                checks.append(asyncio.create_task(self._check(watch)))
+            await asyncio.gather(*checks, return_exceptions=True)
+
+    async def _check(self, watch: _Watch):
+        if watch.future.done():
+            self._watches.pop(watch.talk_id, None)
+            return
+        if time.monotonic() > watch.deadline:
+            self._finish(watch, error=TimeoutError(f"D-ID talk {watch.talk_id} did not finish in time"))
+            return
+
+        if self._lookup:
+            try:
+                data = await self._lookup(watch.talk_id)
+            except Exception as e:
+                print(f"Talk webhook lookup failed: {e}")
+                data = None
+            if data is not None:
+                self._settle(watch, data)
+                return
+        if time.monotonic() - watch.started < self._fallback_after:
+            # The webhook isn't late yet; spare D-ID the status request
+            self._reschedule(watch)
+            return
+
+        try:
+            response = await self._fetch_status(watch.talk_id)
+        except Exception as e:
+            self._on_error(watch, e)
+            return
+
+        if response.status_code == 429:
+            retry_after = float(response.headers.get("retry-after") or watch.delay)
+            self._paused_until = time.monotonic() + retry_after
+            self._reschedule(watch, not_before=self._paused_until)
+            return
+        if response.status_code >= 400:
+            self._on_error(watch, RuntimeError(f"D-ID returned {response.status_code}: {response.text}"))
+            return
+
+        watch.errors = 0
+        self._settle(watch, response.json())
+
+    def _settle(self, watch: _Watch, data: dict):
+        status = data.get("status")
+        if status in DONE_STATUSES:
+            self._finish(watch, result=data)
+        elif status in FAILED_STATUSES:
+            self._finish(watch, error=RuntimeError(f"D-ID talk {watch.talk_id} {status}: {data.get('error') or data}"))
+        else:
+            self._reschedule(watch)
+
+    def _on_error(self, watch: _Watch, e: Exception):
+        watch.errors += 1
+        if watch.errors >= TALK_MAX_ERRORS:
+            self._finish(watch, error=e)
+        else:
+            metrics.provider_retries.inc(provider="d-id", operation="talk_status")
+            self._reschedule(watch)
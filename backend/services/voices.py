@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+from services import providers, resilience
+from services.settings import settings
+from services.cache import CACHE_DIR, SharedCache, SingleFlight
+from services.metrics import track
+
+VOICE_REGISTRY_PATH = settings.get("VOICE_REGISTRY_PATH", os.path.join(CACHE_DIR, "voices.json"))
+# Fish Audio models don't expire, so shared entries are kept for a year
+VOICE_REGISTRY_TTL = int(settings.get("VOICE_REGISTRY_TTL", str(365 * 24 * 3600)))
+# Voice used when the request names none and the user has never cloned one.
+# Unset means Fish Audio's own default voice.
+FISH_AUDIO_DEFAULT_VOICE = settings.get("FISH_AUDIO_DEFAULT_VOICE")
+
+
+def audio_hash(audio: bytes) -> str:
+    return hashlib.sha256(audio).hexdigest()
+
+
+class VoiceRegistry:
+    """
+    Maps reference audio (by sha256) to the Fish Audio model cloned from it, and
+    users to the voices they cloned. Metadata lives in a local JSON file and, when
+    CACHE_REDIS_URL is set, in Redis so every worker reuses the same models.
+    """
+    def __init__(self, path: str = VOICE_REGISTRY_PATH):
+        self.path = path
+        self._voices = {}  # audio sha256 -> voice metadata
+        self._users = {}   # user id -> voice metadata, newest first
+        self._shared = SharedCache("voices", ttl=VOICE_REGISTRY_TTL)
+        self._flights = SingleFlight()
+        self._file_lock = threading.Lock()
+        self.counters = {"reused": 0, "cloned": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Ignoring unreadable voice registry {self.path}: {e}")
+            return
+        self._voices = data.get("voices", {})
+        self._users = data.get("users", {})
+
+    def _save(self):
+        # Written to a temp file and renamed so a crash never leaves half a registry
+        with self._file_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            part_path = f"{self.path}.part"
+            with open(part_path, "w") as f:
+                json.dump({"voices": self._voices, "users": self._users}, f)
+            os.replace(part_path, self.path)
+
+    async def lookup(self, digest: str):
+        """
+        Metadata of the model cloned from audio with this hash, or None.
+        """
+        voice = self._voices.get(digest)
+        if voice is None:
+            shared = await self._shared.get(f"audio:{digest}")
+            if shared:
+                voice = self._voices[digest] = json.loads(shared)
+        return voice
+
+    async def voices_for(self, user_id: str) -> list:
+        """
+        The user's voices, most recently used first.
+        """
+        voices = self._users.get(user_id)
+        if voices is None:
+            shared = await self._shared.get(f"user:{user_id}")
+            voices = self._users[user_id] = json.loads(shared) if shared else []
+        return voices
+
+    async def _assign(self, user_id: str, voice: dict):
+        voices = [v for v in await self.voices_for(user_id) if v["voice_id"] != voice["voice_id"]]
+        self._users[user_id] = [voice, *voices]
+        await self._shared.set(f"user:{user_id}", json.dumps(self._users[user_id]))
+
+    async def _create(self, audio: bytes, digest: str, title: str) -> dict:
+        session = providers.get("fish-audio")
+
+        # The SDK takes the reference audio as bytes and blocks, so it runs in the threadpool
+        async def create_model():
+            with track("fish-audio", "create_model"):
+                return await asyncio.to_thread(session.create_model, title=title, voices=[audio])
+
+        # Each call creates a new model, so it's only retried if it never reached Fish Audio
+        model = await resilience.call("fish-audio", "create_model", create_model, idempotent=False)
+        voice = {"voice_id": model.id, "title": title, "audio_sha256": digest, "created_at": time.time()}
+        self._voices[digest] = voice
+        await self._shared.set(f"audio:{digest}", json.dumps(voice))
+        return voice
+
+    async def clone(self, audio: bytes, user_id: str = None, title: str = "Generated User Voice"):
+        """
+        Returns (voice metadata, reused). Audio that was cloned before gets its
+        existing model back instead of a new one; concurrent uploads of the same
+        audio share one create_model call.
+        """
+        digest = audio_hash(audio)
+
+        async def find_or_create():
+            voice = await self.lookup(digest)
+            if voice is not None:
+                self.counters["reused"] += 1
+                return voice, True
+            self.counters["cloned"] += 1
+            return await self._create(audio, digest, title), False
+
+        voice, reused = await self._flights.do(digest, find_or_create)
+        if user_id:
+            await self._assign(user_id, voice)
+        await asyncio.to_thread(self._save)
+        return voice, reused
+
+    async def resolve(self, user_id: str = None, voice_id: str = None):
+        """
+        The Fish Audio reference_id a pipeline should speak with: the requested voice,
+        else the user's latest clone, else FISH_AUDIO_DEFAULT_VOICE (None = Fish's default).
+        Resolved when the job is queued, so stages never look it up again.
+        """
+        if voice_id:
+            return voice_id
+        if user_id:
+            voices = await self.voices_for(user_id)
+            if voices:
+                return voices[0]["voice_id"]
+        return FISH_AUDIO_DEFAULT_VOICE
+
+    def stats(self) -> dict:
+        return {"voices": len(self._voices), "users": len(self._users), **self.counters}
+
+
+registry = VoiceRegistry()
@@ -0,0 +1,143 @@
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+
+from services.settings import settings
+from services.cache import SharedCache
+
+# Public address of this API for provider callbacks; defaults to the asset store's
+WEBHOOK_PUBLIC_URL = (settings.get("WEBHOOK_PUBLIC_URL") or settings.get("ASSET_PUBLIC_URL") or "").rstrip("/")
+# D-ID doesn't sign its callbacks, so the callback URL carries this token instead
+D_ID_WEBHOOK_TOKEN = settings.get("D_ID_WEBHOOK_TOKEN")
+# Signing secret of the CloudConvert webhook (CloudConvert dashboard > Webhooks)
+CLOUDCONVERT_WEBHOOK_SECRET = settings.get("CLOUDCONVERT_WEBHOOK_SECRET")
+# How long to wait on a webhook before falling back to polling the provider
+WEBHOOK_GRACE_SECONDS = float(settings.get("WEBHOOK_GRACE_SECONDS", "60"))
+# How often a waiter checks the shared cache for events received by another worker
+WEBHOOK_SHARED_POLL = float(settings.get("WEBHOOK_SHARED_POLL", "2"))
+WEBHOOK_TTL = int(settings.get("WEBHOOK_TTL", "3600"))
+
+SECRETS = {
+    "d-id": D_ID_WEBHOOK_TOKEN,
+    "cloudconvert": CLOUDCONVERT_WEBHOOK_SECRET,
+}
+
+
+def enabled(provider: str) -> bool:
+    return bool(WEBHOOK_PUBLIC_URL and SECRETS.get(provider))
+
+
+def callback_url(provider: str):
+    """
+    URL to hand the provider when creating a job, or None when its webhook isn't configured.
+    """
+    if not enabled(provider):
+        return None
+    if provider == "d-id":
+        return f"{WEBHOOK_PUBLIC_URL}/api/webhooks/d-id?token={D_ID_WEBHOOK_TOKEN}"
+    return f"{WEBHOOK_PUBLIC_URL}/api/webhooks/{provider}"
+
+
+def verify_token(provider: str, token: str) -> bool:
+    secret = SECRETS.get(provider)
+    return bool(secret and token) and hmac.compare_digest(secret, token)
+
+
+def verify_signature(provider: str, body: bytes, signature: str) -> bool:
+    """
+    Checks a hex HMAC-SHA256 of the raw request body, as CloudConvert sends it.
+    """
+    secret = SECRETS.get(provider)
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class WebhookInbox:
+    """
+    Final payloads delivered by provider webhooks, keyed by provider and resource id.
+
+    Delivery wakes local waiters and copies the payload to the shared cache, so a
+    worker waiting on a job whose webhook landed on another instance finds it too.
+    Providers retry webhooks, so only the first delivery per resource counts.
+    """
+    def __init__(self):
+        self._results = {}  # (provider, resource_id) -> (payload, expires_at)
+        self._waiters = {}  # (provider, resource_id) -> [future, ...]
+        self._shared = SharedCache("webhooks", ttl=WEBHOOK_TTL)
+        self.counters = {"received": 0, "duplicates": 0, "woken": 0}
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+
+    async def lookup(self, provider: str, resource_id: str):
+        """
+        Returns the delivered payload, or None if no webhook has arrived yet.
+        """
+        cached = self._results.get((provider, resource_id))
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        data = await self._shared.get(f"{provider}:{resource_id}")
+        if data is None:
+            return None
+        payload = json.loads(data)
+        self._results[(provider, resource_id)] = (payload, time.monotonic() + WEBHOOK_TTL)
+        return payload
+
+    async def deliver(self, provider: str, resource_id: str, payload: dict) -> bool:
+        """
+        Records a final payload and wakes its waiters. Returns False for a repeat delivery.
+        """
+        self._prune()
+        if await self.lookup(provider, resource_id) is not None:
+            self.counters["duplicates"] += 1
+            return False
+        key = (provider, resource_id)
+        self._results[key] = (payload, time.monotonic() + WEBHOOK_TTL)
+        self.counters["received"] += 1
+        await self._shared.set(f"{provider}:{resource_id}", json.dumps(payload).encode())
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(payload)
+                self.counters["woken"] += 1
+        return True
+
+    async def wait(self, provider: str, resource_id: str, timeout: float = WEBHOOK_GRACE_SECONDS) -> dict:
+        """
+        Waits for the resource's webhook. Raises asyncio.TimeoutError after `timeout`
+        seconds so the caller can fall back to polling.
+        """
+        key = (provider, resource_id)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                # Also covers a webhook that arrived before we started waiting
+                payload = await self.lookup(provider, resource_id)
+                if payload is not None:
+                    return payload
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), timeout=min(remaining, WEBHOOK_SHARED_POLL))
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            waiters = self._waiters.get(key, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"waiting": sum(len(w) for w in self._waiters.values()), **self.counters}
+
+
+inbox = WebhookInbox()
@@ -0,0 +1,188 @@
+import random
+import asyncio
+import httpx
+
+from services import resilience
+from services.http import get_client
+from services.settings import settings
+
+YOUTUBE_UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3/videos"
+# YouTube wants chunks in multiples of 256 KiB (all but the last)
+_CHUNK_UNIT = 256 * 1024
+YOUTUBE_CHUNK_SIZE = max(_CHUNK_UNIT, int(settings.get("YOUTUBE_CHUNK_SIZE", str(16 * 1024 * 1024))) // _CHUNK_UNIT * _CHUNK_UNIT)
+YOUTUBE_CHUNK_TIMEOUT = float(settings.get("YOUTUBE_CHUNK_TIMEOUT", "300"))
+# Interruptions in a row without a single acknowledged byte before giving up
+YOUTUBE_MAX_RESUMES = int(settings.get("YOUTUBE_MAX_RESUMES", "8"))
+
+
+class UploadSessionExpired(Exception):
+    """
+    The resumable session is gone (YouTube answered 404/410); the upload has to start over.
+    """
+
+
+async def source_size(url: str) -> int:
+    """
+    Size of the source video, which the resumable protocol needs up front.
+    """
+    response = await get_client().head(url, follow_redirects=True)
+    response.raise_for_status()
+    size = response.headers.get("content-length")
+    if size is None:
+        raise RuntimeError(f"{url} doesn't report its size.")
+    return int(size)
+
+
+async def start_session(access_token: str, metadata: dict, size: int, content_type: str = "video/mp4") -> str:
+    """
+    Opens a resumable upload session and returns its URI. The URI alone is enough
+    to continue the upload later (it's valid for about a week), so it's what gets persisted.
+    """
+    async def post():
+        response = await get_client().post(
+            YOUTUBE_UPLOAD_URL,
+            params={"uploadType": "resumable", "part": ",".join(metadata)},
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "X-Upload-Content-Type": content_type,
+                "X-Upload-Content-Length": str(size),
+            },
+            json=metadata,
+        )
+        response.raise_for_status()
+        return response
+
+    # A second session would be harmless but wasted, so only retried if the request never left
+    response = await resilience.call("youtube", "create_session", post, idempotent=False)
+    return response.headers["location"]
+
+
+def _acknowledged(response: httpx.Response) -> int:
+    # 308 Resume Incomplete carries "Range: bytes=0-N" once anything has been stored
+    header = response.headers.get("range")
+    return int(header.rsplit("-", 1)[1]) + 1 if header else 0
+
+
+async def query_offset(session_uri: str, size: int):
+    """
+    Asks YouTube how much of the upload it has. Returns (next offset, video) where
+    video is the finished upload's resource once every byte is in, else None.
+    """
+    response = await get_client().put(
+        session_uri, headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"}
+    )
+    if response.status_code in (200, 201):
+        return size, response.json()
+    if response.status_code == 308:
+        return _acknowledged(response), None
+    if response.status_code in (404, 410):
+        raise UploadSessionExpired(f"Upload session expired ({response.status_code}).")
+    response.raise_for_status()
+    raise RuntimeError(f"Unexpected YouTube status {response.status_code}: {response.text}")
+
+
+async def _source_chunks(url: str, offset: int, chunk_size: int):
+    """
+    Streams the source from `offset` in chunk_size pieces, using a Range request
+    so a resumed upload doesn't download the part YouTube already has.
+    """
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    async with get_client().stream("GET", url, headers=headers, follow_redirects=True) as response:
+        response.raise_for_status()
+        # A server that ignores Range sends the whole file; skip what's already uploaded
+        skip = offset if offset and response.status_code == 200 else 0
+        buffer = bytearray()
+        async for data in response.aiter_bytes():
+            if skip:
+                cut = min(skip, len(data))
+                data, skip = data[cut:], skip - cut
+            buffer += data
+            while len(buffer) >= chunk_size:
+                yield bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+        if buffer:
+            yield bytes(buffer)
+
+
+async def upload(session_uri: str, source_url: str, size: int, on_progress=None,
+                 chunk_size: int = YOUTUBE_CHUNK_SIZE) -> dict:
+    """
+    Streams the source into the session chunk by chunk and returns the video resource.
+    Nothing is buffered beyond one chunk. After a network error or 5xx it asks YouTube
+    for the last acknowledged byte and carries on from there, re-reading the source
+    from that offset. on_progress(uploaded, size) is awaited after every chunk.
+    """
+    failures, offset = 0, 0
+    while True:
+        try:
+            offset, video = await query_offset(session_uri, size)
+            if video is not None:
+                return video
+            if on_progress:
+                await on_progress(offset, size)
+            while True:
+                reread = False
+                # Closed explicitly so a re-read doesn't leave the old download open
+                chunks = _source_chunks(source_url, offset, chunk_size)
+                try:
+                    async for chunk in chunks:
+                        end = offset + len(chunk) - 1
+                        response = await get_client().put(
+                            session_uri,
+                            headers={"Content-Range": f"bytes {offset}-{end}/{size}", "Content-Length": str(len(chunk))},
+                            content=chunk,
+                            timeout=YOUTUBE_CHUNK_TIMEOUT,
+                        )
+                        if response.status_code in (200, 201):
+                            if on_progress:
+                                await on_progress(size, size)
+                            return response.json()
+                        if response.status_code != 308:
+                            if response.status_code in (404, 410):
+                                raise UploadSessionExpired(f"Upload session expired ({response.status_code}).")
+                            response.raise_for_status()
+                        acknowledged = _acknowledged(response)
+                        if acknowledged > offset:
+                            failures = 0
+                        else:
+                            failures += 1
+                            if failures > YOUTUBE_MAX_RESUMES:
+                                raise RuntimeError(f"YouTube stopped acknowledging bytes at {acknowledged} of {size}.")
+                        reread = acknowledged != end + 1
+                        offset = acknowledged
+                        if on_progress:
+                            await on_progress(offset, size)
+                        if reread:
+                            # YouTube kept only part of the chunk: re-read the source from its offset
+                            break
+                finally:
+                    await chunks.aclose()
+                if not reread:
+                    raise RuntimeError(f"Source ended at byte {offset} of {size}.")
+        except UploadSessionExpired:
+            raise
+        except httpx.HTTPStatusError as e:
+            if not resilience.is_retryable(e):
+                raise
+            error = e
+        except httpx.TransportError as e:
+            error = e
+        failures += 1
+        if failures > YOUTUBE_MAX_RESUMES:
+            raise RuntimeError(f"YouTube upload stalled at byte {offset} of {size}: {error}")
+        delay = min(resilience.PROVIDER_RETRY_BASE_DELAY * 2 ** failures, resilience.PROVIDER_RETRY_MAX_DELAY)
+        print(f"YouTube upload interrupted at byte {offset}: {error}; resuming in {delay:.1f}s.")
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+def video_metadata(title: str, description: str, privacy: str = "unlisted") -> dict:
+    return {
+        "snippet": {
+            "title": title,
+            "description": description,
+            "categoryId": "22",  # People & Blogs
+        },
+        "status": {
+            "privacyStatus": privacy,
+        },
+    }
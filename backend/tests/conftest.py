@@ -0,0 +1,30 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+
+# Tests import the backend packages (services, routers) the way main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+class FakeContext:
+    """
+    Records what run_dag reports instead of writing job status.
+    """
+    def __init__(self, checkpoints: dict = None):
+        self.timings = {}
+        self.checkpoints = dict(checkpoints or {})
+        self.ran, self.restored, self.skipped = [], [], []
+
+    async def checkpoint(self, name: str, output: dict):
+        self.checkpoints[name] = output
+
+    async def restore(self, name: str):
+        self.restored.append(name)
+
+    async def skip(self, name: str):
+        self.skipped.append(name)
+
+    @asynccontextmanager
+    async def stage(self, name: str, error: str = None):
+        self.ran.append(name)
+        yield
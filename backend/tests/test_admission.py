@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from services import admission
+from services.admission import TokenBucket
+
+
+def test_token_bucket_charges_each_job():
+    bucket = TokenBucket(rate=1, burst=5)
+    assert bucket.take(3) == 0
+    assert bucket.take(3) > 0
+    assert bucket.take(2) == 0
+
+
+def test_cost_above_burst_needs_a_full_bucket_and_empties_it():
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.take(1)
+    assert bucket.take(20) > 0
+    bucket.tokens = bucket.burst
+    assert bucket.take(20) == 0
+    # No debt beyond the burst: the next request waits one token's refill
+    assert bucket.take(1) == pytest.approx(1, abs=0.1)
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUED", 10)
+    monkeypatch.setattr(admission, "ADMISSION_USER_MAX_QUEUED", 4)
+    controller = admission.AdmissionController()
+    controller.capacity = 1
+    return controller
+
+
+def test_a_batch_must_fit_in_the_callers_backlog(controller):
+    controller.queue.put("alice", "queued")
+    controller.queue.put("alice", "queued")
+    with pytest.raises(admission.AdmissionRejected) as rejected:
+        controller.check("alice", cost=3)
+    assert rejected.value.reason == "user_queue"
+    controller.check("alice", cost=2)
+    with pytest.raises(HTTPException) as too_large:
+        controller.check("bob", cost=5)
+    assert too_large.value.status_code == 400
+
+
+def test_a_batch_must_fit_in_the_global_backlog(controller):
+    for lane in ("a", "b", "c", "d"):
+        for _ in range(2):
+            controller.queue.put(lane, "queued")
+    with pytest.raises(admission.AdmissionRejected) as rejected:
+        controller.check("alice", cost=3)
+    assert rejected.value.reason == "busy"
+    controller.check("alice", cost=2)
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from services.cache import DiskCache, SingleFlight
+
+
+def test_interleaved_writers_of_one_key_do_not_collide(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 ** 2)
+    # Two coroutines on one thread filling the same entry at once
+    with cache.writer("key") as first, cache.writer("key") as second:
+        assert first.name != second.name
+        first.write(b"first")
+        second.write(b"second")
+    with open(cache.path("key"), "rb") as f:
+        assert f.read() == b"first"
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".part"]
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = []
+
+    async def fill():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fill) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1 and flights.coalesced == 4
+    assert not flights.running("key")
+
+
+def test_async_writer_commits_or_discards_the_entry(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 ** 2)
+
+    async def main():
+        async with cache.async_writer("kept") as f:
+            await asyncio.to_thread(f.write, b"audio")
+        with pytest.raises(RuntimeError):
+            async with cache.async_writer("dropped") as f:
+                await asyncio.to_thread(f.write, b"partial")
+                raise RuntimeError("stream failed")
+
+    asyncio.run(main())
+    assert cache.get("kept") and cache.get("dropped") is None
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".part"]
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+av = pytest.importorskip("av")
+Image = pytest.importorskip("PIL.Image")
+
+from services import frames
+
+
+@pytest.fixture
+def video(tmp_path):
+    # One second at 10 fps
+    path = str(tmp_path / "clip.mp4")
+    with av.open(path, "w") as container:
+        stream = container.add_stream("mpeg4", rate=10)
+        stream.width, stream.height, stream.pix_fmt = 64, 64, "yuv420p"
+        for i in range(10):
+            frame = av.VideoFrame.from_image(Image.new("RGB", (64, 64), (i * 25, 0, 0)))
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+    return path
+
+
+def test_pyav_extracts_frames_in_the_requested_order(video, tmp_path):
+    paths = frames.PyAVEngine()._extract(video, [0.5, 0.1], str(tmp_path))
+    assert [os.path.basename(path) for path in paths] == ["frame_0.5.jpg", "frame_0.1.jpg"]
+    assert all(os.path.getsize(path) for path in paths)
+
+
+def test_pyav_rejects_a_timestamp_past_the_end(video, tmp_path):
+    with pytest.raises(ValueError):
+        frames.PyAVEngine()._extract(video, [0.5, 5], str(tmp_path))
@@ -0,0 +1,123 @@
+import re
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import history
+
+
+class FakeJobsTable:
+    """
+    In-memory stand-in for the supabase query builder history.query_jobs uses.
+    """
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.filters = []
+        self.limited = None
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self.columns = columns.split(",")
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def or_(self, condition):
+        created_at, job_id = re.fullmatch(
+            r'created_at\.lt\."(.*)",and\(created_at\.eq\."(.*)",id\.lt\."(.*)"\)', condition).group(1, 3)
+        self.filters.append(lambda row: (row["created_at"], row["id"]) < (created_at, job_id))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self.limited = count
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+        class Result:
+            data = [{c: row[c] for c in self.columns if c in row} for row in rows[:self.limited]]
+        self.filters = []
+        return Result()
+
+
+@pytest.fixture
+def jobs_table(monkeypatch):
+    # Three jobs share a timestamp, so pages have to break ties on id
+    rows = [
+        {"id": f"job-{i}", "user_id": "alice", "model": "prompt", "created_at": f"2026-01-0{1 + i // 3}T00:00:00+00:00"}
+        for i in range(7)
+    ]
+    rows.append({"id": "job-9", "user_id": "bob", "model": "prompt", "created_at": "2026-01-09T00:00:00+00:00"})
+    table = FakeJobsTable(rows)
+    monkeypatch.setattr(history.providers, "get", lambda name: table)
+    return table
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    cursor = history.encode_cursor({"created_at": "2026-01-01T00:00:00+00:00", "id": "job-1"})
+    assert history.decode_cursor(cursor) == ("2026-01-01T00:00:00+00:00", "job-1")
+    with pytest.raises(ValueError):
+        history.decode_cursor("not a cursor")
+
+
+def test_pages_walk_every_job_once_newest_first(jobs_table):
+    seen, cursor = [], None
+    while True:
+        page = history.query_jobs("alice", limit=2, cursor=cursor, fields=["model"])
+        seen += [job["id"] for job in page["jobs"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"job-{i}" for i in reversed(range(7))]
+    # id and created_at always come back for the cursor
+    assert set(page["jobs"][0]) == {"id", "created_at", "model"}
+
+
+def test_last_page_has_no_cursor(jobs_table):
+    page = history.query_jobs("alice", limit=7)
+    assert len(page["jobs"]) == 7 and page["next_cursor"] is None
+    # One extra row is read to know whether another page exists
+    assert jobs_table.limited == 8
+
+
+def test_pages_are_cached_until_the_user_writes_a_job():
+    cache = history.HistoryCache(ttl=60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"jobs": [len(loads)], "next_cursor": None}
+
+    async def main():
+        first = await cache.get("alice", {"limit": 20}, load)
+        again = await cache.get("alice", {"limit": 20}, load)
+        await cache.invalidate("alice")
+        fresh = await cache.get("alice", {"limit": 20}, load)
+        return first, again, fresh
+
+    first, again, fresh = asyncio.run(main())
+    assert first == again == {"jobs": [1], "next_cursor": None}
+    assert fresh == {"jobs": [2], "next_cursor": None}
+    assert cache.stats() == {"pages": 2, "hits": 1, "misses": 2, "invalidations": 1}
+
+
+def test_writes_only_invalidate_their_owners(monkeypatch):
+    cache = history.HistoryCache(ttl=60)
+    monkeypatch.setattr(history, "cache", cache)
+
+    async def main():
+        await history.on_jobs_written([{"id": "job-1", "user_id": "alice"}, {"id": "job-2", "user_id": None}])
+
+    asyncio.run(main())
+    assert cache.stats()["invalidations"] == 1
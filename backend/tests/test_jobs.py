@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import jobs
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    monkeypatch.setattr(jobs, "_store", jobs.MemoryStore())
+    monkeypatch.setitem(jobs.PIPELINES, "test", (None, ["only"]))
+
+
+def test_only_the_owner_can_resume_a_signed_in_users_job(memory_store):
+    async def main():
+        await jobs.create_job("test", "job-1", inputs={"user_id": "alice"})
+        await jobs.update_job("job-1", status="failed", error="boom")
+        with pytest.raises(jobs.ResumeError) as rejected:
+            await jobs.resume("job-1", user_id="bob")
+        assert rejected.value.status_code == 404
+        with pytest.raises(jobs.ResumeError):
+            await jobs.resume("job-1")
+        assert (await jobs.get_job("job-1"))["status"] == "failed"
+
+    asyncio.run(main())
+
+
+def test_anonymous_jobs_belong_to_whoever_holds_the_id():
+    assert jobs.owns({"user_id": None}, None)
+    assert jobs.owns({"user_id": None}, "bob")
+    assert jobs.owns({"user_id": "alice"}, "alice")
+    assert not jobs.owns({"user_id": "alice"}, None)
+
+
+def _events_client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers import jobs as job_routes
+
+    app = FastAPI()
+    app.include_router(job_routes.router)
+    return app, TestClient(app)
+
+
+def test_job_events_need_the_owners_token(memory_store):
+    async def setup():
+        await jobs.create_job("test", "job-1", inputs={"user_id": "alice"})
+        await jobs.update_job("job-1", status="succeeded", result={"video_url": "https://video"})
+    asyncio.run(setup())
+
+    _, client = _events_client()
+    owner = client.get(jobs.accepted("job-1", "alice")["events_url"])
+    assert owner.status_code == 200
+    assert owner.text.startswith("event: snapshot\n")
+    assert '"video_url": "https://video"' in owner.text
+
+    # A foreign caller with no token, or with a token signed for someone else
+    assert client.get("/api/jobs/job-1/events").status_code == 404
+    assert client.get(jobs.accepted("job-1", "bob")["events_url"]).status_code == 404
+
+
+def test_job_events_accept_the_owners_session_and_reject_others(memory_store):
+    from services.auth import optional_user
+
+    async def setup():
+        await jobs.create_job("test", "job-1", inputs={"user_id": "alice"})
+        await jobs.update_job("job-1", status="failed", error="boom")
+    asyncio.run(setup())
+
+    app, client = _events_client()
+    app.dependency_overrides[optional_user] = lambda: "alice"
+    assert client.get("/api/jobs/job-1/events").status_code == 200
+    app.dependency_overrides[optional_user] = lambda: "bob"
+    assert client.get("/api/jobs/job-1/events").status_code == 404
+
+
+def test_expired_job_tokens_are_rejected():
+    from services import auth
+
+    token = auth.sign_job("job-1", "alice", ttl=-1)
+    assert not auth.verify_job_token(token, "job-1", "alice")
+    assert auth.verify_job_token(auth.sign_job("job-1", "alice"), "job-1", "alice")
+    assert not auth.verify_job_token(auth.sign_job("job-1", "alice"), "job-2", "alice")
+    assert not auth.verify_job_token("garbage", "job-1", "alice")
+
+
+def test_a_job_cancelled_at_shutdown_can_be_resumed(memory_store, tmp_path, monkeypatch):
+    from services import scratch
+
+    monkeypatch.setattr(scratch, "_store", scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path)))
+    runs = []
+
+    async def runner(ctx, job_id, **kwargs):
+        runs.append(dict(ctx.checkpoints))
+        if "prepare" in ctx.checkpoints:
+            await ctx.restore("prepare")
+        else:
+            async with ctx.stage("prepare"):
+                await ctx.checkpoint("prepare", {"text": "hello"})
+        async with ctx.stage("render"):
+            if len(runs) == 1:
+                await asyncio.Event().wait()
+        return {"text": ctx.checkpoints["prepare"]["text"]}
+
+    monkeypatch.setitem(jobs.PIPELINES, "test", (runner, ["prepare", "render"]))
+
+    class Backend:
+        submitted = []
+
+        async def submit(self, job_id, kind, kwargs, lane=None):
+            self.submitted.append((job_id, kind, kwargs))
+
+    monkeypatch.setattr(jobs, "get_backend", Backend)
+
+    async def main():
+        await jobs.create_job("test", "job-1", inputs={})
+        task = asyncio.create_task(jobs.run_job("job-1", "test", {}))
+        while (await jobs.get_job("job-1"))["stages"].get("render", {}).get("status") != "running":
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        job = await jobs.get_job("job-1")
+        assert job["status"] == "failed"
+        assert "Interrupted" in job["error"]
+
+        await jobs.resume("job-1")
+        assert Backend.submitted == [("job-1", "test", {})]
+        await jobs.run_job("job-1", "test", {})
+        job = await jobs.get_job("job-1")
+        assert job["status"] == "succeeded"
+        assert job["result"] == {"text": "hello"}
+        assert runs[1] == {"prepare": {"text": "hello"}}
+        assert job["stages"]["prepare"].get("restored")
+
+    asyncio.run(main())
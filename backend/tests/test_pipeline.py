@@ -0,0 +1,72 @@
+import asyncio
+
+from services.pipeline import Stage, run_dag, _stages_to_run
+from conftest import FakeContext
+
+
+def _stages():
+    # script -> (image | speech -> audio_upload) -> animation -> save
+    async def script(prompt):
+        return {"script": f"script for {prompt}", "description": "portrait"}
+
+    async def image(description):
+        return {"image_url": "https://img"}
+
+    async def speech(script):
+        return {"voice_path": "/tmp/voice.mp3"}
+
+    async def audio_upload(voice_path):
+        return {"audio_url": "https://audio"}
+
+    async def animation(image_url, audio_url):
+        return {"video_url": f"{image_url}+{audio_url}"}
+
+    async def save(video_url):
+        return {}
+
+    return [
+        Stage("script", script, requires=["prompt"], provides=["script", "description"]),
+        Stage("image", image, requires=["description"], provides=["image_url"]),
+        Stage("speech", speech, requires=["script"], provides=["voice_path"], checkpoint=False),
+        Stage("audio_upload", audio_upload, requires=["voice_path"], provides=["audio_url"]),
+        Stage("animation", animation, requires=["image_url", "audio_url"], provides=["video_url"]),
+        Stage("save", save, requires=["video_url"]),
+    ]
+
+
+def test_fresh_run_executes_every_stage():
+    ctx = FakeContext()
+    values = asyncio.run(run_dag(ctx, _stages(), {"prompt": "cats"}))
+    assert sorted(ctx.ran) == sorted(["script", "image", "speech", "audio_upload", "animation", "save"])
+    assert values["video_url"] == "https://img+https://audio"
+    # Non-checkpointed stages leave nothing to restore from
+    assert "speech" not in ctx.checkpoints
+
+
+def test_resume_from_partial_checkpoint_reruns_only_missing_stages():
+    checkpoints = {
+        "script": {"script": "saved script", "description": "saved portrait"},
+        "audio_upload": {"audio_url": "https://saved-audio"},
+    }
+    ctx = FakeContext(checkpoints)
+    values = asyncio.run(run_dag(ctx, _stages(), {"prompt": "cats"}))
+
+    assert sorted(ctx.restored) == ["audio_upload", "script"]
+    # speech only feeds the restored audio upload, so it's skipped rather than resynthesized
+    assert ctx.skipped == ["speech"]
+    assert sorted(ctx.ran) == ["animation", "image", "save"]
+    assert values["video_url"] == "https://img+https://saved-audio"
+
+
+def test_non_checkpointed_stage_reruns_when_a_running_stage_needs_it():
+    ctx = FakeContext({"script": {"script": "saved script", "description": "saved portrait"}})
+    asyncio.run(run_dag(ctx, _stages(), {"prompt": "cats"}))
+    assert "speech" in ctx.ran and "audio_upload" in ctx.ran
+    assert ctx.skipped == []
+
+
+def test_stages_to_run_keeps_producers_of_running_stages():
+    stages = _stages()
+    to_run = _stages_to_run(stages, restored={"script", "image", "audio_upload"})
+    assert [stage.name for stage in to_run] == ["animation", "save"]
+    assert _stages_to_run(stages, restored={stage.name for stage in stages}) == []
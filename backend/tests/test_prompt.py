@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from routers import generate, prompt
+from services import scratch
+from conftest import FakeContext
+
+
+@pytest.fixture
+def fake_providers(tmp_path, monkeypatch):
+    """
+    Replaces every provider call the prompt pipeline makes, recording the calls.
+    """
+    calls = {}
+
+    async def generate_script(text, on_field=None):
+        await on_field("avatar_description", f"portrait for {text}")
+        return {"script": f"script for {text}", "avatar_description": f"portrait for {text}"}
+
+    async def generate_image(description):
+        path = tmp_path / "generated.jpg"
+        path.write_bytes(b"jpeg")
+        return str(path)
+
+    async def synthesize_to_file(text, voice_id, path):
+        with open(path, "wb") as f:
+            f.write(b"mp3")
+        return path
+
+    async def upload_to_public_url(path, content_type, *args, **kwargs):
+        return f"https://assets/{content_type}"
+
+    async def create_animation(payload):
+        calls["animation"] = payload
+        return {"talk_id": "talk-1"}
+
+    class TalkWatcher:
+        async def wait(self, talk_id):
+            return {"result_url": f"https://d-id/{talk_id}.mp4"}
+
+    async def upload_video(payload):
+        return {"url": "https://cloudinary/video.mp4"}
+
+    def save_job(job_id, script, image_url, video_url, prompt="", **fields):
+        calls["saved"] = {"image_url": image_url, "video_url": video_url}
+
+    monkeypatch.setattr(prompt.scripts, "generate_script", generate_script)
+    monkeypatch.setattr(prompt, "generate_image", generate_image)
+    monkeypatch.setattr(prompt, "upload_to_public_url", upload_to_public_url)
+    monkeypatch.setattr(prompt, "save_job", save_job)
+    monkeypatch.setattr(generate, "synthesize_to_file", synthesize_to_file)
+    monkeypatch.setattr(generate, "upload_to_public_url", upload_to_public_url)
+    monkeypatch.setattr(generate, "create_animation", create_animation)
+    monkeypatch.setattr(generate, "talk_watcher", TalkWatcher())
+    monkeypatch.setattr(generate, "upload_video", upload_video)
+    monkeypatch.setattr(scratch, "_store", scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path / "scratch")))
+    return calls
+
+
+def test_prompt_stages_run_end_to_end(fake_providers):
+    ctx = FakeContext()
+    result = asyncio.run(prompt.run_prompt_to_video(ctx, job_id="job-1", prompt="cats", voice_id="voice-1"))
+
+    assert sorted(ctx.ran) == sorted(stage.name for stage in prompt.PROMPT_STAGES)
+    # The generated image reaches D-ID as the avatar
+    assert fake_providers["animation"] == {"avatar_url": "https://assets/image/jpeg", "audio_url": "https://assets/audio/mpeg"}
+    assert fake_providers["saved"] == {"image_url": "https://assets/image/jpeg", "video_url": "https://cloudinary/video.mp4"}
+    assert result == {
+        "job_id": "job-1",
+        "script": "script for cats",
+        "image_url": "https://assets/image/jpeg",
+        "video_url": "https://cloudinary/video.mp4",
+    }
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import providers
+
+
+@pytest.fixture
+def fish(monkeypatch):
+    entry = providers.PROVIDERS["fish-audio"]
+    monkeypatch.setattr(entry, "client", None)
+    monkeypatch.setattr(entry, "overridden", False)
+    return entry
+
+
+def test_an_overridden_provider_is_reported_as_in_use(fish, monkeypatch):
+    monkeypatch.setattr(providers.settings, "fish_audio_api_key", None)
+    assert any("fish-audio" in line and "disabled" in line for line in providers.report())
+
+    class FakeSession:
+        pass
+
+    providers.override("fish-audio", FakeSession())
+    assert any("fish-audio" in line and "overridden (FakeSession)" in line for line in providers.report())
+    assert providers.configured("fish-audio")
+
+
+def test_tts_requests_for_an_overridden_client_need_no_sdk(fish):
+    providers.override("fish-audio", object())
+    request = providers.fish_tts_request(reference_id="voice", text="hello", format="mp3")
+    assert (request.reference_id, request.text, request.format) == ("voice", "hello", "mp3")
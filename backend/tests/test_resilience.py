@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+from services import resilience
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_RETRY_BASE_DELAY", 0)
+
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://provider.test")
+    return httpx.HTTPStatusError(f"{status}", request=request, response=httpx.Response(status, request=request))
+
+
+def _guard() -> resilience.ProviderGuard:
+    return resilience.ProviderGuard("test", concurrency=4, rate=1000)
+
+
+def test_transient_failures_are_retried():
+    guard = _guard()
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _status_error(503)
+        return "ok"
+
+    assert asyncio.run(guard.call("op", fn)) == "ok"
+    assert len(attempts) == 3
+    assert guard.breaker.state == "closed"
+
+
+def test_non_idempotent_calls_are_only_retried_when_nothing_was_sent():
+    guard = _guard()
+    attempts = []
+
+    async def rejected():
+        attempts.append(1)
+        raise _status_error(500)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(guard.call("op", rejected, idempotent=False))
+    assert len(attempts) == 1
+
+    async def unreachable():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert asyncio.run(guard.call("op", unreachable, idempotent=False)) == "ok"
+
+
+def test_client_errors_are_not_retried():
+    guard = _guard()
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        raise _status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(guard.call("op", fn))
+    assert len(attempts) == 1
+    assert guard.breaker.failures == 0
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_RETRIES", 0)
+    guard = _guard()
+    guard.breaker = resilience.CircuitBreaker("test", threshold=2, reset_seconds=0.05)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        raise _status_error(502)
+
+    async def healthy():
+        return "ok"
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await guard.call("op", failing)
+        assert guard.breaker.state == "open"
+        # Rejected without reaching the provider
+        with pytest.raises(resilience.CircuitOpen):
+            await guard.call("op", failing)
+        assert len(attempts) == 2
+
+        await asyncio.sleep(0.06)
+        assert guard.breaker.state == "half_open"
+        assert await guard.call("op", healthy) == "ok"
+        assert guard.breaker.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_stream_retries_until_the_first_chunk():
+    guard = _guard()
+    opened = []
+
+    async def chunks():
+        opened.append(1)
+        if len(opened) < 2:
+            raise _status_error(503)
+        yield b"a"
+        yield b"b"
+
+    async def main():
+        return [chunk async for chunk in guard.stream("tts", chunks)]
+
+    assert asyncio.run(main()) == [b"a", b"b"]
+    assert len(opened) == 2
+
+
+def test_stream_does_not_retry_after_the_first_chunk():
+    guard = _guard()
+    opened = []
+
+    async def chunks():
+        opened.append(1)
+        yield b"a"
+        raise _status_error(503)
+
+    async def main():
+        received = []
+        with pytest.raises(httpx.HTTPStatusError):
+            async for chunk in guard.stream("tts", chunks):
+                received.append(chunk)
+        return received
+
+    assert asyncio.run(main()) == [b"a"]
+    assert len(opened) == 1
+    assert guard.breaker.failures == 1
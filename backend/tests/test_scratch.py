@@ -0,0 +1,63 @@
+import os
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import scratch
+
+
+def _age(path, seconds):
+    old = os.path.getmtime(path) - seconds
+    os.utime(path, (old, old))
+
+
+def test_sweep_on_another_worker_keeps_a_leased_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(scratch, "SCRATCH_TTL", 60)
+    # Two workers sharing one scratch volume
+    running_here = scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path))
+    other_worker = scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path))
+
+    async def main():
+        async with running_here.hold("running"):
+            await running_here.path("running", "avatar.jpg")
+            await running_here.path("expired", "avatar.jpg")
+            _age(running_here.job_dir("running"), 3600)
+            _age(running_here.job_dir("expired"), 3600)
+            other_worker.sweep()
+            assert os.path.isdir(running_here.job_dir("running"))
+            assert not os.path.exists(running_here.job_dir("expired"))
+        # Released: the lease is gone and the stale directory can expire
+        _age(running_here.job_dir("running"), 3600)
+        other_worker.sweep()
+        assert not os.path.exists(running_here.job_dir("running"))
+
+    asyncio.run(main())
+
+
+def test_stale_lease_of_a_dead_worker_expires(tmp_path, monkeypatch):
+    monkeypatch.setattr(scratch, "SCRATCH_TTL", 60)
+    store = scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path))
+    store._renew_lease("crashed")
+    _age(os.path.join(store.job_dir("crashed"), scratch.LEASE_FILE), scratch.SCRATCH_LEASE_SECONDS + 1)
+    _age(store.job_dir("crashed"), 3600)
+    store.sweep()
+    assert not os.path.exists(store.job_dir("crashed"))
+
+
+def test_saved_inputs_of_a_queued_job_survive_a_sweep(tmp_path, monkeypatch):
+    monkeypatch.setattr(scratch, "SCRATCH_TTL", 60)
+    api = scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path))
+    other_worker = scratch.ScratchStore(scratch.LocalBackend(), str(tmp_path))
+
+    async def chunks():
+        yield b"avatar"
+
+    async def main():
+        await api.save("queued", "avatar.jpg", chunks())
+        _age(api.job_dir("queued"), 3600)
+        other_worker.sweep()
+        assert os.path.exists(os.path.join(api.job_dir("queued"), "avatar.jpg"))
+
+    asyncio.run(main())
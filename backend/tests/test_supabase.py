@@ -0,0 +1,88 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import providers, supabase
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.rows = None
+
+    def upsert(self, rows, on_conflict=None):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        self.client.calls += 1
+        if self.client.calls in self.client.fail_calls or self.client.down:
+            raise RuntimeError("unreachable")
+        self.client.written += [row["id"] for row in self.rows]
+
+
+class FakeClient:
+    def __init__(self, down=False, fail_calls=()):
+        self.down = down
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+        self.written = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(providers.PROVIDERS["supabase"], "client", fake)
+    return fake
+
+
+def _spilled(path):
+    with open(path) as f:
+        return [json.loads(line)["row"]["id"] for line in f if line.strip()]
+
+
+def test_overflow_is_spilled_by_the_flush_and_replayed_in_order(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(supabase, "SUPABASE_BUFFER_MAX", 2)
+    writer = supabase.SupabaseWriter(str(tmp_path / "spill.jsonl"))
+    client.down = True
+
+    for job_id in ("a", "b", "c"):
+        writer.add("jobs", {"id": job_id, "status": "queued"})
+    # add() leaves the disk alone; the overflowed row still reads back
+    assert not os.path.exists(writer.spill_path)
+    assert [row["id"] for row in writer.pending("jobs")] == ["a", "b", "c"]
+
+    asyncio.run(writer.flush())
+    assert _spilled(writer.spill_path) == ["a", "b", "c"]
+
+    client.down = False
+    writer._replay_at = 0
+    writer.add("jobs", {"id": "d", "status": "queued"})
+    asyncio.run(writer.flush())
+    assert client.written == ["a", "b", "c", "d"]
+    assert not os.path.exists(writer.spill_path)
+    assert writer.counters["spilled"] == 4 and writer.counters["replayed"] == 4
+
+
+def test_a_failed_replay_keeps_only_the_unwritten_rows(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(supabase, "SUPABASE_BATCH_SIZE", 1)
+    writer = supabase.SupabaseWriter(str(tmp_path / "spill.jsonl"))
+    writer._spill([("jobs", {"id": job_id, "status": "failed"}) for job_id in ("a", "b", "c")])
+    client.fail_calls = {2}
+
+    asyncio.run(writer.flush())
+    assert client.written == ["a"]
+    assert _spilled(writer.spill_path) == ["b", "c"]
+
+    writer._replay_at = 0
+    asyncio.run(writer.flush())
+    assert client.written == ["a", "b", "c"]
+    assert not os.path.exists(writer.spill_path)
@@ -0,0 +1,160 @@
+import time
+import asyncio
+
+import pytest
+
+from services import talks
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, data: dict = None, headers: dict = None):
+        self.status_code = status_code
+        self._data = data or {}
+        self.headers = headers or {}
+        self.text = str(self._data)
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(talks, "TALK_POLL_INITIAL_DELAY", 0.01)
+    monkeypatch.setattr(talks, "TALK_POLL_MAX_DELAY", 0.02)
+    monkeypatch.setattr(talks, "TALK_POLL_JITTER", 0.0)
+    monkeypatch.setattr(talks, "TALK_POLL_RATE", 1000)
+
+
+def fake_did(statuses: dict):
+    """
+    Serves each talk's scripted responses in order, repeating the last one.
+    """
+    calls = []
+
+    async def fetch(talk_id):
+        calls.append(talk_id)
+        script = statuses[talk_id]
+        return script.pop(0) if len(script) > 1 else script[0]
+
+    return fetch, calls
+
+
+def test_polls_each_talk_until_it_finishes():
+    fetch, calls = fake_did({
+        "a": [FakeResponse(data={"status": "started"}), FakeResponse(data={"status": "done", "result_url": "a.mp4"})],
+        "b": [FakeResponse(data={"status": "created"})] * 2 + [FakeResponse(data={"status": "done", "result_url": "b.mp4"})],
+    })
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch)
+        try:
+            # Waiting twice on one talk shares its watch
+            a, again, b = await asyncio.gather(watcher.wait("a"), watcher.wait("a"), watcher.wait("b"))
+        finally:
+            await watcher.stop()
+        return a, again, b, watcher.pending()
+
+    a, again, b, pending = asyncio.run(main())
+    assert a["result_url"] == "a.mp4" and again is a
+    assert b["result_url"] == "b.mp4"
+    assert calls.count("a") == 2 and calls.count("b") == 3
+    assert pending == 0
+
+
+def test_failed_talk_raises():
+    fetch, _ = fake_did({"a": [FakeResponse(data={"status": "error", "error": "bad audio"})]})
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch)
+        try:
+            await watcher.wait("a")
+        finally:
+            await watcher.stop()
+
+    with pytest.raises(RuntimeError, match="bad audio"):
+        asyncio.run(main())
+
+
+def test_rate_limited_polling_pauses_for_retry_after():
+    fetch, calls = fake_did({
+        "a": [FakeResponse(429, headers={"retry-after": "0.2"}), FakeResponse(data={"status": "done"})],
+    })
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch)
+        started = time.monotonic()
+        try:
+            await watcher.wait("a")
+        finally:
+            await watcher.stop()
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.2
+    assert len(calls) == 2
+
+
+def test_talk_that_never_finishes_times_out():
+    fetch, _ = fake_did({"a": [FakeResponse(data={"status": "started"})]})
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch)
+        try:
+            await watcher.wait("a", timeout=0.05)
+        finally:
+            await watcher.stop()
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+
+
+def test_webhook_resolves_a_talk_without_polling():
+    fetch, calls = fake_did({"a": [FakeResponse(data={"status": "started"})]})
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch, fallback_after=60)
+        waiter = asyncio.ensure_future(watcher.wait("a"))
+        await asyncio.sleep(0.05)
+        assert watcher.resolve("a", {"id": "a", "status": "done", "result_url": "a.mp4"})
+        try:
+            return await waiter
+        finally:
+            await watcher.stop()
+
+    assert asyncio.run(main())["result_url"] == "a.mp4"
+    assert calls == []
+
+
+def test_webhook_received_by_another_worker_is_found_by_lookup():
+    fetch, calls = fake_did({"a": [FakeResponse(data={"status": "started"})]})
+    lookups = []
+
+    async def lookup(talk_id):
+        lookups.append(talk_id)
+        return {"id": talk_id, "status": "done", "result_url": "a.mp4"} if len(lookups) > 1 else None
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch, lookup=lookup, fallback_after=60)
+        try:
+            return await watcher.wait("a")
+        finally:
+            await watcher.stop()
+
+    assert asyncio.run(main())["result_url"] == "a.mp4"
+    assert calls == []
+
+
+def test_late_webhook_falls_back_to_polling():
+    fetch, calls = fake_did({"a": [FakeResponse(data={"status": "done", "result_url": "a.mp4"})]})
+
+    async def lookup(talk_id):
+        return None
+
+    async def main():
+        watcher = talks.TalkWatcher(fetch, lookup=lookup, fallback_after=0.05)
+        try:
+            return await watcher.wait("a")
+        finally:
+            await watcher.stop()
+
+    assert asyncio.run(main())["result_url"] == "a.mp4"
+    assert calls == ["a"]
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import voices, resilience
+
+
+class FakeFishAudio:
+    def __init__(self):
+        self.created = []
+
+    def create_model(self, title, voices):
+        self.created.append(voices[0])
+
+        class Model:
+            id = f"model-{len(self.created)}"
+        return Model()
+
+
+@pytest.fixture
+def fish(monkeypatch):
+    fake = FakeFishAudio()
+    monkeypatch.setattr(voices.providers, "get", lambda name: fake)
+    yield fake
+    resilience.reset()
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return voices.VoiceRegistry(str(tmp_path / "voices.json"))
+
+
+def test_same_audio_reuses_its_model(fish, registry):
+    async def main():
+        first = await registry.clone(b"alice's voice", user_id="alice")
+        again = await registry.clone(b"alice's voice", user_id="bob")
+        other = await registry.clone(b"carol's voice")
+        return first, again, other
+
+    (first, reused_first), (again, reused_again), (other, _) = asyncio.run(main())
+    assert not reused_first and reused_again
+    assert again["voice_id"] == first["voice_id"] == "model-1"
+    assert other["voice_id"] == "model-2"
+    assert registry.stats() == {"voices": 2, "users": 2, "reused": 1, "cloned": 2}
+
+
+def test_concurrent_uploads_of_one_audio_create_one_model(fish, registry):
+    async def main():
+        return await asyncio.gather(*(registry.clone(b"same audio") for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert {voice["voice_id"] for voice, _ in results} == {"model-1"}
+    assert len(fish.created) == 1
+
+
+def test_registry_survives_a_restart(fish, registry):
+    asyncio.run(registry.clone(b"alice's voice", user_id="alice"))
+
+    reloaded = voices.VoiceRegistry(registry.path)
+    voice, reused = asyncio.run(reloaded.clone(b"alice's voice"))
+    assert reused and voice["voice_id"] == "model-1"
+    assert asyncio.run(reloaded.resolve(user_id="alice")) == "model-1"
+
+
+def test_resolve_prefers_request_then_latest_clone_then_default(fish, registry, monkeypatch):
+    monkeypatch.setattr(voices, "FISH_AUDIO_DEFAULT_VOICE", "default-voice")
+
+    async def main():
+        await registry.clone(b"older", user_id="alice")
+        await registry.clone(b"newer", user_id="alice")
+        return (
+            await registry.resolve(user_id="alice", voice_id="requested"),
+            await registry.resolve(user_id="alice"),
+            await registry.resolve(user_id="bob"),
+            await registry.resolve(),
+        )
+
+    assert asyncio.run(main()) == ("requested", "model-2", "default-voice", "default-voice")
+
+
+def test_a_slow_listener_finishes_from_the_cached_file(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    from routers import voice
+    from services.cache import DiskCache
+
+    monkeypatch.setattr(voice, "tts_cache", SimpleNamespace(disk=DiskCache(str(tmp_path), 1024 ** 2)))
+    monkeypatch.setattr(voice, "TTS_STREAM_BUFFER", 2)
+    audio = [bytes([i]) * 4 for i in range(10)]
+
+    async def synthesize(key, text, voice_id):
+        async with voice.tts_cache.disk.async_writer(key) as f:
+            for chunk in audio:
+                await asyncio.to_thread(f.write, chunk)
+                yield chunk
+
+    monkeypatch.setattr(voice, "_synthesize", synthesize)
+
+    async def main():
+        stream = voice._stream_synthesis("key", "hello", "voice")
+        received = [await stream.__anext__()]
+        # The synthesis runs to the end without waiting for this listener
+        while voice._tts_flights.running("key"):
+            await asyncio.sleep(0.01)
+        received += [chunk async for chunk in stream]
+        return b"".join(received)
+
+    assert asyncio.run(main()) == b"".join(audio)
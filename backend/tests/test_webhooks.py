@@ -0,0 +1,92 @@
+import hmac
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services import webhooks
+from routers import webhooks as webhook_routes
+
+
+@pytest.fixture
+def secrets(monkeypatch):
+    monkeypatch.setitem(webhooks.SECRETS, "d-id", "talk-token")
+    monkeypatch.setitem(webhooks.SECRETS, "cloudconvert", "signing-secret")
+    monkeypatch.setattr(webhooks, "inbox", webhooks.WebhookInbox())
+
+
+@pytest.fixture
+def client(secrets):
+    app = FastAPI()
+    app.include_router(webhook_routes.router)
+    return TestClient(app)
+
+
+def _sign(body: bytes, secret: str = "signing-secret") -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_signature_must_match_the_raw_body(secrets):
+    body = b'{"event": "job.finished"}'
+    assert webhooks.verify_signature("cloudconvert", body, _sign(body))
+    assert not webhooks.verify_signature("cloudconvert", body + b" ", _sign(body))
+    assert not webhooks.verify_signature("cloudconvert", body, _sign(body, secret="other"))
+    assert not webhooks.verify_signature("cloudconvert", body, None)
+
+
+def test_token_is_required_and_checked(secrets):
+    assert webhooks.verify_token("d-id", "talk-token")
+    assert not webhooks.verify_token("d-id", "guess")
+    assert not webhooks.verify_token("d-id", "")
+
+
+def test_unsigned_cloudconvert_delivery_is_rejected(client):
+    body = b'{"event": "job.finished", "job": {"id": "job-1"}}'
+    response = client.post("/api/webhooks/cloudconvert", content=body,
+                           headers={"CloudConvert-Signature": _sign(body, secret="other")})
+    assert response.status_code == 401
+    assert webhooks.inbox.stats()["received"] == 0
+
+
+def test_repeat_deliveries_are_acknowledged_once(client):
+    body = b'{"event": "job.finished", "job": {"id": "job-1", "status": "finished"}}'
+    headers = {"CloudConvert-Signature": _sign(body)}
+
+    first = client.post("/api/webhooks/cloudconvert", content=body, headers=headers)
+    again = client.post("/api/webhooks/cloudconvert", content=body, headers=headers)
+
+    assert first.json() == {"received": True, "duplicate": False}
+    assert again.json() == {"received": True, "duplicate": True}
+    assert webhooks.inbox.stats()["received"] == 1
+    assert webhooks.inbox.stats()["duplicates"] == 1
+
+
+def test_d_id_callback_with_a_wrong_token_is_rejected(client):
+    response = client.post("/api/webhooks/d-id?token=guess", json={"id": "talk-1", "status": "done"})
+    assert response.status_code == 401
+
+
+def test_delivery_wakes_the_waiter(secrets):
+    inbox = webhooks.WebhookInbox()
+
+    async def main():
+        waiter = asyncio.ensure_future(inbox.wait("cloudconvert", "job-1", timeout=1))
+        await asyncio.sleep(0.01)
+        assert await inbox.deliver("cloudconvert", "job-1", {"id": "job-1"})
+        assert not await inbox.deliver("cloudconvert", "job-1", {"id": "job-1"})
+        return await waiter
+
+    assert asyncio.run(main()) == {"id": "job-1"}
+    assert inbox.stats() == {"waiting": 0, "received": 1, "duplicates": 1, "woken": 1}
+
+
+def test_missing_webhook_times_out_for_the_polling_fallback(secrets):
+    inbox = webhooks.WebhookInbox()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(inbox.wait("cloudconvert", "job-1", timeout=0.05))
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from services import youtube
+
+SOURCE = b"0123456789"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, stored: int = 0):
+        self.status_code = status_code
+        self.headers = {"range": f"bytes=0-{stored - 1}"} if stored else {}
+
+    def json(self):
+        return {"id": "video-1"}
+
+
+class FakeYouTube:
+    """
+    Stores at most `keep` bytes of each chunk, the way YouTube may keep only part of one.
+    """
+    def __init__(self, keep: int):
+        self.keep = keep
+        self.stored = b""
+        self.puts = []
+
+    async def put(self, url, headers, content=None, timeout=None):
+        if not content:
+            return FakeResponse(308, len(self.stored))
+        start = int(headers["Content-Range"].split(" ")[1].split("-")[0])
+        self.puts.append((start, content))
+        assert start == len(self.stored), "chunk doesn't continue the stored bytes"
+        self.stored += content[:self.keep]
+        if len(self.stored) == len(SOURCE):
+            return FakeResponse(200)
+        return FakeResponse(308, len(self.stored))
+
+
+@pytest.fixture
+def fake_source(monkeypatch):
+    async def source_chunks(url, offset, chunk_size):
+        for start in range(offset, len(SOURCE), chunk_size):
+            yield SOURCE[start:start + chunk_size]
+
+    monkeypatch.setattr(youtube, "_source_chunks", source_chunks)
+
+
+def test_partially_acknowledged_chunks_are_reread_from_the_source(fake_source, monkeypatch):
+    fake = FakeYouTube(keep=3)
+    monkeypatch.setattr(youtube, "get_client", lambda: fake)
+
+    video = asyncio.run(youtube.upload("session", "https://cdn/video.mp4", len(SOURCE), chunk_size=4))
+
+    assert video == {"id": "video-1"}
+    assert fake.stored == SOURCE
+    assert [start for start, _ in fake.puts] == [0, 3, 6, 9]
+    assert all(content == SOURCE[start:start + 4] for start, content in fake.puts)
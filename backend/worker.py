@@ -0,0 +1,46 @@
+import asyncio
+from celery import Celery
+
+from services.settings import settings
+
+REDIS_URL = settings.get("REDIS_URL", "redis://localhost:6379/0")
+
+celery_app = Celery(
+    "echoforge",
+    broker=settings.get("CELERY_BROKER_URL", REDIS_URL),
+)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+
+async def _run(job_id: str, kind: str, kwargs: dict):
+    from services import cache, jobs, http, resilience, supabase
+    # Importing the routers registers their pipelines
+    import routers.generate  # noqa: F401
+    import routers.prompt  # noqa: F401
+    import routers.batch  # noqa: F401
+    import routers.youtube  # noqa: F401
+    from routers.animation import talk_watcher
+
+    try:
+        await jobs.run_job(job_id, kind, kwargs)
+    finally:
+        await jobs.shutdown()
+        await supabase.writer.stop()
+        await talk_watcher.stop()
+        await http.shutdown()
+        await cache.close_shared()
+        resilience.reset()
+
+
+@celery_app.task(name="jobs.run_pipeline")
+def run_pipeline(job_id: str, kind: str, kwargs: dict):
+    """
+    Runs a pipeline enqueued by the API with JOB_BACKEND=celery.
+    Start with: celery -A worker.celery_app worker
+    """
+    asyncio.run(_run(job_id, kind, kwargs))
@@ -0,0 +1,67 @@
+import { authHeaders } from './supabase';
+
+// Response body of an endpoint that queued a job (202)
+export interface QueuedJob {
+  job_id: string;
+  status_url: string;
+  events_url?: string;
+}
+
+export interface JobProgress {
+  stage?: string;
+  status?: string;
+  progress: number;
+}
+
+const POLL_INTERVAL_MS = 3000;
+
+// Falls back to polling the status URL when the browser or a proxy can't hold an event stream
+const pollJob = async (statusUrl: string): Promise<any> => {
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+    // A signed-in user's jobs are only visible to them
+    const response = await fetch(statusUrl, { headers: await authHeaders() });
+    if (!response.ok) throw new Error('Failed to fetch job status.');
+    const job = await response.json();
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed.');
+    if (job.status === 'succeeded') return job.result;
+  }
+};
+
+// Waits for a queued job over its Server-Sent Events stream and resolves with its result
+export const waitForJob = (job: QueuedJob, onProgress?: (progress: JobProgress) => void): Promise<any> => {
+  if (!job.events_url || typeof EventSource === 'undefined') return pollJob(job.status_url);
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(job.events_url!);
+    let received = false;
+
+    const finish = (data: any) => {
+      source.close();
+      if (data.status === 'succeeded') resolve(data.result);
+      else reject(new Error(data.error || 'Job failed.'));
+    };
+
+    source.addEventListener('snapshot', (event) => {
+      received = true;
+      const data = JSON.parse((event as MessageEvent).data);
+      onProgress?.({ status: data.status, progress: data.progress });
+      if (data.status === 'succeeded' || data.status === 'failed') finish(data);
+    });
+    source.addEventListener('stage', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      onProgress?.({ stage: data.stage, status: data.status, progress: data.progress });
+    });
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      if (data.status === 'succeeded' || data.status === 'failed') finish(data);
+    });
+    source.onerror = () => {
+      // EventSource reconnects by itself once a stream has worked; poll if it never did
+      if (!received) {
+        source.close();
+        pollJob(job.status_url).then(resolve, reject);
+      }
+    };
+  });
+};
@@ -0,0 +1,14 @@
+import { createClient, SupabaseClient } from '@supabase/supabase-js';
+
+const supabaseUrl = import.meta.env.VITE_SUPABASE_URL;
+const supabaseKey = import.meta.env.VITE_SUPABASE_KEY;
+
+// One client for the whole app, so every page shares the same session
+export const supabase: SupabaseClient = createClient(supabaseUrl, supabaseKey);
+
+// Authorization header for backend calls; empty when signed out
+export const authHeaders = async (): Promise<Record<string, string>> => {
+  const { data } = await supabase.auth.getSession();
+  const token = data.session?.access_token;
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
@@ -1,6 +1,8 @@
 import React, { useState, useRef, useCallback } from 'react';
 import { ArrowLeft, Upload, Video, Mic, User, Sparkles, Check, AlertCircle, Play, Pause, RotateCcw, FileVideo, FileAudio, Zap, Shield, Clock } from 'lucide-react';
 import { Link } from 'react-router-dom';
+import { authHeaders } from '../lib/supabase';
+import { waitForJob } from '../lib/jobs';
 
 interface FileUpload {
   file: File | null;
@@ -239,6 +241,7 @@ const CreatePage = () => {
     try {
       const response = await fetch('http://localhost:8000/voice/clone-voice', {
         method: 'POST',
+        headers: await authHeaders(),
         body: apiFormData,
       });
 
@@ -446,15 +449,21 @@ const CreatePage = () => {
       formData.append('avatar', avatar);
       formData.append('script', script);
       formData.append('dry_run', String(dryRun));
+      if (voiceId) formData.append('voice_id', voiceId);
       const response = await fetch('/api/generate', {
         method: 'POST',
+        headers: await authHeaders(),
         body: formData,
       });
       if (!response.ok) {
         const err = await response.json().catch(() => ({}));
         throw new Error(err.detail || 'Failed to generate video.');
       }
-      const data = await response.json();
+      let data = await response.json();
+      // Real runs are queued (202); follow the job's event stream until the pipeline finishes
+      if (data.status_url) {
+        data = await waitForJob(data);
+      }
       setVideoUrl(data.video_url);
       setJobId(data.job_id);
     } catch (err: any) {
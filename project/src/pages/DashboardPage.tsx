@@ -1,18 +1,18 @@
 // Install @supabase/supabase-js: npm install @supabase/supabase-js
 // Ensure .env has VITE_SUPABASE_URL and VITE_SUPABASE_KEY
-import React, { useEffect, useState } from 'react';
-import { createClient, SupabaseClient } from '@supabase/supabase-js';
+import React, { useCallback, useEffect, useState } from 'react';
+import { authHeaders } from '../lib/supabase';
 
-const supabaseUrl = import.meta.env.VITE_SUPABASE_URL;
-const supabaseKey = import.meta.env.VITE_SUPABASE_KEY;
-const supabase: SupabaseClient = createClient(supabaseUrl, supabaseKey);
+const PAGE_SIZE = 24;
+const JOB_FIELDS = 'id,created_at,status,model,script,prompt,image_url,video_url';
 
 interface Job {
   id: string;
   created_at: string;
-  script: string;
-  image_url: string;
-  video_url: string;
+  status?: string;
+  script: string | null;
+  image_url: string | null;
+  video_url: string | null;
   prompt?: string;
   model: string;
 }
@@ -20,6 +20,8 @@ interface Job {
 const DashboardPage: React.FC = () => {
   const [jobs, setJobs] = useState<Job[]>([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [showYouTubeModal, setShowYouTubeModal] = useState<string | null>(null);
   const [youtubeSignedIn, setYouTubeSignedIn] = useState(false);
@@ -28,31 +30,40 @@ const DashboardPage: React.FC = () => {
   const [youtubeStatus, setYouTubeStatus] = useState<string | null>(null);
   const [youtubeLoading, setYouTubeLoading] = useState(false);
 
-  useEffect(() => {
-    const fetchJobs = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const { data, error } = await supabase
-          .from<Job>('jobs')
-          .select('*')
-          .order('created_at', { ascending: false });
-        if (error) throw error;
-        setJobs(data || []);
-      } catch (err: any) {
-        setError(err.message || 'Failed to fetch jobs.');
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchJobs();
+  // Pages come from the backend's cursor-paginated history API, newest first
+  const fetchJobs = useCallback(async (cursor: string | null) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE), fields: JOB_FIELDS });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`/api/jobs?${params}`, { headers: await authHeaders() });
+    if (!response.ok) {
+      const err = await response.json().catch(() => ({}));
+      throw new Error(err.detail || 'Failed to fetch jobs.');
+    }
+    const page: { jobs: Job[]; next_cursor: string | null } = await response.json();
+    setJobs(prev => (cursor ? [...prev, ...page.jobs] : page.jobs));
+    setNextCursor(page.next_cursor);
   }, []);
 
+  useEffect(() => {
+    setLoading(true);
+    setError(null);
+    fetchJobs(null)
+      .catch((err: any) => setError(err.message || 'Failed to fetch jobs.'))
+      .finally(() => setLoading(false));
+  }, [fetchJobs]);
+
+  const handleLoadMore = () => {
+    setLoadingMore(true);
+    fetchJobs(nextCursor)
+      .catch((err: any) => setError(err.message || 'Failed to fetch jobs.'))
+      .finally(() => setLoadingMore(false));
+  };
+
   const handleYouTubeClick = (job: Job) => {
     setYouTubeStatus(null);
     setShowYouTubeModal(job.id);
-    setYouTubeTitle(job.prompt || job.script.slice(0, 60));
-    setYouTubeDescription(job.script);
+    setYouTubeTitle(job.prompt || (job.script || '').slice(0, 60));
+    setYouTubeDescription(job.script || '');
   };
 
   const handleYouTubeLogin = () => {
@@ -86,7 +97,7 @@ const DashboardPage: React.FC = () => {
             <div key={job.id} className="bg-white rounded shadow p-4 flex flex-col">
               <div className="flex items-center justify-between mb-2">
                 <span className="text-xs text-gray-500">{new Date(job.created_at).toLocaleString()}</span>
-                <span className={`px-2 py-1 rounded text-xs font-semibold ${job.model === 'prompt' ? 'bg-green-100 text-green-700' : 'bg-blue-100 text-blue-700'}`}>{job.model}</span>
+                <span className={`px-2 py-1 rounded text-xs font-semibold ${job.model === 'prompt' ? 'bg-green-100 text-green-700' : 'bg-blue-100 text-blue-700'}`}>{job.model}{job.status && job.status !== 'succeeded' ? ` · ${job.status}` : ''}</span>
               </div>
               <div className="mb-2">
                 <span className="text-xs text-gray-400">Job ID:</span>
@@ -211,6 +222,17 @@ const DashboardPage: React.FC = () => {
           ))}
         </div>
       )}
+      {!loading && nextCursor && (
+        <div className="flex justify-center mt-6">
+          <button
+            className="bg-gray-600 hover:bg-gray-700 text-white px-6 py-2 rounded font-semibold shadow transition disabled:opacity-60"
+            onClick={handleLoadMore}
+            disabled={loadingMore}
+          >
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,9 +1,12 @@
 import React, { useState } from 'react';
+import { authHeaders } from '../lib/supabase';
+import { waitForJob } from '../lib/jobs';
 
 const PromptPage: React.FC = () => {
   const [prompt, setPrompt] = useState('');
   const [dryRun, setDryRun] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState<number | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [result, setResult] = useState<{
     script: string;
@@ -21,17 +24,22 @@ const PromptPage: React.FC = () => {
       return;
     }
     setLoading(true);
+    setProgress(null);
     try {
       const response = await fetch('/api/prompt-to-video', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...(await authHeaders()) },
         body: JSON.stringify({ prompt, dry_run: dryRun }),
       });
       if (!response.ok) {
         const err = await response.json().catch(() => ({}));
         throw new Error(err.detail || 'Failed to generate video.');
       }
-      const data = await response.json();
+      let data = await response.json();
+      // Real runs are queued (202); follow the job's event stream until the pipeline finishes
+      if (data.status_url) {
+        data = await waitForJob(data, ({ progress }) => setProgress(progress));
+      }
       setResult(data);
     } catch (err: any) {
       setError(err.message || 'An error occurred.');
@@ -76,7 +84,7 @@ const PromptPage: React.FC = () => {
                 <circle className="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" strokeWidth="4"></circle>
                 <path className="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8v8z"></path>
               </svg>
-              Generating...
+              Generating...{progress !== null && ` ${Math.round(progress)}%`}
             </span>
           ) : 'Generate Video'}
         </button>